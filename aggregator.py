@@ -0,0 +1,635 @@
+"""
+Aggregation service of the counts and Bloom Filters of many sensors.
+
+Every sensor sends a report at the end of a run (argo.py --aggregator) or of a window: its counts and its Bloom Filter
+serialized with BloomFilter.to_bytes. The aggregator is a single asyncio process that listens on a TCP or Unix socket
+and puts every report in the time bucket of its capture time. The filters of a bucket are merged incrementally: the
+ones received since the last query are OR-ed into the union filter of the bucket in one batch (the union is rebuilt
+only when a sensor sends a new filter for the same bucket), so a query costs the new filters and not all of them. A
+query returns the site-wide count of a bucket, the latest one by default: the sum of the sensor counts and the number
+of distinct devices estimated from the union filter, minus the anonymization noise of the sensors. The pairwise
+intersections (devices seen by two sensors) are computed on demand with BloomFilterStack. The decoding of a filter
+(up to MAX_FILTER_BITS) and the intersections run in the default executor of the loop, so a large report or an
+overlaps query does not stall the other sensors.
+
+Messages are framed as two little-endian uint32 (length of a JSON header, length of a binary payload) followed by the
+header and the payload, every request gets one reply:
+- {"type": "report", "sensor": ..., "time": ..., "global": ..., "local": ..., "total": ..., "noise": ...} with the
+  serialized filter as optional payload, replied with {"type": "ack", "bucket": ...};
+- {"type": "summary", "bucket": optional start of the bucket}, replied with the site-wide count of the bucket;
+- {"type": "overlaps", "bucket": ...}, replied with the sensors and their pairwise intersection cardinalities;
+- {"type": "stats"}, replied with the counters of the service.
+A malformed request (a header that is not a JSON object, counts that are not numbers, a filter that is corrupt, larger
+than MAX_FILTER_BITS or whose bits do not match its size) is answered with {"type": "error", "error": ...} and changes
+nothing.
+
+Example:
+    python aggregator.py --unix /tmp/argo.sock --bucket 60
+    python argo.py --input_file ./capture.pcap --aggregator /tmp/argo.sock --sensor hall
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import signal
+import socket
+import struct
+import time
+import zlib
+
+from bloomfilter import ENCODING_ZLIB, BloomFilter
+from bloomfilter_aggregation import BloomFilterStack, check_compatible
+from bloomfilter_operations import calculate_num_of_stored_element
+
+# header length, payload length
+_FRAME = struct.Struct("<II")
+MAX_MESSAGE = 64 << 20
+# Largest Bloom Filter accepted in a report, 16 MiB once decompressed
+MAX_FILTER_BITS = 128 << 20
+# Pending connections of the listening socket, the sensors of a site may all connect at once
+DEFAULT_BACKLOG = 1024
+
+COUNT_KEYS = ["global", "local", "total"]
+
+logger = logging.getLogger()
+
+
+def encode_message(header, payload=b"") -> bytes:
+    """
+    Frame a message.
+
+    :param header: JSON-serializable dictionary
+    :param payload: Optional binary payload
+    :return: bytes
+    """
+
+    data = json.dumps(header).encode()
+    return _FRAME.pack(len(data), len(payload)) + data + bytes(payload)
+
+
+def _decode_frame(prefix) -> tuple:
+    header_size, payload_size = _FRAME.unpack(prefix)
+    if header_size + payload_size > MAX_MESSAGE:
+        raise ValueError(f"Message of {header_size + payload_size} bytes, at most {MAX_MESSAGE} are accepted")
+    return header_size, payload_size
+
+
+def decode_header(data) -> dict:
+    """
+    Decode the JSON header of a message.
+
+    :param data: bytes of the header, as returned by read_message
+    :return: Header dictionary
+    :raise ValueError: If the header is not UTF-8 JSON text of an object
+    """
+
+    header = json.loads(data)
+    if not isinstance(header, dict):
+        raise ValueError(f"A message header must be a JSON object, got {type(header).__name__}")
+    return header
+
+
+async def read_message(reader):
+    """
+    Read a message from an asyncio stream. The header is not decoded, a header that is not valid JSON does not break the
+    framing of the following messages.
+
+    :param reader: asyncio.StreamReader
+    :return: Tuple (header bytes, payload bytes), see decode_header, None if the stream ended between two messages
+    :raise ValueError: If the frame is too large
+    """
+
+    try:
+        prefix = await reader.readexactly(_FRAME.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise
+    header_size, payload_size = _decode_frame(prefix)
+    data = await reader.readexactly(header_size + payload_size)
+    return data[:header_size], data[header_size:]
+
+
+def _finite(value):
+    # JSON has no infinity, the estimate of a saturated filter is reported as null
+    return round(float(value), 2) if math.isfinite(value) else None
+
+
+def load_filter(payload) -> BloomFilter:
+    """
+    Load the Bloom Filter of a report.
+
+    :param payload: BloomFilter serialized with to_bytes
+    :return: Writable BloomFilter
+    :raise ValueError: If the filter is corrupt or larger than MAX_FILTER_BITS
+    """
+
+    return BloomFilter.from_bytes(payload, copy=True, max_bits=MAX_FILTER_BITS)
+
+
+def overlaps_reply(start, names, filters) -> dict:
+    """
+    Compute the pairwise intersection cardinalities of the filters of a bucket.
+
+    :param start: Start of the bucket
+    :param names: Names of the sensors, sorted
+    :param filters: BloomFilter of every sensor, in the order of names
+    :return: Reply message (see Bucket.overlaps)
+    """
+
+    intersections = []
+    if names:
+        stack = BloomFilterStack(filters, names)
+        intersections = [[_finite(value) for value in row]
+                         for row in stack.pairwise_intersection_cardinality().tolist()]
+    return {"type": "overlaps", "bucket": start, "sensors": list(names), "intersections": intersections}
+
+
+class Bucket(object):
+    """
+    Reports and Bloom Filters of the sensors in a time bucket, with their union merged as they arrive.
+    """
+
+    def __init__(self, start):
+        """
+        Create an empty bucket.
+
+        :param start: Capture time where the bucket starts
+        :return: None
+        """
+
+        self.start = start
+        self.reports = dict()
+        self.filters = dict()
+        self.union = None
+        # Sensors whose filter arrived since the last merge
+        self._pending = []
+        # A sensor replaced its filter, the union is rebuilt at the next merge
+        self._stale = False
+        self._summary = None
+        self._overlaps = None
+        # Changes of the reports, a result computed off the event loop is cached only if there was none meanwhile
+        self.version = 0
+
+    def add(self, sensor, report, bf=None) -> None:
+        """
+        Add (or replace) the report of a sensor.
+
+        :param sensor: Name of the sensor
+        :param report: Dictionary with the counts of the sensor
+        :param bf: Optional BloomFilter of the sensor
+        :return: None
+        :raise ValueError: If the filter has not the shape of the ones already in the bucket
+        """
+
+        if bf is not None:
+            # The union ORs the bit arrays, a filter whose bits disagree with its size would break every summary
+            if len(bf.bit_array) != bf.get_n():
+                raise ValueError(f"Bloom Filter of {len(bf.bit_array)} bits, expected {bf.get_n()}")
+            if self.filters:
+                check_compatible([next(iter(self.filters.values())), bf])
+            if sensor in self.filters:
+                self._stale = True
+            self.filters[sensor] = bf
+            self._pending.append(sensor)
+        self.reports[sensor] = report
+        self._summary = self._overlaps = None
+        self.version += 1
+
+    def merge(self) -> None:
+        """
+        OR the filters received since the last merge into the union filter.
+
+        :return: None
+        """
+
+        if self._stale or self.union is None:
+            pending = list(self.filters)
+            self.union = None
+        else:
+            pending = self._pending
+        for sensor in pending:
+            bf = self.filters[sensor]
+            if self.union is None:
+                self.union = BloomFilter(bf.get_n(), bf.get_k())
+            self.union.bit_array |= bf.bit_array
+        if pending and self.union is not None:
+            self.union.m = self.union.bit_array.count(1)
+        self._pending = []
+        self._stale = False
+
+    def summary(self) -> dict:
+        """
+        Get the site-wide count of the bucket.
+
+        :return: Dictionary with bucket, sensors, filters, the sums of the counts of the sensors, noise (random
+            elements of the filters) and devices (distinct elements of the union filter without the noise)
+        """
+
+        if self._summary is None:
+            self.merge()
+            summary = {"type": "summary", "bucket": self.start, "sensors": len(self.reports),
+                       "filters": len(self.filters)}
+            for key in COUNT_KEYS:
+                summary[key] = sum(report.get(key, 0) for report in self.reports.values())
+            noise = sum(self.reports[sensor].get("noise", 0) for sensor in self.filters)
+            summary["noise"] = noise
+            summary["devices"] = None
+            if self.union is not None:
+                summary["devices"] = _finite(calculate_num_of_stored_element(self.union) - noise)
+            self._summary = summary
+        return self._summary
+
+    def overlaps(self) -> dict:
+        """
+        Get the pairwise intersection cardinalities of the filters of the bucket.
+
+        :return: Dictionary with bucket, sensors (names) and intersections (matrix, the diagonal is the cardinality
+            of every filter), noise included
+        """
+
+        if self._overlaps is None:
+            names = sorted(self.filters)
+            self._overlaps = overlaps_reply(self.start, names, [self.filters[name] for name in names])
+        return self._overlaps
+
+    async def overlaps_in_executor(self) -> dict:
+        """
+        Get the result of overlaps(), computed in the default executor of the running loop.
+
+        :return: Reply message (see overlaps)
+        """
+
+        if self._overlaps is not None:
+            return self._overlaps
+        version = self.version
+        # The filters of a sensor are replaced, never modified, the snapshot stays valid while reports arrive
+        names = sorted(self.filters)
+        filters = [self.filters[name] for name in names]
+        reply = await asyncio.get_running_loop().run_in_executor(None, overlaps_reply, self.start, names, filters)
+        if version == self.version:
+            self._overlaps = reply
+        return reply
+
+
+class Aggregator(object):
+    """
+    Time buckets of the reports of the sensors, with the asyncio handler of their connections.
+    """
+
+    def __init__(self, bucket_seconds=60, retention=60):
+        """
+        Create an aggregator with no report.
+
+        :param bucket_seconds: Seconds of capture time of every bucket
+        :param retention: Buckets kept, the oldest ones are dropped
+        :return: None
+        """
+
+        if bucket_seconds <= 0:
+            raise ValueError(f"bucket_seconds must be positive, got {bucket_seconds}")
+        if retention <= 0:
+            raise ValueError(f"retention must be positive, got {retention}")
+        self.bucket_seconds = bucket_seconds
+        self.retention = retention
+        self.buckets = dict()
+        self.counters = {"connections": 0, "reports": 0, "filters": 0, "queries": 0, "errors": 0,
+                         "payload_bytes": 0, "dropped_reports": 0}
+
+    def bucket_start(self, timestamp) -> float:
+        """
+        Get the start of the bucket of a capture time.
+
+        :param timestamp: Capture time in seconds
+        :return: Start of the bucket
+        """
+
+        return math.floor(timestamp / self.bucket_seconds) * self.bucket_seconds
+
+    def _bucket(self, start, create=False):
+        if start is None:
+            return self.buckets[max(self.buckets)] if self.buckets else None
+        bucket = self.buckets.get(start)
+        if bucket is None and create:
+            bucket = self.buckets[start] = Bucket(start)
+            for old in sorted(self.buckets)[:-self.retention]:
+                del self.buckets[old]
+        return bucket
+
+    @staticmethod
+    def check_report(header) -> None:
+        """
+        Validate the fields of a report.
+
+        :param header: Report message
+        :return: None
+        :raise ValueError: If the sensor or the time is missing or a count is not a finite number
+        """
+
+        if header.get("sensor") is None or "time" not in header:
+            raise ValueError("A report needs a sensor and a time")
+        for key in COUNT_KEYS + ["noise", "time"]:
+            value = header.get(key, 0)
+            # The counts are summed by every summary of the bucket, they are checked once here
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ValueError(f"The {key} of a report must be a finite number, got {value!r}")
+
+    def add_report(self, header, payload=b"", bf=None) -> dict:
+        """
+        Add the report of a sensor to the bucket of its capture time.
+
+        :param header: Report message, with sensor, time and the counts
+        :param payload: Optional BloomFilter serialized with to_bytes
+        :param bf: Optional BloomFilter already loaded from the payload (see load_filter), payload is then ignored
+        :return: Reply message
+        :raise ValueError: If the report is malformed or its filter has not the shape of the bucket
+        """
+
+        self.check_report(header)
+        sensor = header["sensor"]
+        start = self.bucket_start(float(header["time"]))
+        if self.buckets and len(self.buckets) >= self.retention and start < min(self.buckets):
+            # Older than every bucket kept
+            self.counters["dropped_reports"] += 1
+            return {"type": "ack", "bucket": start, "dropped": True}
+        if bf is None and payload:
+            bf = load_filter(payload)
+        report = {key: header[key] for key in COUNT_KEYS + ["noise", "time"] if key in header}
+        self._bucket(start, create=True).add(sensor, report, bf)
+        self.counters["reports"] += 1
+        self.counters["filters"] += bf is not None
+        return {"type": "ack", "bucket": start}
+
+    def summary(self, bucket=None) -> dict:
+        """
+        Get the site-wide count of a bucket.
+
+        :param bucket: Start of the bucket, the latest one if None
+        :return: Reply message (see Bucket.summary), with no count if the bucket is unknown
+        """
+
+        found = self._bucket(bucket)
+        if found is None:
+            return {"type": "summary", "bucket": bucket, "sensors": 0}
+        return found.summary()
+
+    def overlaps(self, bucket=None) -> dict:
+        """
+        Get the pairwise intersections of the filters of a bucket.
+
+        :param bucket: Start of the bucket, the latest one if None
+        :return: Reply message (see Bucket.overlaps)
+        """
+
+        found = self._bucket(bucket)
+        if found is None:
+            return {"type": "overlaps", "bucket": bucket, "sensors": [], "intersections": []}
+        return found.overlaps()
+
+    def handle_message(self, header, payload) -> dict:
+        """
+        Answer a request.
+
+        :param header: Request message
+        :param payload: Binary payload of the request
+        :return: Reply message
+        :raise ValueError: If the request is malformed
+        """
+
+        if not isinstance(header, dict):
+            raise ValueError(f"A message header must be a JSON object, got {type(header).__name__}")
+        kind = header.get("type")
+        if kind == "report":
+            return self.add_report(header, payload)
+        self.counters["queries"] += 1
+        if kind == "summary":
+            return self.summary(header.get("bucket"))
+        if kind == "overlaps":
+            return self.overlaps(header.get("bucket"))
+        if kind == "stats":
+            return dict(self.counters, type="stats", buckets=len(self.buckets))
+        raise ValueError(f"Unknown message type {kind!r}")
+
+    async def handle_request(self, header, payload) -> dict:
+        """
+        Answer a request as handle_message does, but decode the filter of a report and compute the overlaps in the
+        default executor of the running loop, so that a large filter does not stall the other connections.
+
+        :param header: Request message
+        :param payload: Binary payload of the request
+        :return: Reply message
+        :raise ValueError: If the request is malformed
+        """
+
+        kind = header.get("type") if isinstance(header, dict) else None
+        if kind == "report" and payload:
+            self.check_report(header)
+            bf = await asyncio.get_running_loop().run_in_executor(None, load_filter, payload)
+            return self.add_report(header, bf=bf)
+        if kind == "overlaps":
+            found = self._bucket(header.get("bucket"))
+            if found is not None:
+                self.counters["queries"] += 1
+                return await found.overlaps_in_executor()
+        return self.handle_message(header, payload)
+
+    async def handle(self, reader, writer) -> None:
+        """
+        Serve the requests of a connection until it is closed.
+
+        :param reader: asyncio.StreamReader of the connection
+        :param writer: asyncio.StreamWriter of the connection
+        :return: None
+        """
+
+        self.counters["connections"] += 1
+        try:
+            while True:
+                try:
+                    message = await read_message(reader)
+                except (asyncio.IncompleteReadError, ValueError) as e:
+                    # Framing errors (too large or truncated frame), the stream cannot be resynchronized
+                    self.counters["errors"] += 1
+                    logger.warning(f"Closing a connection: {e}")
+                    break
+                if message is None:
+                    break
+                data, payload = message
+                self.counters["payload_bytes"] += len(payload)
+                try:
+                    reply = await self.handle_request(decode_header(data), payload)
+                except (ValueError, TypeError, KeyError, zlib.error) as e:
+                    self.counters["errors"] += 1
+                    reply = {"type": "error", "error": str(e)}
+                writer.write(encode_message(reply))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(aggregator, host="127.0.0.1", port=7070, path=None, stop=None, backlog=DEFAULT_BACKLOG) -> None:
+    """
+    Listen for the sensors until stop is set.
+
+    :param aggregator: Aggregator
+    :param host: Address of the TCP socket
+    :param port: Port of the TCP socket
+    :param path: Path of a Unix socket, used instead of TCP if given
+    :param stop: Optional asyncio.Event that stops the service
+    :param backlog: Connections waiting to be accepted, the ones beyond it are refused or reset
+    :return: None
+    """
+
+    if path:
+        server = await asyncio.start_unix_server(aggregator.handle, path=path, backlog=backlog)
+        logger.info(f"Listening on {path}")
+    else:
+        server = await asyncio.start_server(aggregator.handle, host, port, backlog=backlog)
+        logger.info(f"Listening on {host}:{port}")
+    stop = stop or asyncio.Event()
+    async with server:
+        await stop.wait()
+
+
+def connect(address, timeout=None) -> socket.socket:
+    """
+    Open a blocking connection to an aggregator.
+
+    :param address: "host:port" of a TCP socket or path of a Unix socket
+    :param timeout: Optional timeout of the socket operations in seconds
+    :return: Connected socket
+    """
+
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return socket.create_connection((host, int(port)), timeout=timeout)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    sock.connect(address)
+    return sock
+
+
+class AggregatorClient(object):
+    """
+    Blocking client of the aggregator, used by the sensors.
+    """
+
+    def __init__(self, address, timeout=10):
+        """
+        Connect to an aggregator.
+
+        :param address: "host:port" of a TCP socket or path of a Unix socket
+        :param timeout: Timeout of the socket operations in seconds
+        :return: None
+        """
+
+        self.address = address
+        self._sock = connect(address, timeout)
+        self._reader = self._sock.makefile("rb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close the connection.
+
+        :return: None
+        """
+
+        self._reader.close()
+        self._sock.close()
+
+    def request(self, header, payload=b"") -> dict:
+        """
+        Send a request and wait for its reply.
+
+        :param header: Request message
+        :param payload: Optional binary payload
+        :return: Reply message
+        :raise ConnectionError: If the aggregator closes the connection
+        :raise ValueError: If the aggregator replies with an error
+        """
+
+        self._sock.sendall(encode_message(header, payload))
+        prefix = self._reader.read(_FRAME.size)
+        if len(prefix) < _FRAME.size:
+            raise ConnectionError(f"Connection to {self.address} closed")
+        header_size, payload_size = _decode_frame(prefix)
+        data = self._reader.read(header_size + payload_size)
+        if len(data) < header_size + payload_size:
+            raise ConnectionError(f"Connection to {self.address} closed")
+        reply = decode_header(data[:header_size])
+        if reply.get("type") == "error":
+            raise ValueError(f"Aggregator error: {reply['error']}")
+        return reply
+
+    def report(self, sensor, timestamp, counts, bf=None, noise=0) -> dict:
+        """
+        Send the report of a sensor.
+
+        :param sensor: Name of the sensor
+        :param timestamp: Capture time of the report, that selects its bucket
+        :param counts: Dictionary with the global, local and total counts
+        :param bf: Optional BloomFilter of the devices seen by the sensor
+        :param noise: Random elements added to the filter by anonymization_noise
+        :return: Reply message, with the bucket of the report
+        """
+
+        header = {key: counts[key] for key in COUNT_KEYS if key in counts}
+        header.update(type="report", sensor=sensor, time=timestamp, noise=noise)
+        return self.request(header, bf.to_bytes(ENCODING_ZLIB) if bf is not None else b"")
+
+    def summary(self, bucket=None) -> dict:
+        """
+        Get the site-wide count of a bucket.
+
+        :param bucket: Start of the bucket, the latest one if None
+        :return: Reply message (see Bucket.summary)
+        """
+
+        return self.request({"type": "summary", "bucket": bucket})
+
+    def overlaps(self, bucket=None) -> dict:
+        """
+        Get the pairwise intersections of the filters of a bucket.
+
+        :param bucket: Start of the bucket, the latest one if None
+        :return: Reply message (see Bucket.overlaps)
+        """
+
+        return self.request({"type": "overlaps", "bucket": bucket})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address of the TCP socket.")
+    parser.add_argument("--port", type=int, default=7070, help="Port of the TCP socket.")
+    parser.add_argument("--unix", type=str, default=None, help="Path of a Unix socket, used instead of TCP.")
+    parser.add_argument("--bucket", type=float, default=60, help="Seconds of capture time of every bucket.")
+    parser.add_argument("--retention", type=int, default=60, help="Buckets kept in memory.")
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG,
+                        help="Connections waiting to be accepted, at least the number of sensors that connect at once.")
+    opt = vars(parser.parse_args())
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+        aggregator = Aggregator(opt["bucket"], opt["retention"])
+        start = time.perf_counter()
+        await serve(aggregator, opt["host"], opt["port"], opt["unix"], stop, opt["backlog"])
+        logger.info(f"Stopped after {round(time.perf_counter() - start, 2)} seconds: "
+                    + ", ".join(f"{name} {value}" for name, value in aggregator.counters.items()))
+
+    asyncio.run(main())
@@ -0,0 +1,136 @@
+"""
+Batch counting of many pcap traces in parallel.
+
+The traces given as directories (searched recursively for .pcap files), globs or paths are distributed over a pool of
+worker processes. Every worker imports scapy / sklearn and creates a single Pipeline (device-model database and Bloom
+Filter), then counts the traces it receives with the same options of argo.py. One row per trace is written, in the
+order of the input.
+
+Example:
+    python batch.py --input ./input/thesis_tests ./input/Captures0210/Room_Captures --workers 4 --format jsonl
+"""
+
+import argparse
+import glob
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+OUTPUT_COLUMNS = ["file", "frames", "packets", "time_window", "global", "local", "total", "seconds", "error"]
+
+# State of a worker process, set by _init_worker
+_worker = dict()
+
+
+def find_traces(inputs) -> list:
+    """
+    Expand directories and globs into the list of traces.
+
+    :param inputs: Sequence of directories, globs or paths of .pcap traces
+    :return: List of paths, without duplicates, in the order of the inputs (sorted inside a directory or glob)
+    """
+
+    traces = []
+    for entry in inputs:
+        if os.path.isdir(entry):
+            traces.extend(sorted(glob.glob(os.path.join(entry, "**", "*.pcap"), recursive=True)))
+        elif glob.has_magic(entry):
+            traces.extend(sorted(path for path in glob.glob(entry, recursive=True) if os.path.isfile(path)))
+        else:
+            traces.append(entry)
+    return list(dict.fromkeys(traces))
+
+
+def _init_worker(opt) -> None:
+    from pipeline import Pipeline
+
+    # Only warnings from the workers, the handler may be inherited from the parent
+    logging.basicConfig()
+    logging.getLogger().setLevel(logging.WARNING)
+    _worker["pipeline"] = Pipeline(opt)
+
+
+def count_trace(file) -> dict:
+    """
+    Count the devices of a trace inside a worker.
+
+    :param file: Path of the .pcap trace
+    :return: Dictionary with the OUTPUT_COLUMNS keys, error is set (and the counts are None) if the run failed
+    """
+
+    row = dict.fromkeys(OUTPUT_COLUMNS)
+    row["file"] = file
+    start = time.perf_counter()
+    try:
+        result = _worker["pipeline"].run(file)
+        row.update({
+            "frames": result.frames,
+            "packets": result.packets,
+            "time_window": result.time_window,
+            "global": result.global_devices,
+            "local": result.local_devices,
+            "total": result.total_devices,
+        })
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["seconds"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def run_batch(traces, opt, workers=None):
+    """
+    Count a list of traces over a process pool.
+
+    :param traces: Paths of the .pcap traces
+    :param opt: Counting options, the same of argo.py
+    :param workers: Number of worker processes, the number of CPUs if None
+    :return: Generator of the rows of count_trace, in the order of traces
+    """
+
+    from model_db import open_models
+
+    # Compiled once here, the workers only map the artifact
+    open_models(opt["models"], opt["models_cache"])
+
+    workers = min(workers or os.cpu_count() or 1, max(len(traces), 1))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(opt,)) as executor:
+        # The largest traces are started first, so that they do not end up alone at the end of the batch
+        by_size = sorted(traces, key=lambda path: os.path.getsize(path) if os.path.exists(path) else 0, reverse=True)
+        futures = {path: executor.submit(count_trace, path) for path in by_size}
+        for path in traces:
+            yield futures[path].result()
+
+
+if __name__ == "__main__":
+
+    from pipeline import add_counting_arguments
+    from windowed import write_rows
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", type=str, nargs="+", required=True,
+                        help="Directories (searched recursively for .pcap files), globs or paths of the traces.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes, the number of CPUs if not given.")
+    parser.add_argument("--format", type=str, choices=["csv", "jsonl"], default="csv",
+                        help="Format of the results, the possible choices are csv and jsonl.")
+    parser.add_argument("--output", type=str, default=None, help="Output file, the standard output if not given.")
+    add_counting_arguments(parser)
+    opt = vars(parser.parse_args())
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger()
+
+    traces = find_traces(opt["input"])
+    if not traces:
+        parser.error(f"No .pcap trace found in {' '.join(opt['input'])}")
+
+    start = time.perf_counter()
+    rows = run_batch(traces, opt, opt["workers"])
+    if opt["output"]:
+        with open(opt["output"], "w", newline="") as fw:
+            write_rows(rows, fw, opt["format"], columns=OUTPUT_COLUMNS)
+    else:
+        write_rows(rows, sys.stdout, opt["format"], columns=OUTPUT_COLUMNS)
+    logger.info(f"{len(traces)} traces counted in {round(time.perf_counter() - start, 2)} seconds")
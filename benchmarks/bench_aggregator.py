@@ -0,0 +1,212 @@
+"""
+Load test of aggregator.py: hundreds of simulated sensors report to one aggregator process over a local socket.
+
+The aggregator runs in a subprocess on a Unix socket (or TCP with --tcp). Every sensor is an asyncio connection that
+sends --reports reports, one per time bucket, each with the counts and the Bloom Filter (10000 bits, 7 hash functions,
+anonymization noise) of a random subset of a shared population of devices, waiting for the ack of every report. Meanwhile
+a querier asks the site-wide count of the latest bucket every --query_interval seconds. The filters are built before
+the test. At the end the summary of every bucket must match the one computed offline from the same reports: the sums of
+the counts and the union estimate of BloomFilterStack minus the noise. Before the summaries, malformed reports (a
+filter of the wrong size, a corrupt or oversized zlib payload, counts that are not numbers, a header that is not a JSON
+object, not JSON or not UTF-8) are sent to the first bucket on one connection, each must get an error reply and leave
+the bucket unchanged. Exits with status 1 if any bucket differs or any malformed report is not rejected.
+
+Example:
+    python benchmarks/bench_aggregator.py --sensors 200 --reports 10 --devices 300
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import zlib
+
+from aggregator import MAX_FILTER_BITS, _FRAME, connect, decode_header, encode_message, read_message
+from bloomfilter import ENCODING_ZLIB, FORMAT_VERSION, BloomFilter, _HEADER, _MAGIC
+from bloomfilter_aggregation import BloomFilterStack
+
+AGGREGATOR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "aggregator.py")
+NOISE = 30
+
+
+def build_reports(opt):
+    # reports[sensor][bucket] = (header, BloomFilter, serialized filter)
+    rng = numpy.random.default_rng(opt["seed"])
+    population = ["%012x" % value for value in rng.integers(0, 1 << 48, size=4 * opt["devices"]).tolist()]
+    reports = []
+    for sensor in range(opt["sensors"]):
+        sensor_reports = []
+        for bucket in range(opt["reports"]):
+            seen = rng.choice(len(population), size=opt["devices"], replace=False)
+            bf = BloomFilter(10000, 7)
+            bf.anonymization_noise(NOISE)
+            bf.add_many([population[i] for i in seen.tolist()])
+            local = int(rng.integers(0, opt["devices"]))
+            header = {"type": "report", "sensor": f"sensor-{sensor}", "time": bucket * opt["bucket"] + 1,
+                      "global": opt["devices"] - local, "local": local, "total": opt["devices"], "noise": NOISE}
+            sensor_reports.append((header, bf, bf.to_bytes(ENCODING_ZLIB)))
+        reports.append(sensor_reports)
+    return reports
+
+
+def malformed_reports():
+    # Framed messages the aggregator must answer with an error
+    report = {"type": "report", "sensor": "malformed", "time": 1, "global": 1, "local": 0, "total": 1, "noise": 0}
+    zlib_header = _HEADER.pack(_MAGIC, FORMAT_VERSION, ENCODING_ZLIB, 10000, 7, 1)
+    return [
+        encode_message(report, zlib_header + zlib.compress(bytes(100))),
+        encode_message(report, zlib_header + b"not zlib"),
+        encode_message(report, _HEADER.pack(_MAGIC, FORMAT_VERSION, ENCODING_ZLIB, MAX_FILTER_BITS + 1, 7, 1) +
+                       zlib.compress(bytes(1024))),
+        encode_message(dict(report, total="many")),
+        _FRAME.pack(2, 0) + b"[]",
+        _FRAME.pack(9, 0) + b"{not json",
+        _FRAME.pack(2, 0) + b"\xff\xfe",
+    ]
+
+
+async def open_connection(address):
+    if address.startswith("tcp:"):
+        return await asyncio.open_connection("127.0.0.1", int(address[4:]))
+    return await asyncio.open_unix_connection(address)
+
+
+async def request(reader, writer, header, payload=b""):
+    writer.write(encode_message(header, payload))
+    await writer.drain()
+    data, _ = await read_message(reader)
+    return decode_header(data)
+
+
+async def sensor_task(address, sensor_reports, latencies):
+    reader, writer = await open_connection(address)
+    for header, _, payload in sensor_reports:
+        start = time.perf_counter()
+        reply = await request(reader, writer, header, payload)
+        latencies.append(time.perf_counter() - start)
+        if reply["type"] != "ack":
+            raise RuntimeError(f"Unexpected reply {reply}")
+    writer.close()
+
+
+async def querier_task(address, interval, done, latencies):
+    reader, writer = await open_connection(address)
+    while not done.is_set():
+        start = time.perf_counter()
+        await request(reader, writer, {"type": "summary"})
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    writer.close()
+
+
+async def load_test(address, reports, opt):
+    report_latencies, query_latencies = [], []
+    done = asyncio.Event()
+    querier = asyncio.ensure_future(querier_task(address, opt["query_interval"], done, query_latencies))
+    start = time.perf_counter()
+    await asyncio.gather(*(sensor_task(address, sensor_reports, report_latencies) for sensor_reports in reports))
+    seconds = time.perf_counter() - start
+    done.set()
+    await querier
+
+    reader, writer = await open_connection(address)
+    rejected = 0
+    for message in malformed_reports():
+        writer.write(message)
+        await writer.drain()
+        data, _ = await read_message(reader)
+        rejected += decode_header(data)["type"] == "error"
+    summaries = [await request(reader, writer, {"type": "summary", "bucket": bucket * opt["bucket"]})
+                 for bucket in range(opt["reports"])]
+    stats = await request(reader, writer, {"type": "stats"})
+    writer.close()
+    return seconds, report_latencies, query_latencies, summaries, stats, rejected
+
+
+def percentile_ms(values, q):
+    return round(float(numpy.percentile(values, q)) * 1000, 2) if values else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, default=200, help="Simulated sensors, one connection each.")
+    parser.add_argument("--reports", type=int, default=10, help="Reports of every sensor, one per time bucket.")
+    parser.add_argument("--devices", type=int, default=300, help="Devices seen by every sensor in a bucket.")
+    parser.add_argument("--bucket", type=float, default=60, help="Seconds of every bucket of the aggregator.")
+    parser.add_argument("--query_interval", type=float, default=0.01, help="Seconds between two summary queries.")
+    parser.add_argument("--tcp", type=int, default=None, help="Port of a TCP socket instead of a Unix socket.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the simulated devices.")
+    opt = vars(parser.parse_args())
+
+    start = time.perf_counter()
+    reports = build_reports(opt)
+    build_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        args = [sys.executable, AGGREGATOR, "--bucket", str(opt["bucket"]), "--retention", str(opt["reports"])]
+        if opt["tcp"]:
+            address = f"tcp:{opt['tcp']}"
+            args += ["--port", str(opt["tcp"])]
+        else:
+            address = os.path.join(tmp_dir, "aggregator.sock")
+            args += ["--unix", address]
+        process = subprocess.Popen(args, stderr=subprocess.DEVNULL)
+        try:
+            # Wait for the socket
+            deadline = time.perf_counter() + 10
+            while True:
+                try:
+                    connect(f"127.0.0.1:{opt['tcp']}" if opt["tcp"] else address, timeout=1).close()
+                    break
+                except OSError:
+                    if time.perf_counter() > deadline:
+                        raise
+                    time.sleep(0.05)
+            seconds, report_latencies, query_latencies, summaries, stats, rejected = asyncio.run(
+                load_test(address, reports, opt))
+        finally:
+            process.terminate()
+            process.wait()
+
+    mismatches = 0
+    for bucket, summary in enumerate(summaries):
+        filters = [sensor_reports[bucket][1] for sensor_reports in reports]
+        expected_devices = BloomFilterStack(filters).union_cardinality() - NOISE * len(filters)
+        expected_total = sum(sensor_reports[bucket][0]["total"] for sensor_reports in reports)
+        same = summary["sensors"] == len(reports) and summary["total"] == expected_total and \
+            summary["devices"] == (round(expected_devices, 2) if numpy.isfinite(expected_devices) else None)
+        if not same:
+            mismatches += 1
+            print(json.dumps({"bucket": bucket, "summary": summary, "expected_total": expected_total,
+                              "expected_devices": expected_devices}))
+
+    total_reports = len(report_latencies)
+    print(json.dumps({
+        "sensors": opt["sensors"],
+        "reports": total_reports,
+        "filter_bytes": round(statistics.mean(len(r[2]) for sensor_reports in reports for r in sensor_reports), 1),
+        "build_seconds": round(build_seconds, 3),
+        "seconds": round(seconds, 3),
+        "reports_per_sec": round(total_reports / seconds, 1),
+        "report_p50_ms": percentile_ms(report_latencies, 50),
+        "report_p99_ms": percentile_ms(report_latencies, 99),
+        "queries": len(query_latencies),
+        "query_p50_ms": percentile_ms(query_latencies, 50),
+        "query_p99_ms": percentile_ms(query_latencies, 99),
+        "site_devices_last_bucket": summaries[-1].get("devices") if summaries else None,
+        "malformed_rejected": rejected,
+        "errors": stats["errors"],
+        "mismatches": mismatches,
+    }))
+    malformed = len(malformed_reports())
+    sys.exit(1 if mismatches or rejected != malformed or stats["errors"] != malformed else 0)
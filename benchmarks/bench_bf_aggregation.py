@@ -0,0 +1,68 @@
+"""
+Pairwise intersection / union cardinalities of N sensor filters: one bloomfilter_operations call per pair compared with
+a single pass of BloomFilterStack. Both must give the same estimates.
+
+Example:
+    python benchmarks/bench_bf_aggregation.py --sensors 10 50 100
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bloomfilter import BloomFilter
+from bloomfilter_aggregation import BloomFilterStack
+from bloomfilter_operations import calculate_intersection_of_bf, calculate_num_of_element_in_intersection
+
+
+def sensor_filters(sensors, devices, n, k, seed=0):
+    rng = numpy.random.default_rng(seed)
+    population = ["%012x" % value for value in rng.integers(0, 1 << 48, size=4 * devices).tolist()]
+    filters = []
+    for _ in range(sensors):
+        bf = BloomFilter(n, k)
+        bf.anonymization_noise(30)
+        bf.add_many([population[i] for i in rng.choice(len(population), size=devices, replace=False)])
+        filters.append(bf)
+    return filters
+
+
+def pairwise_loop(filters):
+    count = len(filters)
+    result = numpy.zeros((count, count))
+    for i in range(count):
+        for j in range(count):
+            bfi = calculate_intersection_of_bf(filters[i], filters[j])
+            result[i, j] = calculate_num_of_element_in_intersection(filters[i], filters[j], bfi)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sensors", type=int, nargs="+", default=[10, 50, 100], help="Number of sensors.")
+    parser.add_argument("--devices", type=int, default=300, help="Devices seen by every sensor.")
+    parser.add_argument("--n", type=int, default=10000, help="Dimension in bit of the Filters.")
+    parser.add_argument("--k", type=int, default=7, help="Number of hash functions.")
+    opt = vars(parser.parse_args())
+
+    for sensors in opt["sensors"]:
+        filters = sensor_filters(sensors, opt["devices"], opt["n"], opt["k"])
+
+        start = time.perf_counter()
+        expected = pairwise_loop(filters)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        stack = BloomFilterStack(filters)
+        found = stack.pairwise_intersection_cardinality()
+        stack.pairwise_union_cardinality()
+        stack_time = time.perf_counter() - start
+
+        assert numpy.allclose(found, expected, equal_nan=True), "Different estimates"
+        print(f"{sensors:>4} sensors: pairwise calls {loop_time:8.3f} s, stack {stack_time:8.4f} s "
+              f"(x{loop_time / stack_time:.0f})")
@@ -0,0 +1,78 @@
+"""
+Size and speed of the Bloom Filter serialization: the to01() text export compared with the binary format of to_bytes
+(raw, RLE and zlib encodings). Every encoding is round-tripped through from_bytes, for every size in --n (the default
+ones include a size that is not a multiple of 8). The raw payload of a size multiple of 8 must be loaded without a copy,
+read-only on bytes and writable with copy=True, and a zlib payload whose bits do not match the size in the header must
+be rejected.
+
+Example:
+    python benchmarks/bench_bf_serialization.py --n 10000 9999 --k 7 --elements 0 100 1000 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+import zlib
+
+from bitarray import bitarray
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bloomfilter import BloomFilter, ENCODING_RAW, ENCODING_RLE, ENCODING_ZLIB, _HEADER
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, 1e6 * (time.perf_counter() - start) / repeat
+
+
+def from01(text, k):
+    bf = BloomFilter(len(text), k)
+    bf.set_data(bitarray(text))
+    return bf
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, nargs="+", default=[10000, 9999], help="Dimensions in bit of the Filter.")
+    parser.add_argument("--k", type=int, default=7, help="Number of hash functions.")
+    parser.add_argument("--elements", type=int, nargs="+", default=[0, 100, 1000, 5000], help="Inserted elements.")
+    parser.add_argument("--repeat", type=int, default=20, help="Repetitions of every measure.")
+    opt = vars(parser.parse_args())
+
+    for n in opt["n"]:
+        for elements in opt["elements"]:
+            bf = BloomFilter(n, opt["k"])
+            bf.anonymization_noise(30)
+            bf.add_many(["%012x" % i for i in range(elements)])
+            print(f"n={n}, {elements} elements, {bf.get_m()} bits at 1:")
+
+            text, dump_time = timed(bf.get_data, opt["repeat"])
+            _, load_time = timed(lambda: from01(text, opt["k"]), opt["repeat"])
+            print(f"  {'to01':>5}: {len(text):>7} bytes, dump {dump_time:8.1f} us, load {load_time:8.1f} us")
+
+            for name, encoding in (("raw", ENCODING_RAW), ("rle", ENCODING_RLE), ("zlib", ENCODING_ZLIB)):
+                data, dump_time = timed(lambda: bf.to_bytes(encoding), opt["repeat"])
+                loaded, load_time = timed(lambda: BloomFilter.from_bytes(data), opt["repeat"])
+                assert loaded.bit_array == bf.bit_array and loaded.get_m() == bf.get_m(), f"{name} round-trip failed"
+                assert loaded.get_n() == n and len(loaded.bit_array) == n, f"{name} round-trip changed the size"
+                assert loaded.get_num_elem() == bf.get_num_elem() and loaded.get_k() == bf.get_k()
+                # Only the raw payload of a whole number of bytes is shared with data (bytes, so read-only)
+                assert loaded.bit_array.readonly == (encoding == ENCODING_RAW and n % 8 == 0), f"{name} copy"
+                copied = BloomFilter.from_bytes(data, copy=True)
+                assert not copied.bit_array.readonly and copied.bit_array == bf.bit_array, f"{name} copy=True"
+                copied.add("new element")
+                print(f"  {name:>5}: {len(data):>7} bytes, dump {dump_time:8.1f} us, load {load_time:8.1f} us")
+
+            # A zlib payload of one byte more or less than the size in the header
+            header = bf.to_bytes(ENCODING_ZLIB)[:_HEADER.size]
+            packed = bf.bit_array.tobytes()
+            for payload in (packed + b"\x00", packed[:-1]):
+                try:
+                    BloomFilter.from_bytes(header + zlib.compress(payload))
+                except ValueError:
+                    continue
+                raise AssertionError(f"zlib payload of {len(payload)} bytes loaded for n={n}")
@@ -0,0 +1,49 @@
+"""
+Microbenchmark of the Bloom Filter insertion and lookup: one item at a time (add / check) compared with the batch
+API (add_many / check_many). Both must produce the same filter.
+
+Example:
+    python benchmarks/bench_bloomfilter.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bloomfilter import BloomFilter
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000], help="Number of items.")
+    parser.add_argument("--bits_per_item", type=int, default=10, help="Filter size as bits per inserted item.")
+    parser.add_argument("--k", type=int, default=7, help="Number of hash functions.")
+    opt = vars(parser.parse_args())
+
+    rng = numpy.random.default_rng(0)
+    for n in opt["sizes"]:
+        macs = [value.to_bytes(6, "big").hex(":") for value in rng.integers(0, 1 << 48, size=2 * n).tolist()]
+        items, probes = macs[:n], macs[n:]
+
+        single = BloomFilter(opt["bits_per_item"] * n, opt["k"])
+        batch = BloomFilter(opt["bits_per_item"] * n, opt["k"])
+        _, add_time = timed(lambda: [single.add(item) for item in items])
+        _, add_many_time = timed(lambda: batch.add_many(items))
+        expected, check_time = timed(lambda: [single.check(item) for item in probes])
+        found, check_many_time = timed(lambda: batch.check_many(probes))
+
+        assert single.bit_array == batch.bit_array and single.get_m() == batch.get_m(), "Different filters"
+        assert found.tolist() == expected, "Different lookups"
+        print(f"n={n:>8}: add {add_time:7.3f} s, add_many {add_many_time:7.3f} s (x{add_time / add_many_time:5.1f}) | "
+              f"check {check_time:7.3f} s, check_many {check_many_time:7.3f} s (x{check_time / check_many_time:5.1f})")
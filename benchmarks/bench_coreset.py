@@ -0,0 +1,100 @@
+"""
+Accuracy and speed of the clustering on a bounded sample (coreset.py) against the fit on every probe request.
+
+Every trace is parsed once. The reference is count_local_devices with the model of --cluster_fit on all the rows, then
+the same counting runs with every --budgets value. For every budget the script gives the rows given to the model, the
+time of the fit, the number of clusters and of local devices, the error on the local devices and the adjusted Rand index
+of the labels against the reference. A budget of at least the rows of the trace must give the labels of the reference,
+the script exits with status 1 if it does not.
+
+Example:
+    python benchmarks/bench_coreset.py --input_glob "./input/**/*.pcap" --budgets 250 500 1000 2000 \\
+        --cluster_fit weighted --counting_method advanced
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import warnings
+
+import numpy
+from sklearn.metrics import adjusted_rand_score
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(capture, models, opt):
+    # Count the local devices of a capture with the clustering of opt, timing the fit
+    from metrics import Metrics
+    from pipeline import count_local_devices, create_bloom_filter, create_clustering
+    clustering = create_clustering(opt)
+    if opt["cluster_fit"] == "weighted" or opt["cluster_budget"] > 0:
+        data = capture["features"].get_features()
+    else:
+        data = capture["features"].to_dataframe()
+    start = time.perf_counter()
+    clustering.fit(data)
+    seconds = time.perf_counter() - start
+    metrics = Metrics()
+    local = count_local_devices(capture, models, create_bloom_filter(opt), opt, clustering, metrics)
+    return clustering, local, seconds, metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_glob", type=str, default="./input/**/*.pcap", help="Glob of the .pcap traces.")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[250, 500, 1000, 2000],
+                        help="Rows given to the model.")
+    from model_db import load_models
+    from pipeline import add_counting_arguments, create_bloom_filter, parse_records, read_records
+    add_counting_arguments(parser)
+    parser.set_defaults(ingest="raw")
+    opt = vars(parser.parse_args())
+
+    # OPTICS warns about divisions by zero in the reachability ratios of duplicated points
+    warnings.simplefilter("ignore", RuntimeWarning)
+
+    models = load_models(opt["models"], opt["rate_modality"], opt["models_cache"])
+    mismatches = 0
+    for file in sorted(glob.glob(opt["input_glob"], recursive=True)):
+        records = read_records(file, opt["ingest"], opt["power_threshold"])
+        capture = parse_records(records, opt["power_threshold"], create_bloom_filter(opt))
+        rows = len(capture["features"])
+        if rows < opt["min_samples"]:
+            continue
+
+        reference, reference_local, reference_seconds, metrics = run(capture, models, dict(opt, cluster_budget=0))
+        reference_labels = numpy.asarray(reference.labels_)
+        print(json.dumps({
+            "file": os.path.basename(file),
+            "rows": rows,
+            "budget": None,
+            "fit_seconds": round(reference_seconds, 3),
+            "clusters": metrics.counters.get("clusters"),
+            "local": reference_local,
+        }))
+
+        for budget in opt["budgets"]:
+            coreset, local, seconds, metrics = run(capture, models, dict(opt, cluster_budget=budget))
+            labels = numpy.asarray(coreset.labels_)
+            if budget >= rows and not numpy.array_equal(labels, reference_labels):
+                mismatches += 1
+            print(json.dumps({
+                "file": os.path.basename(file),
+                "rows": rows,
+                "budget": budget,
+                "cells": coreset.n_cells_,
+                "sample_rows": coreset.sample_size_,
+                "fit_seconds": round(seconds, 3),
+                "speedup": round(reference_seconds / seconds, 2) if seconds else None,
+                "clusters": metrics.counters.get("clusters"),
+                "local": local,
+                "local_error": local - reference_local,
+                "adjusted_rand": round(float(adjusted_rand_score(reference_labels, labels)), 4),
+            }))
+
+    print(json.dumps({"mismatches": mismatches}))
+    sys.exit(1 if mismatches else 0)
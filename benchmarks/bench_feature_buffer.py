@@ -0,0 +1,61 @@
+"""
+Scaling of the feature collection: FeatureBuffer compared with the old one-row pd.concat loop.
+
+The time per probe of FeatureBuffer must stay flat when the number of probes grows (linear total cost), while the
+pd.concat loop grows linearly per probe (quadratic total cost), so it is only run up to --concat_max probes.
+
+Example:
+    python benchmarks/bench_feature_buffer.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feature_buffer import FeatureBuffer
+
+
+def synthetic_probes(n, seed=0):
+    rng = numpy.random.default_rng(seed)
+    quadruplets = rng.integers(-1, 1 << 20, size=(n, 4)).tolist()
+    macs = ["02:00:00:%02x:%02x:%02x" % (i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff) for i in rng.integers(0, n // 10 + 1, n)]
+    return quadruplets, macs
+
+
+def collect_buffer(quadruplets, macs):
+    features = FeatureBuffer()
+    for i, (quadruplet, mac) in enumerate(zip(quadruplets, macs)):
+        features.append(quadruplet, mac, float(i), -50)
+    return features.to_dataframe()
+
+
+def collect_concat(quadruplets, macs):
+    df = pd.DataFrame([])
+    for quadruplet in quadruplets:
+        new_df = pd.DataFrame(
+            {"vht_cap": [quadruplet[0]], "ext_cap": [quadruplet[1]], "ht_cap": [quadruplet[2]], "vendor": [quadruplet[3]]})
+        df = pd.concat([df, new_df], ignore_index=True)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000], help="Number of probes.")
+    parser.add_argument("--concat_max", type=int, default=10000, help="Largest size run with the pd.concat loop.")
+    opt = vars(parser.parse_args())
+
+    for n in opt["sizes"]:
+        quadruplets, macs = synthetic_probes(n)
+        for name, func in (("buffer", collect_buffer), ("concat", collect_concat)):
+            if name == "concat" and n > opt["concat_max"]:
+                continue
+            start = time.perf_counter()
+            func(quadruplets, macs)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>6} n={n:>8}: {elapsed:8.3f} s, {1e9 * elapsed / n:8.0f} ns/probe")
@@ -0,0 +1,96 @@
+"""
+Measure the fingerprint cache of the raw ingest on the bundled captures.
+
+Every trace is read three times with the raw fast path (best of --repeat runs):
+- nocache: every fingerprint is decoded;
+- cold: with an empty cache of --size fingerprints;
+- warm: with the cache saved by the cold run and loaded again, as after the restart of a sensor.
+The records must be identical in the three runs. Exits with status 1 if they differ.
+
+Example:
+    python benchmarks/bench_fingerprint_cache.py --input_glob "./input/thesis_tests/*.pcap" --size 65536
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def read(file, power_threshold, repeat, make_cache):
+    # Best time of repeat runs, every run with its own cache
+    best = None
+    for _ in range(repeat):
+        cache = make_cache()
+        start = time.perf_counter()
+        records = list(stream_frame_records(file, power_threshold, cache=cache))
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best[0]:
+            best = (seconds, records, cache)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_glob", type=str, default="./input/**/*.pcap", help="Glob of the .pcap traces.")
+    parser.add_argument("--size", type=int, default=65536, help="Fingerprints kept by the cache.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of every kind, the best one is reported.")
+    parser.add_argument("--power_threshold", type=int, default=-70, help="Threshold for the capturing power.")
+    opt = vars(parser.parse_args())
+
+    from fingerprint_cache import FingerprintCache
+    from frame_parser import stream_frame_records
+
+    mismatches = 0
+    totals = {"nocache": 0.0, "cold": 0.0, "warm": 0.0, "hits": 0, "lookups": 0}
+    fd, cache_path = tempfile.mkstemp(suffix=".npz")
+    os.close(fd)
+    try:
+        for file in sorted(glob.glob(opt["input_glob"], recursive=True)):
+            nocache_seconds, expected, _ = read(file, opt["power_threshold"], opt["repeat"], lambda: None)
+            cold_seconds, cold_records, cold = read(file, opt["power_threshold"], opt["repeat"],
+                                                    lambda: FingerprintCache(opt["size"]))
+            cold.save(cache_path)
+            warm_seconds, warm_records, warm = read(file, opt["power_threshold"], opt["repeat"],
+                                                    lambda: FingerprintCache.load(cache_path, opt["size"]))
+
+            same = expected == cold_records == warm_records
+            mismatches += not same
+            totals["nocache"] += nocache_seconds
+            totals["cold"] += cold_seconds
+            totals["warm"] += warm_seconds
+            totals["hits"] += cold.hits
+            totals["lookups"] += cold.hits + cold.misses
+            print(json.dumps({
+                "file": os.path.relpath(file),
+                "frames": len(expected),
+                "fingerprints": cold.hits + cold.misses,
+                "distinct": len(cold),
+                "cold_hit_rate": round(cold.hit_rate(), 4),
+                "warm_hit_rate": round(warm.hit_rate(), 4),
+                "nocache_ms": round(nocache_seconds * 1000, 1),
+                "cold_ms": round(cold_seconds * 1000, 1),
+                "warm_ms": round(warm_seconds * 1000, 1),
+                "cold_speedup": round(nocache_seconds / cold_seconds, 2),
+                "warm_speedup": round(nocache_seconds / warm_seconds, 2),
+                "same_records": same,
+            }))
+    finally:
+        os.remove(cache_path)
+
+    if totals["lookups"]:
+        print(json.dumps({
+            "cold_hit_rate": round(totals["hits"] / totals["lookups"], 4),
+            "nocache_seconds": round(totals["nocache"], 3),
+            "cold_seconds": round(totals["cold"], 3),
+            "warm_seconds": round(totals["warm"], 3),
+            "cold_speedup": round(totals["nocache"] / totals["cold"], 2),
+            "warm_speedup": round(totals["nocache"] / totals["warm"], 2),
+            "mismatches": mismatches,
+        }))
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,188 @@
+"""
+Replay the bundled captures into follow.py at accelerated speed and compare its counts with the offline windows.
+
+Every trace is written record by record, sleeping the capture gaps divided by --speed, into:
+- pipe: the standard input of follow.py;
+- fifo: a named pipe given as --input_file;
+- directory: capture files of --rotate records each in a temporary directory tailed with --directory.
+Each row of follow.py must give the counts of windowed.WindowedCounter on the whole trace read offline (with
+--on_full drop the counts are not compared, only the drop counters are reported). The latency of a row is the wall
+time between the moment its window_end was replayed and the moment the row was read.
+Exits with status 1 if any count differs or a frame is lost without being counted as dropped.
+
+Example:
+    python benchmarks/bench_follow.py --input_glob "./input/test_5_different_time/*.pcap" --speed 100 --mode pipe
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FOLLOW = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "follow.py")
+
+
+def read_trace(file):
+    from pcap_stream import read_pcap_header, record_time
+
+    with open(file, "rb") as f:
+        endian, nano, _ = read_pcap_header(f)
+        f.seek(0)
+        header = f.read(24)
+        data = f.read()
+    record_header = struct.Struct(endian + "IIII")
+    records = []
+    offset = 0
+    while offset + 16 <= len(data):
+        sec, frac, caplen, _ = record_header.unpack_from(data, offset)
+        records.append((record_time(sec, frac, nano), data[offset:offset + 16 + caplen]))
+        offset += 16 + caplen
+    return header, records
+
+
+def replay(header, records, speed, out_files, replayed):
+    # Write the records to the files given by out_files(i), keeping the capture gaps divided by speed,
+    # replayed collects (capture time, wall time) of every record
+    start_wall = time.perf_counter()
+    first = records[0][0] if records else 0
+    f = None
+    for i, (timestamp, record) in enumerate(records):
+        if speed > 0:
+            delay = start_wall + (timestamp - first) / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        new_f = out_files(i)
+        if new_f is not f:
+            if f is not None:
+                f.close()
+            f = new_f
+            f.write(header)
+        f.write(record)
+        f.flush()
+        replayed.append((timestamp, time.perf_counter()))
+    if f is not None:
+        f.close()
+
+
+def run_follow(file, opt, offline):
+    header, records = read_trace(file)
+    args = [sys.executable, "-W", "ignore", FOLLOW, "--window", str(opt["window"]), "--step", str(opt["step"]),
+            "--max_queue", str(opt["max_queue"]), "--on_full", opt["on_full"], "--ingest", "raw",
+            "--format", "jsonl"]
+    replayed = []
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if opt["mode"] == "pipe":
+            process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+            def out_files(i):
+                return process.stdin
+        elif opt["mode"] == "fifo":
+            fifo = os.path.join(tmp_dir, "capture.fifo")
+            os.mkfifo(fifo)
+            process = subprocess.Popen(args + ["--input_file", fifo], stdout=subprocess.PIPE)
+            pipe = open(fifo, "wb")
+
+            def out_files(i):
+                return pipe
+        else:
+            process = subprocess.Popen(args + ["--directory", tmp_dir, "--pattern", "capture_*.pcap", "--poll", "0.05",
+                                               "--idle_exit", "2"], stdout=subprocess.PIPE)
+            opened = {}
+
+            def out_files(i):
+                # One file per --rotate records, as tcpdump -C / -G does
+                part = i // opt["rotate"]
+                if part not in opened:
+                    opened.clear()
+                    opened[part] = open(os.path.join(tmp_dir, f"capture_{part:05d}.pcap"), "wb")
+                return opened[part]
+
+        def read_rows():
+            for line in process.stdout:
+                rows.append((json.loads(line), time.perf_counter()))
+
+        reader = threading.Thread(target=read_rows)
+        reader.start()
+        start = time.perf_counter()
+        replay(header, records, opt["speed"], out_files, replayed)
+        process.wait()
+        seconds = time.perf_counter() - start
+        reader.join()
+
+    # Wall time at which the first record at or after every window end was replayed
+    latencies = []
+    position = 0
+    for row, wall in rows:
+        while position < len(replayed) and replayed[position][0] < row["window_end"]:
+            position += 1
+        if position < len(replayed):
+            latencies.append(wall - replayed[position][1])
+
+    last = rows[-1][0] if rows else {}
+    counts = [tuple(row[key] for key in ("window_start", "packets", "global", "local")) for row, _ in rows]
+    expected = [tuple(row[key] for key in ("window_start", "packets", "global", "local")) for row in offline]
+    # Every record written must have been read, either queued or counted as dropped
+    lost = last.get("frames_read") != len(records)
+    same = counts == expected if opt["on_full"] == "block" else None
+    return {
+        "file": os.path.basename(file),
+        "mode": opt["mode"],
+        "frames": len(records),
+        "windows": len(rows),
+        "replay_seconds": round(seconds, 3),
+        "median_latency_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "max_latency_ms": round(max(latencies) * 1000, 1) if latencies else None,
+        "frames_dropped": last.get("frames_dropped"),
+        "backpressure_waits": last.get("backpressure_waits"),
+        "queue_high_water": last.get("queue_high_water"),
+        "same_counts": same,
+        "lost_frames": lost,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_glob", type=str, default="./input/test_5_different_time/*.pcap",
+                        help="Glob of the .pcap traces.")
+    parser.add_argument("--mode", type=str, choices=["pipe", "fifo", "directory"], default="pipe",
+                        help="How the records reach follow.py.")
+    parser.add_argument("--speed", type=float, default=100,
+                        help="Replay speed as a multiple of the capture time, 0 to write as fast as possible.")
+    parser.add_argument("--rotate", type=int, default=500, help="Records per capture file in the directory mode.")
+    parser.add_argument("--window", type=float, default=60, help="Length of the sliding window in seconds.")
+    parser.add_argument("--step", type=float, default=30, help="Seconds between two consecutive counts.")
+    parser.add_argument("--max_queue", type=int, default=10000, help="Records waiting to be parsed at most.")
+    parser.add_argument("--on_full", type=str, choices=["block", "drop"], default="block",
+                        help="When the queue of follow.py is full wait for the parser (block) or discard (drop).")
+    opt = vars(parser.parse_args())
+
+    from pipeline import default_options, read_records
+    from model_db import load_models
+    from windowed import WindowedCounter
+
+    logging.basicConfig(level=logging.ERROR)
+    counting = dict(default_options(), ingest="raw")
+    models = load_models(counting["models"], counting["rate_modality"], counting["models_cache"])
+
+    mismatches = 0
+    for file in sorted(glob.glob(opt["input_glob"])):
+        counter = WindowedCounter(opt["window"], opt["step"], counting, models)
+        records = read_records(file, "raw", counting["power_threshold"])
+        offline = list(counter.feed(records)) + list(counter.flush())
+        result = run_follow(file, opt, offline)
+        mismatches += result["same_counts"] is False or result["lost_frames"]
+        print(json.dumps(result))
+
+    print(json.dumps({"mismatches": mismatches}))
+    sys.exit(1 if mismatches else 0)
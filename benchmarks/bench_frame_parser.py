@@ -0,0 +1,41 @@
+"""
+Packets/sec of the scapy dissection compared with the raw-bytes fast path.
+
+Both paths produce the (timestamp, rssi, src_mac, quadruplet) records consumed by the parse loop of argo.py.
+
+Example:
+    python benchmarks/bench_frame_parser.py --input_glob "./input/thesis_tests/*.pcap"
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frame_parser import scapy_record, stream_frame_records
+from pcap_stream import stream_packets
+
+
+def run(records):
+    start = time.perf_counter()
+    packets = sum(1 for _ in records)
+    return packets, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_glob", type=str, default="./input/thesis_tests/*.pcap", help="Glob of the .pcap traces.")
+    parser.add_argument("--power_threshold", type=int, default=-70, help="Threshold for the capturing power.")
+    opt = vars(parser.parse_args())
+
+    threshold = opt["power_threshold"]
+    for file in sorted(glob.glob(opt["input_glob"], recursive=True)):
+        packets, scapy_time = run(scapy_record(packet, threshold) for packet in stream_packets(file))
+        stats = {}
+        _, raw_time = run(stream_frame_records(file, threshold, stats))
+        print(f"{os.path.basename(file)}: {packets} packets, "
+              f"scapy {packets / scapy_time:9.0f} pkt/s, raw {packets / raw_time:9.0f} pkt/s "
+              f"(x{scapy_time / raw_time:.1f}, {stats['fallback']} fallbacks)")
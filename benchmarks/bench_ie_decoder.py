@@ -0,0 +1,71 @@
+"""
+Parity check and per-packet microbenchmark of the fingerprint decoders.
+
+For every locally administered probe request of the bundled captures the quadruplet is computed with the show2 text
+round-trip (show2_quadruplet), with the Dot11Elt walk (extract_quadruplet) and with the raw tagged parameters
+(quadruplet_from_ies). Any mismatch is reported and makes the script exit with status 1.
+
+Example:
+    python benchmarks/bench_ie_decoder.py --input_glob "./input/thesis_tests/*.pcap"
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scapy.all import raw
+from scapy.layers.dot11 import Dot11ProbeReq
+from argo import show2_quadruplet
+from ie_decoder import extract_quadruplet, quadruplet_from_ies
+from pcap_stream import stream_packets
+
+
+def local_probes(file):
+    for packet in stream_packets(file):
+        if packet.haslayer(Dot11ProbeReq) and int(packet.addr2[1], 16) & 2:
+            yield packet
+
+
+def timed(func, packets):
+    start = time.perf_counter()
+    results = [func(packet) for packet in packets]
+    return results, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_glob", type=str, default="./input/**/*.pcap", help="Glob of the .pcap traces.")
+    opt = vars(parser.parse_args())
+
+    decoders = {
+        "show2": show2_quadruplet,
+        "dot11elt": extract_quadruplet,
+        "raw_ies": lambda packet: quadruplet_from_ies(raw(packet[Dot11ProbeReq].payload)),
+    }
+    totals = {name: 0.0 for name in decoders}
+    total_packets = 0
+    mismatches = 0
+    for file in sorted(glob.glob(opt["input_glob"], recursive=True)):
+        packets = list(local_probes(file))
+        if not packets:
+            continue
+        results = {}
+        for name, func in decoders.items():
+            results[name], elapsed = timed(func, packets)
+            totals[name] += elapsed
+        for name in ("dot11elt", "raw_ies"):
+            for i, (expected, got) in enumerate(zip(results["show2"], results[name])):
+                if expected != got:
+                    mismatches += 1
+                    print(f"MISMATCH {file} probe {i} {name}: {got} != {expected}")
+        total_packets += len(packets)
+        print(f"{os.path.basename(file)}: {len(packets)} probes")
+
+    for name, elapsed in totals.items():
+        print(f"{name:>8}: {1e6 * elapsed / max(total_packets, 1):8.1f} us/packet")
+    print(f"{total_packets} probes, {mismatches} mismatches")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,58 @@
+"""
+Compare the rdpcap ingest with the streaming reader.
+
+Every mode runs in a fresh interpreter so that the peak RSS reported by the kernel belongs to that mode only.
+
+Example:
+    python benchmarks/bench_ingest.py --input_file ./input/test_5_different_time/20_minutes.pcap
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_mode(file, mode):
+    from scapy.all import rdpcap
+    from pcap_stream import stream_packets
+
+    start = time.perf_counter()
+    capture = rdpcap(file) if mode == "rdpcap" else stream_packets(file)
+    packets = 0
+    for packet in capture:
+        # Touch the fields used by the parse loop so that both modes do the same work
+        _ = (packet.dBm_AntSignal, packet.addr2)
+        packets += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "packets": packets,
+        "seconds": round(elapsed, 3),
+        "packets_per_sec": round(packets / elapsed, 1) if elapsed > 0 else None,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_file", type=str, default="./input/test_5_different_time/20_minutes.pcap",
+                        help="Path for the .pcap trace.")
+    parser.add_argument("--child", type=str, choices=["stream", "rdpcap"], default=None, help=argparse.SUPPRESS)
+    opt = vars(parser.parse_args())
+
+    if opt["child"]:
+        print(json.dumps(run_mode(opt["input_file"], opt["child"])))
+        sys.exit(0)
+
+    for mode in ("rdpcap", "stream"):
+        out = subprocess.run([sys.executable, __file__, "--input_file", opt["input_file"], "--child", mode],
+                             check=True, capture_output=True, text=True).stdout
+        print(out.strip())
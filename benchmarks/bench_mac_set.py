@@ -0,0 +1,75 @@
+"""
+Deduplication of the globally unique MAC addresses: list scan + Bloom Filter on every packet (old loop) compared with
+MacSet + Bloom Filter insertion once per new address.
+
+The probe requests of the bundled captures are used first, then a synthetic venue with --devices non-randomizing
+devices sending --packets probe requests.
+
+Example:
+    python benchmarks/bench_mac_set.py --input_glob "./input/**/*.pcap" --devices 5000 --packets 200000
+"""
+
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bloomfilter import BloomFilter
+from frame_parser import stream_frame_records
+from mac_set import MacSet, is_locally_administered
+
+
+def dedup_list(macs):
+    bf = BloomFilter(10000, 7)
+    global_mac_list = list()
+    for src in macs:
+        if not bf.check(src):
+            bf.add(src)
+        if src not in global_mac_list:
+            global_mac_list.append(src)
+    return len(global_mac_list), bf.get_m()
+
+
+def dedup_set(macs):
+    bf = BloomFilter(10000, 7)
+    global_macs = MacSet()
+    for src in macs:
+        if global_macs.add(src):
+            if not bf.check(src):
+                bf.add(src)
+    return len(global_macs), bf.get_m()
+
+
+def compare(name, macs):
+    results = {}
+    for label, func in (("list", dedup_list), ("set", dedup_set)):
+        start = time.perf_counter()
+        results[label] = func(macs)
+        elapsed = time.perf_counter() - start
+        rate = len(macs) / elapsed if elapsed > 0 else float("inf")
+        print(f"{name}: {label:>4} {len(macs):>7} probes, {results[label][0]:>5} devices, "
+              f"{results[label][1]:>5} BF bits, {rate:12.0f} probes/s")
+    assert results["list"] == results["set"], "Different results"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_glob", type=str, default="./input/**/*.pcap", help="Glob of the .pcap traces.")
+    parser.add_argument("--power_threshold", type=int, default=-70, help="Threshold for the capturing power.")
+    parser.add_argument("--devices", type=int, default=5000, help="Synthetic globally unique devices.")
+    parser.add_argument("--packets", type=int, default=200000, help="Synthetic probe requests.")
+    opt = vars(parser.parse_args())
+
+    for file in sorted(glob.glob(opt["input_glob"], recursive=True)):
+        macs = [src for _, rssi, src, quadruplet in stream_frame_records(file, opt["power_threshold"])
+                if rssi > opt["power_threshold"] and quadruplet is not None and not is_locally_administered(src)]
+        if macs:
+            compare(os.path.basename(file), macs)
+
+    rng = random.Random(0)
+    devices = ["00:%02x:%02x:%02x:%02x:%02x" % tuple(rng.randrange(256) for _ in range(5)) for _ in range(opt["devices"])]
+    compare("synthetic", [rng.choice(devices) for _ in range(opt["packets"])])
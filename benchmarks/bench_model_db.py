@@ -0,0 +1,108 @@
+"""
+Measure the start-up cost of the device-model database: JSON parsing against the compiled artifact.
+
+For every database size three kinds of start are timed, each one in a fresh interpreter:
+- json: models.json parsed and indexed as before (model_db.load_rates + ModelMatcher);
+- cold: no artifact yet, the JSON is compiled, written and mapped;
+- warm: the artifact is valid and only mapped.
+The synthetic databases repeat the cap_id vectors of models.json with some noise. Exits with status 1 if the warm
+matcher differs from the one built from the JSON.
+
+Example:
+    python benchmarks/bench_model_db.py --sizes 14 1000 10000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def write_database(path, size, rng):
+    with open("./models.json", "r") as fr:
+        base = list(json.load(fr).values())
+    models = dict()
+    for i in range(size):
+        values = dict(base[i % len(base)])
+        if i >= len(base):
+            values["cap_id"] = [c + int(rng.integers(-50, 51)) for c in values["cap_id"]]
+        values["id"] = i + 1
+        models[f"Model {i + 1}"] = values
+    with open(path, "w") as fw:
+        json.dump(models, fw, indent=4)
+
+
+def run_child(mode, models_path, rate_modality):
+    from model_db import load_models, load_rates
+    from model_matching import ModelMatcher
+
+    start = time.perf_counter()
+    if mode == "json":
+        matcher = ModelMatcher(load_rates(models_path, rate_modality))
+    else:
+        matcher = load_models(models_path, rate_modality)
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "caps": matcher.caps.tolist(), "rates": matcher.rates.tolist()}
+
+
+def child(mode, models_path, rate_modality):
+    out = subprocess.run([sys.executable, __file__, "--child", mode, "--models", models_path,
+                          "--rate_modality", rate_modality], check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[14, 1000, 10000], help="Number of device models.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of every kind of start, the best one is reported.")
+    parser.add_argument("--rate_modality", type=str, default="mean_rate", help="Rate to get from the database.")
+    parser.add_argument("--models", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--child", type=str, choices=["json", "cold", "warm"], default=None, help=argparse.SUPPRESS)
+    opt = vars(parser.parse_args())
+
+    if opt["child"]:
+        print(json.dumps(run_child(opt["child"], opt["models"], opt["rate_modality"])))
+        sys.exit(0)
+
+    from model_db import default_cache_path
+
+    rng = numpy.random.default_rng(0)
+    mismatches = 0
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for size in opt["sizes"]:
+            models_path = os.path.join(tmp_dir, f"models_{size}.json")
+            cache_path = default_cache_path(models_path)
+            write_database(models_path, size, rng)
+
+            timings = {"json": [], "cold": [], "warm": []}
+            results = {}
+            for _ in range(opt["repeat"]):
+                for mode in ("json", "cold", "warm"):
+                    if mode == "cold" and os.path.exists(cache_path):
+                        os.remove(cache_path)
+                    start = time.perf_counter()
+                    results[mode] = child(mode, models_path, opt["rate_modality"])
+                    timings[mode].append((results[mode]["seconds"], time.perf_counter() - start))
+
+            same = results["warm"]["caps"] == results["json"]["caps"] and \
+                results["warm"]["rates"] == results["json"]["rates"]
+            mismatches += not same
+            row = {"models": size, "json_mb": round(os.path.getsize(models_path) / 2 ** 20, 2),
+                   "artifact_mb": round(os.path.getsize(cache_path) / 2 ** 20, 2), "same_models": same}
+            for mode, values in timings.items():
+                row[f"{mode}_load_ms"] = round(min(v[0] for v in values) * 1000, 2)
+                row[f"{mode}_process_ms"] = round(min(v[1] for v in values) * 1000, 1)
+            print(json.dumps(row))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    sys.exit(1 if mismatches else 0)
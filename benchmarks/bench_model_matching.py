@@ -0,0 +1,88 @@
+"""
+Compare the original scan of the device-model database with the KD-tree matcher on a synthetic database.
+
+The synthetic models are drawn around the cap_id vectors of models.json, with repeated vectors (averaged rates) and
+queries placed exactly halfway between two models (ties). Exits with status 1 if any rate differs from the scan.
+
+Example:
+    python benchmarks/bench_model_matching.py --models 10000 --queries 200
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy
+from scipy import spatial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def scan_rate(rates_dict, point):
+    # Original selection of argo.py: closest model in database order, rate averaged over the same cap_id
+    min_dist = rates_dict[min(rates_dict.keys(), key=lambda k: spatial.distance.euclidean(rates_dict[k][0], point))][0]
+    closest_rates = [rates_dict[k][1] for k in rates_dict.keys() if min_dist == rates_dict[k][0]]
+    return sum(closest_rates) / len(closest_rates)
+
+
+def synthetic_database(base, count, rng):
+    caps = numpy.array([cap for cap, _ in base.values()], dtype=numpy.int64)
+    rates_dict = dict()
+    for i in range(count):
+        if i and rng.random() < 0.1:
+            # Same cap_id of an existing model, the rates must be averaged
+            cap = rates_dict[int(rng.integers(1, i + 1))][0]
+        else:
+            cap = (caps[rng.integers(len(caps))] + rng.integers(-50, 51, size=caps.shape[1])).tolist()
+        rates_dict[i + 1] = (cap, round(float(rng.uniform(0.05, 2.0)), 2))
+    return rates_dict
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", type=int, default=10000, help="Number of synthetic device models.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of cluster centroids to match.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data.")
+    opt = vars(parser.parse_args())
+
+    from model_db import load_rates
+    from model_matching import ModelMatcher
+
+    rng = numpy.random.default_rng(opt["seed"])
+    rates_dict = synthetic_database(load_rates("./models.json", "mean_rate"), opt["models"], rng)
+    caps = [cap for cap, _ in rates_dict.values()]
+
+    queries = []
+    for _ in range(opt["queries"]):
+        a, b = rng.integers(len(caps), size=2)
+        if rng.random() < 0.2:
+            # Halfway between two models, both at the same distance
+            queries.append(((numpy.array(caps[a]) + numpy.array(caps[b])) / 2).tolist())
+        else:
+            queries.append((numpy.array(caps[a]) + rng.normal(0, 20, size=len(caps[a]))).tolist())
+
+    start = time.perf_counter()
+    expected = [scan_rate(rates_dict, q) for q in queries]
+    scan_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matcher = ModelMatcher(rates_dict)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rates = matcher.match_rates(queries).tolist()
+    query_seconds = time.perf_counter() - start
+
+    mismatches = sum(1 for e, r in zip(expected, rates) if e != r)
+    print(json.dumps({
+        "models": len(rates_dict),
+        "distinct_cap_ids": len(matcher.caps),
+        "queries": len(queries),
+        "mismatches": mismatches,
+        "scan_seconds": round(scan_seconds, 3),
+        "build_seconds": round(build_seconds, 4),
+        "query_seconds": round(query_seconds, 4),
+    }))
+    sys.exit(1 if mismatches else 0)
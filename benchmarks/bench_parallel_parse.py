@@ -0,0 +1,117 @@
+"""
+Measure the intra-file parallel parsing against the sequential parse loop of argo.py.
+
+Every trace is parsed once sequentially (argo.read_records + argo.parse_records) and then with parallel_parse for every
+number of workers, with as many record-aligned ranges as workers. The captures must be identical: counters, flat_time,
+TIME_WINDOW, probe rows (fingerprints, MAC addresses, timestamps, RSSI) and Bloom Filter (built without the random anonymization noise).
+With --repeat the trace is first concatenated with itself (timestamps shifted after the previous copy) into a larger
+temporary trace, to measure the scaling on something bigger than the sample captures.
+Exits with status 1 if any capture differs.
+
+Example:
+    python benchmarks/bench_parallel_parse.py --input_file ./input/thesis_tests/E_test_120.pcap --repeat 20
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def repeat_trace(file, out, copies):
+    from pcap_stream import read_pcap_header
+
+    with open(file, "rb") as f:
+        endian, _, _ = read_pcap_header(f)
+        f.seek(0)
+        header = f.read(24)
+        data = f.read()
+
+    record_header = struct.Struct(endian + "IIII")
+    records = []
+    offset = 0
+    while offset + 16 <= len(data):
+        sec, frac, caplen, length = record_header.unpack_from(data, offset)
+        records.append((sec, frac, caplen, length, data[offset + 16:offset + 16 + caplen]))
+        offset += 16 + caplen
+    span = records[-1][0] - records[0][0] + 1 if records else 0
+
+    with open(out, "wb") as fw:
+        fw.write(header)
+        for copy in range(copies):
+            for sec, frac, caplen, length, payload in records:
+                fw.write(record_header.pack(sec + copy * span, frac, caplen, length))
+                fw.write(payload)
+
+
+def same_capture(a, b, bf_a, bf_b) -> bool:
+    return (a["flat_time"] == b["flat_time"] and a["time_window"] == b["time_window"] and
+            a["frame_counter"] == b["frame_counter"] and a["pkt_counter"] == b["pkt_counter"] and
+            a["probe_counter"] == b["probe_counter"] and
+            a["global_counter"] == b["global_counter"] and a["global_macs"].values == b["global_macs"].values and
+            numpy.array_equal(a["features"].get_features(), b["features"].get_features()) and
+            numpy.array_equal(a["features"].get_macs(), b["features"].get_macs()) and
+            numpy.array_equal(a["features"].get_times(), b["features"].get_times()) and
+            numpy.array_equal(a["features"].get_rssi(), b["features"].get_rssi()) and
+            bf_a.bit_array == bf_b.bit_array and bf_a.num_elem == bf_b.num_elem)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_file", type=str, default="./input/thesis_tests/E_test_120.pcap",
+                        help="Path of the .pcap trace.")
+    parser.add_argument("--repeat", type=int, default=1, help="Copies of the trace concatenated before parsing.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Numbers of worker processes.")
+    parser.add_argument("--power_threshold", type=int, default=-70, help="Threshold for the capturing power.")
+    parser.add_argument("--ingest", type=str, choices=["stream", "raw"], default="raw",
+                        help="Frames dissected by scapy (stream) or by the raw fast path (raw).")
+    opt = vars(parser.parse_args())
+
+    from pipeline import parse_records, read_records
+    from bloomfilter import BloomFilter
+    from parallel_parse import parse_parallel
+
+    tmp_file = None
+    file = opt["input_file"]
+    if opt["repeat"] > 1:
+        fd, tmp_file = tempfile.mkstemp(suffix=".pcap")
+        os.close(fd)
+        repeat_trace(file, tmp_file, opt["repeat"])
+        file = tmp_file
+
+    mismatches = 0
+    try:
+        size_mb = round(os.path.getsize(file) / 2 ** 20, 2)
+        start = time.perf_counter()
+        expected_bf = BloomFilter(10000, 7)
+        expected = parse_records(read_records(file, opt["ingest"], opt["power_threshold"]), opt["power_threshold"],
+                                 expected_bf)
+        sequential_seconds = time.perf_counter() - start
+        print(json.dumps({"workers": "sequential", "trace_mb": size_mb, "frames": expected["frame_counter"],
+                          "seconds": round(sequential_seconds, 3),
+                          "frames_per_sec": round(expected["frame_counter"] / sequential_seconds, 1)}))
+
+        for workers in opt["workers"]:
+            start = time.perf_counter()
+            bf = BloomFilter(10000, 7)
+            capture = parse_parallel(file, opt["power_threshold"], bf, workers, fast=opt["ingest"] == "raw")
+            seconds = time.perf_counter() - start
+            same = same_capture(expected, capture, expected_bf, bf)
+            mismatches += not same
+            print(json.dumps({"workers": workers, "trace_mb": size_mb, "frames": capture["frame_counter"],
+                              "seconds": round(seconds, 3),
+                              "frames_per_sec": round(capture["frame_counter"] / seconds, 1),
+                              "speedup": round(sequential_seconds / seconds, 2), "same_capture": same}))
+    finally:
+        if tmp_file:
+            os.remove(tmp_file)
+
+    print(json.dumps({"cpus": os.cpu_count(), "mismatches": mismatches}))
+    sys.exit(1 if mismatches else 0)
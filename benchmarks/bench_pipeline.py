@@ -0,0 +1,97 @@
+"""
+Measure the per-call latency of the embedded pipeline against a new argo.py process per run.
+
+For every trace the same count is obtained three ways:
+- process: python argo.py --input_file <trace>, as a collector calling the script would do;
+- embedded: Pipeline.run(<trace>) on a pipeline created once, the device-model database and Bloom Filter stay warm;
+- feed: Pipeline.reset + feed of the raw (timestamp, data) records + count, as a collector receiving frames would do.
+Exits with status 1 if the three counts differ.
+
+Example:
+    python benchmarks/bench_pipeline.py --input_glob "./input/test_5_different_time/*.pcap" --repeat 5
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ARGO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "argo.py")
+
+
+def process_run(file, ingest):
+    out = subprocess.run([sys.executable, "-W", "ignore", ARGO, "--input_file", file, "--ingest", ingest],
+                         check=True, capture_output=True, text=True).stderr
+    global_devices = int(re.search(r"globally unique MAC addresses: (\d+)", out).group(1))
+    local_devices = int(re.search(r"locally administered MAC addresses: (\d+)", out).group(1))
+    return global_devices, local_devices
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_glob", type=str, default="./input/test_5_different_time/*.pcap",
+                        help="Glob of the .pcap traces.")
+    parser.add_argument("--repeat", type=int, default=3, help="Calls of every kind per trace, the median is reported.")
+    parser.add_argument("--ingest", type=str, choices=["stream", "rdpcap", "raw"], default="raw",
+                        help="How the traces are read.")
+    opt = vars(parser.parse_args())
+
+    logging.basicConfig(level=logging.ERROR)
+
+    from pcap_stream import stream_records
+    from pipeline import Pipeline
+
+    start = time.perf_counter()
+    pipeline = Pipeline(ingest=opt["ingest"])
+    create_seconds = time.perf_counter() - start
+    print(json.dumps({"pipeline_create_ms": round(create_seconds * 1000, 1)}))
+
+    mismatches = 0
+    process_all, embedded_all = [], []
+    for file in sorted(glob.glob(opt["input_glob"])):
+        process_times, embedded_times, feed_times = [], [], []
+        for _ in range(opt["repeat"]):
+            start = time.perf_counter()
+            expected = process_run(file, opt["ingest"])
+            process_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            result = pipeline.run(file)
+            embedded_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            pipeline.reset()
+            pipeline.feed(stream_records(file))
+            fed = pipeline.count()
+            feed_times.append(time.perf_counter() - start)
+
+        counts = {(result.global_devices, result.local_devices), (fed.global_devices, fed.local_devices), expected}
+        mismatches += len(counts) > 1
+        process_all += process_times
+        embedded_all += embedded_times
+        print(json.dumps({
+            "file": os.path.basename(file),
+            "frames": result.frames,
+            "total": result.total_devices,
+            "same_counts": len(counts) == 1,
+            "process_ms": round(statistics.median(process_times) * 1000, 1),
+            "embedded_ms": round(statistics.median(embedded_times) * 1000, 1),
+            "feed_ms": round(statistics.median(feed_times) * 1000, 1),
+        }))
+
+    if process_all:
+        print(json.dumps({
+            "median_process_ms": round(statistics.median(process_all) * 1000, 1),
+            "median_embedded_ms": round(statistics.median(embedded_all) * 1000, 1),
+            "speedup": round(statistics.median(process_all) / statistics.median(embedded_all), 1),
+            "mismatches": mismatches,
+        }))
+    sys.exit(1 if mismatches else 0)
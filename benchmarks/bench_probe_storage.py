@@ -0,0 +1,85 @@
+"""
+Measure the memory held by the per-probe state of a capture, from the parsing to the end of the counting.
+
+The records of the trace are read first and kept outside the measure. With --copies the records are repeated, shifted
+in time after the previous copy and with the locally administered addresses changed in every copy (as randomized
+addresses would be), to get captures of millions of probe requests from the sample traces. The memory is traced with
+tracemalloc while pipeline.parse_records and pipeline.count_local_devices run:
+- capture_mb: memory held by the capture once parsed;
+- peak_mb: peak of the parse and of the counting.
+
+Example:
+    python benchmarks/bench_probe_storage.py --input_file ./input/thesis_tests/D_test_70.pcap --copies 20
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def repeat_records(records, copies):
+    from mac_set import is_locally_administered
+
+    if not records:
+        return records
+    span = records[-1][0] - records[0][0] + 1
+    repeated = []
+    for copy in range(copies):
+        for timestamp, rssi, src, quadruplet in records:
+            if copy and src is not None and is_locally_administered(src):
+                low = int(src[9:].replace(":", ""), 16) ^ (copy * 0x9e3779 & 0xffffff)
+                src = src[:9] + low.to_bytes(3, "big").hex(":")
+            repeated.append((timestamp + copy * span, rssi, src, quadruplet))
+    return repeated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_file", type=str, default="./input/thesis_tests/D_test_70.pcap",
+                        help="Path of the .pcap trace.")
+    parser.add_argument("--copies", type=int, default=1, help="Copies of the records of the trace.")
+    from pipeline import add_counting_arguments
+    add_counting_arguments(parser)
+    parser.set_defaults(ingest="raw")
+    opt = vars(parser.parse_args())
+
+    from pipeline import count_local_devices, create_bloom_filter, parse_records, read_records
+    from model_db import load_models
+
+    logging.basicConfig(level=logging.ERROR)
+    models = load_models(opt["models"], opt["rate_modality"], opt["models_cache"])
+    records = repeat_records(list(read_records(opt["input_file"], opt["ingest"], opt["power_threshold"])),
+                             opt["copies"])
+
+    main_bf = create_bloom_filter()
+    tracemalloc.start()
+    start = time.perf_counter()
+    capture = parse_records(records, opt["power_threshold"], main_bf)
+    parse_seconds = time.perf_counter() - start
+    capture_bytes, parse_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    local_devices = count_local_devices(capture, models, main_bf, opt)
+    count_seconds = time.perf_counter() - start
+    _, count_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    probes = len(capture["features"])
+    print(json.dumps({
+        "file": os.path.basename(opt["input_file"]),
+        "frames": len(records),
+        "local_probes": probes,
+        "capture_mb": round(capture_bytes / 2 ** 20, 3),
+        "capture_bytes_per_probe": round(capture_bytes / probes, 1) if probes else None,
+        "peak_mb": round(max(parse_peak, count_peak) / 2 ** 20, 3),
+        "parse_seconds": round(parse_seconds, 3),
+        "count_seconds": round(count_seconds, 3),
+        "global": capture["global_counter"],
+        "local": local_devices,
+    }))
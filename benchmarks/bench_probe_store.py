@@ -0,0 +1,140 @@
+"""
+Compare loading the decoded table of a trace from the probe store with parsing the trace again.
+
+For every trace the table is exported once into a temporary store (or --store). Then, --repeat times each:
+- parse: the trace is read with --ingest and parsed by pipeline.parse_records;
+- load: the content hash is computed, the columns are memory-mapped and selected by the power threshold
+  (probe_store.table_partial), the capture is built by CaptureParser.merge.
+Both captures are counted with count_local_devices and must give the same counters and device counts, the best time
+of each is reported with the size of the pcap and of its table on disk. Then the --pipeline_files traces are fed, in
+order, to one Pipeline with the store (cold, exporting the tables, then warm, loading them) and to one parsing the
+traces, the counts must be the same: the first table is memory-mapped, read-only, and the following ones (also the ones
+with no locally administered probe request) are merged after it. Exits with status 1 if any count differs.
+
+Example:
+    python benchmarks/bench_probe_store.py --input_glob "./input/thesis_tests/*.pcap" --ingest raw --repeat 3
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CAPTURE_KEYS = ["frame_counter", "pkt_counter", "probe_counter", "global_counter", "time_window"]
+
+
+def directory_size(path) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def best_time(function, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_glob", type=str, default="./input/thesis_tests/*.pcap", help="Glob of the .pcap traces.")
+    parser.add_argument("--store", type=str, default=None, help="Directory of the store, a temporary one if not given.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of every measure, the best one is reported.")
+    parser.add_argument("--pipeline_files", type=str, nargs="+",
+                        default=["./input/thesis_tests/C_test_1.pcap",
+                                 "./input/Captures0210/Corridor_Captures/Capturing_021023_142233.pcap"],
+                        help="Traces fed in order to one Pipeline, with and without the store.")
+    from pipeline import add_counting_arguments
+    add_counting_arguments(parser)
+    opt = vars(parser.parse_args())
+
+    from capture import CaptureParser
+    from model_db import load_models
+    from pipeline import Pipeline, count_local_devices, create_bloom_filter, parse_records, read_records
+    from probe_store import ProbeStore, pcap_digest, records_table, table_partial
+
+    logging.basicConfig(level=logging.ERROR)
+    models = load_models(opt["models"], opt["rate_modality"], opt["models_cache"])
+    power_threshold = opt["power_threshold"]
+
+    def parse(file):
+        return parse_records(read_records(file, opt["ingest"], power_threshold), power_threshold,
+                             create_bloom_filter())
+
+    def load(store, file):
+        parser = CaptureParser(power_threshold, create_bloom_filter())
+        parser.merge(table_partial(store.load(pcap_digest(file)), power_threshold))
+        return parser.capture()
+
+    def pipeline_counts(files, probe_store):
+        pipeline = Pipeline(dict(opt, probe_store=probe_store), models=models)
+        for file in files:
+            pipeline.feed_file(file)
+        result = pipeline.count()
+        return [result.global_devices, result.local_devices, result.frames, result.packets, result.probe_requests,
+                result.local_probes, result.clusters]
+
+    def summary(capture):
+        main_bf = create_bloom_filter()
+        local = count_local_devices(capture, models, main_bf, opt)
+        return [capture[key] for key in CAPTURE_KEYS] + [len(capture["features"]), local]
+
+    mismatches = 0
+    totals = {"pcap_bytes": 0, "table_bytes": 0, "parse_seconds": 0.0, "load_seconds": 0.0}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = ProbeStore(opt["store"] or tmp_dir)
+        for file in sorted(glob.glob(opt["input_glob"])):
+            start = time.perf_counter()
+            digest = pcap_digest(file)
+            store.save(digest, records_table(read_records(file, opt["ingest"], None)))
+            export_seconds = time.perf_counter() - start
+
+            parse_seconds, parsed = best_time(lambda: parse(file), opt["repeat"])
+            load_seconds, loaded = best_time(lambda: load(store, file), opt["repeat"])
+            same = summary(parsed) == summary(loaded)
+            mismatches += not same
+
+            pcap_bytes = os.path.getsize(file)
+            table_bytes = directory_size(store.path(digest))
+            totals["pcap_bytes"] += pcap_bytes
+            totals["table_bytes"] += table_bytes
+            totals["parse_seconds"] += parse_seconds
+            totals["load_seconds"] += load_seconds
+            print(json.dumps({
+                "file": os.path.basename(file),
+                "frames": parsed["frame_counter"],
+                "pcap_mb": round(pcap_bytes / 2 ** 20, 3),
+                "table_mb": round(table_bytes / 2 ** 20, 3),
+                "export_seconds": round(export_seconds, 3),
+                "parse_seconds": round(parse_seconds, 4),
+                "load_seconds": round(load_seconds, 4),
+                "speedup": round(parse_seconds / load_seconds, 1),
+                "same_counts": same,
+            }))
+
+        # Several traces merged by one Pipeline, the first table stays a read-only map
+        files = opt["pipeline_files"]
+        parsed = pipeline_counts(files, None)
+        cold = pipeline_counts(files, store.directory)
+        warm = pipeline_counts(files, store.directory)
+        mismatches += (cold != parsed) + (warm != parsed)
+        print(json.dumps({"pipeline_files": [os.path.basename(file) for file in files],
+                          "cold_store_same": cold == parsed, "warm_store_same": warm == parsed}))
+
+    print(json.dumps({
+        "pcap_mb": round(totals["pcap_bytes"] / 2 ** 20, 3),
+        "table_mb": round(totals["table_bytes"] / 2 ** 20, 3),
+        "parse_seconds": round(totals["parse_seconds"], 3),
+        "load_seconds": round(totals["load_seconds"], 3),
+        "speedup": round(totals["parse_seconds"] / totals["load_seconds"], 1) if totals["load_seconds"] else None,
+        "mismatches": mismatches,
+    }))
+    sys.exit(1 if mismatches else 0)
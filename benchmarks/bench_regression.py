@@ -0,0 +1,252 @@
+"""
+Benchmark and accuracy regression suite over the bundled capture datasets.
+
+Every trace under --input_dir is counted in a fresh interpreter (so that the peak RSS belongs to that trace only) with
+the timing of every stage of the pipeline:
+- models: loading of the device-model database;
+- read: decoding of the records of the trace (materialized in a list, so that it is timed apart from the parse);
+- parse: split of the packets between globally unique and locally administered MAC addresses;
+- features: build of the matrix (or DataFrame, with --cluster_fit full) given to the clustering;
+- cluster: fit of the clustering and labels;
+- count: counting of the devices of every cluster.
+The counts are compared with the ground truth of the dataset (see ground_truth.py).
+The report is written as JSON with --output. With --baseline the run is compared with a previous report and every
+stage slower (or trace heavier, or count different) beyond the tolerances is flagged, the exit status is 1 in that case.
+Everything runs offline, on the CPU.
+
+Example:
+    python benchmarks/bench_regression.py --ingest raw --output ./before.json
+    python benchmarks/bench_regression.py --ingest raw --output ./after.json --baseline ./before.json
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ground_truth import count_error, read_ground_truths
+
+STAGES = ["models", "read", "parse", "features", "cluster", "count"]
+
+
+def run_trace(file, opt) -> dict:
+    from pipeline import count_local_devices, create_bloom_filter, create_clustering, parse_records, read_records
+    from model_db import load_models
+
+    logging.getLogger().setLevel(logging.ERROR)
+    timings = {stage: [] for stage in STAGES}
+    for _ in range(opt["repeat"]):
+        start = time.perf_counter()
+        models = load_models(opt["models"], opt["rate_modality"], opt["models_cache"])
+        timings["models"].append(time.perf_counter() - start)
+        # Memory of the interpreter with the libraries and the models, before the trace
+        base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        start = time.perf_counter()
+        records = list(read_records(file, opt["ingest"], opt["power_threshold"]))
+        timings["read"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        main_bf = create_bloom_filter()
+        capture = parse_records(records, opt["power_threshold"], main_bf)
+        timings["parse"].append(time.perf_counter() - start)
+        del records
+
+        # Same conditions of count_local_devices, the clustering is fitted only when it would be
+        features = capture["features"]
+        pkt_counter, global_counter = capture["pkt_counter"], capture["global_counter"]
+        clustered = (pkt_counter - global_counter) > opt["min_percentage"] * pkt_counter and \
+            len(features) >= opt["min_samples"]
+
+        start = time.perf_counter()
+        matrix = features.get_features() if opt["cluster_fit"] == "weighted" else features.to_dataframe()
+        timings["features"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        clustering = None
+        if clustered:
+            clustering = create_clustering(opt)
+            clustering.fit(matrix)
+            _ = clustering.labels_
+        timings["cluster"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        local = count_local_devices(capture, models, main_bf, opt, clustering)
+        timings["count"].append(time.perf_counter() - start)
+
+    # Best run of every stage, the least disturbed by the rest of the machine
+    stages = {stage: round(min(values), 4) for stage, values in timings.items()}
+    seconds = sum(stages[stage] for stage in STAGES if stage != "models")
+    # ru_maxrss is in KiB on Linux
+    return {
+        "frames": capture["frame_counter"],
+        "packets": capture["pkt_counter"],
+        "global": global_counter,
+        "local": local,
+        "total": global_counter + local,
+        "stages": stages,
+        "seconds": round(seconds, 4),
+        "frames_per_sec": round(capture["frame_counter"] / seconds, 1) if seconds > 0 else None,
+        "base_rss_mb": round(base_rss / 1024, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def child(file, opt) -> dict:
+    args = [sys.executable, "-W", "ignore", __file__, "--child", file, "--repeat", str(opt["repeat"])]
+    for key in ("models", "max_ratio", "power_threshold", "default_counter", "min_percentage", "epsilon",
+                "min_samples", "distance_metric", "rate_modality", "cluster_method", "cluster_fit", "counting_method",
+                "ingest"):
+        args += [f"--{key}", str(opt[key])]
+    if opt["models_cache"]:
+        args += ["--models_cache", opt["models_cache"]]
+    out = subprocess.run(args, check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+
+def add_error(row, truth) -> None:
+    # Error of the total count, 0 inside a ground truth range
+    row["truth"] = row["error"] = row["relative_error"] = None
+    if truth is None:
+        return
+    low, high = truth
+    row["truth"] = low if low == high else [low, high]
+    row["error"] = count_error(row["total"], truth)
+    row["relative_error"] = round(abs(row["error"]) / high, 4) if high else None
+
+
+def summarize(rows) -> dict:
+    datasets = dict()
+    for row in rows:
+        datasets.setdefault(row["dataset"], []).append(row)
+    summary = dict()
+    for dataset, values in datasets.items():
+        scored = [row for row in values if row["error"] is not None]
+        relative = [row["relative_error"] for row in scored if row["relative_error"] is not None]
+        seconds = sum(row["seconds"] for row in values)
+        summary[dataset] = {
+            "traces": len(values),
+            "seconds": round(seconds, 3),
+            "frames_per_sec": round(sum(row["frames"] for row in values) / seconds, 1) if seconds > 0 else None,
+            "peak_rss_mb": max(row["peak_rss_mb"] for row in values),
+            "mean_abs_error": round(sum(abs(row["error"]) for row in scored) / len(scored), 3) if scored else None,
+            "mean_relative_error": round(sum(relative) / len(relative), 4) if relative else None,
+        }
+    return summary
+
+
+def find_regressions(rows, baseline, opt) -> list:
+    """
+    Compare the rows of a run with the ones of a baseline report.
+
+    :param rows: Rows of the current run
+    :param baseline: Report loaded from the JSON of a previous run
+    :param opt: Options, with the tolerances
+    :return: List of dictionaries (file, kind, detail), empty if nothing regressed
+    """
+
+    previous = {row["file"]: row for row in baseline["traces"]}
+    regressions = []
+    for row in rows:
+        old = previous.get(row["file"])
+        if old is None:
+            continue
+        # A stage is slower only beyond both the relative and the absolute tolerance, the short stages are noisy
+        for stage in STAGES:
+            before, after = old["stages"].get(stage), row["stages"][stage]
+            if before is not None and after > before * (1 + opt["time_tolerance"]) and \
+                    after - before > opt["min_seconds"]:
+                regressions.append({"file": row["file"], "kind": "time", "stage": stage,
+                                    "before": before, "after": after})
+        if row["peak_rss_mb"] - row["base_rss_mb"] > \
+                (old["peak_rss_mb"] - old["base_rss_mb"]) * (1 + opt["memory_tolerance"]) + opt["min_mb"]:
+            regressions.append({"file": row["file"], "kind": "memory", "before": old["peak_rss_mb"],
+                                "after": row["peak_rss_mb"]})
+        if row["total"] != old["total"]:
+            # Worse against the ground truth, or only different when there is none
+            kind = "accuracy" if abs(row["error"] or 0) > abs(old["error"] or 0) else "count"
+            regressions.append({"file": row["file"], "kind": kind, "before": old["total"], "after": row["total"]})
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], check=True, capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_dir", type=str, default="./input", help="Directory searched recursively for .pcap.")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs of every trace, the best time of a stage is kept.")
+    parser.add_argument("--output", type=str, default=None, help="Path of the JSON report.")
+    parser.add_argument("--baseline", type=str, default=None, help="JSON report of a previous run to compare with.")
+    parser.add_argument("--time_tolerance", type=float, default=0.25, help="Relative slowdown flagged as regression.")
+    parser.add_argument("--min_seconds", type=float, default=0.05, help="Absolute slowdown flagged as regression.")
+    parser.add_argument("--memory_tolerance", type=float, default=0.10,
+                        help="Relative growth of the memory used by a trace flagged as regression.")
+    parser.add_argument("--min_mb", type=float, default=5, help="Absolute growth of memory flagged as regression.")
+    parser.add_argument("--child", type=str, default=None, help=argparse.SUPPRESS)
+    from pipeline import add_counting_arguments
+    add_counting_arguments(parser)
+    opt = vars(parser.parse_args())
+
+    if opt["child"]:
+        print(json.dumps(run_trace(opt["child"], opt)))
+        sys.exit(0)
+
+    from model_db import open_models
+
+    # Compiled once here, the children only map the artifact
+    open_models(opt["models"], opt["models_cache"])
+
+    directories = sorted({os.path.dirname(path) for path in
+                          glob.glob(os.path.join(opt["input_dir"], "**", "*.pcap"), recursive=True)})
+    rows = []
+    for directory in directories:
+        truths = read_ground_truths(directory)
+        for file in sorted(glob.glob(os.path.join(directory, "*.pcap"))):
+            row = {"file": os.path.relpath(file), "dataset": os.path.relpath(directory, opt["input_dir"])}
+            row.update(child(file, opt))
+            add_error(row, truths.get(file))
+            rows.append(row)
+            print(json.dumps(row))
+
+    report = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "options": {k: v for k, v in opt.items() if k not in ("child", "output", "baseline")},
+        },
+        "summary": summarize(rows),
+        "traces": rows,
+    }
+
+    status = 0
+    if opt["baseline"]:
+        with open(opt["baseline"], "r") as fr:
+            report["regressions"] = find_regressions(rows, json.load(fr), opt)
+        status = 1 if report["regressions"] else 0
+
+    for dataset, values in report["summary"].items():
+        print(json.dumps(dict(dataset=dataset, **values)))
+    if opt["baseline"]:
+        print(json.dumps({"regressions": report["regressions"]}))
+    if opt["output"]:
+        with open(opt["output"], "w") as fw:
+            json.dump(report, fw, indent=4)
+    sys.exit(status)
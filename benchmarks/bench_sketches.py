@@ -0,0 +1,103 @@
+"""
+Accuracy and memory of the MAC address sketches as the number of devices grows: the fixed Bloom Filter of the sensors
+(10000 bits, 7 hash functions), the ScalableBloomFilter and the HyperLogLog, all with the same anonymization noise.
+
+For every size, n random MAC addresses are inserted with add_many and n other ones are checked:
+- fp_rate: fraction of the other addresses reported as present (measured) and calculate_fp_probability (expected);
+- estimate: number of elements estimated from the bits at 1 (bloomfilter_operations) for the fixed filter, the
+  elements counted by the slices for the scalable one and cardinality() for the HyperLogLog, minus the noise;
+- error: relative error of the estimate; memory_kb: bits or registers held by the sketch.
+With --sensors the addresses are split between that many HyperLogLog sketches that are then merged, the merged
+estimate must be the one of a single sketch with every address.
+
+Example:
+    python benchmarks/bench_sketches.py --sizes 1000 10000 100000 1000000 --sensors 10
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bloomfilter import BloomFilter, HyperLogLog, ScalableBloomFilter
+from bloomfilter_operations import calculate_num_of_stored_element
+
+
+def row(name, n, sketch, estimate, seconds, others, memory_bits, noise):
+    fp = sketch.check_many(others).mean() if hasattr(sketch, "check_many") else None
+    expected = sketch.calculate_fp_probability() if hasattr(sketch, "calculate_fp_probability") else None
+    estimate = estimate - noise
+    return {
+        "sketch": name,
+        "n": n,
+        "fp_rate": None if fp is None else round(float(fp), 5),
+        "expected_fp": None if expected is None else round(float(expected), 5),
+        "estimate": None if not numpy.isfinite(estimate) else round(float(estimate), 1),
+        "error": None if not numpy.isfinite(estimate) else round(float(estimate - n) / n, 4),
+        "memory_kb": round(memory_bits / 8 / 1024, 2),
+        "insert_seconds": round(seconds, 4),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000],
+                        help="Numbers of inserted MAC addresses.")
+    parser.add_argument("--noise", type=int, default=30, help="Random MACs of anonymization noise.")
+    parser.add_argument("--bf_capacity", type=int, default=1000, help="Elements of the first scalable slice.")
+    parser.add_argument("--bf_error_rate", type=float, default=0.01, help="Bound on the scalable false positives.")
+    parser.add_argument("--p", type=int, default=14, help="Precision of the HyperLogLog.")
+    parser.add_argument("--sensors", type=int, default=10, help="HyperLogLog sketches merged into one.")
+    opt = vars(parser.parse_args())
+
+    rng = numpy.random.default_rng(0)
+    merge_mismatches = 0
+    for n in opt["sizes"]:
+        macs = [value.to_bytes(6, "big").hex(":") for value in rng.integers(0, 1 << 48, size=2 * n).tolist()]
+        items, others = macs[:n], macs[n:]
+
+        fixed = BloomFilter(10000, 7)
+        fixed.anonymization_noise(opt["noise"])
+        start = time.perf_counter()
+        fixed.add_many(items)
+        seconds = time.perf_counter() - start
+        with numpy.errstate(divide="ignore"):
+            estimate = calculate_num_of_stored_element(fixed)
+        print(json.dumps(row("fixed", n, fixed, estimate, seconds, others, fixed.get_n(), opt["noise"])))
+
+        scalable = ScalableBloomFilter(opt["bf_capacity"], opt["bf_error_rate"])
+        scalable.anonymization_noise(opt["noise"])
+        start = time.perf_counter()
+        scalable.add_many(items)
+        seconds = time.perf_counter() - start
+        result = row("scalable", n, scalable, scalable.get_num_elem(), seconds, others, scalable.get_n(),
+                     opt["noise"] * len(scalable.slices))
+        result["slices"] = len(scalable.slices)
+        print(json.dumps(result))
+
+        # The single sketch and the merged one start from the same noise
+        noise = HyperLogLog(opt["p"])
+        noise.anonymization_noise(opt["noise"])
+        sketch = HyperLogLog.from_bytes(noise.to_bytes())
+        start = time.perf_counter()
+        sketch.add_many(items)
+        seconds = time.perf_counter() - start
+        result = row("hyperloglog", n, sketch, sketch.cardinality(), seconds, others, sketch.m * 8, opt["noise"])
+
+        # Every sensor sees a part of the devices, the merge must count them once
+        merged = HyperLogLog.from_bytes(noise.to_bytes())
+        for part in numpy.array_split(numpy.arange(n), opt["sensors"]):
+            sensor = HyperLogLog(opt["p"])
+            sensor.add_many([items[i] for i in part.tolist()])
+            merged.merge(HyperLogLog.from_bytes(sensor.to_bytes()))
+        result["merged_estimate"] = round(merged.cardinality() - opt["noise"], 1)
+        merge_mismatches += not numpy.array_equal(merged.registers, sketch.registers)
+        print(json.dumps(result))
+
+    print(json.dumps({"merge_mismatches": merge_mismatches}))
+    sys.exit(1 if merge_mismatches else 0)
@@ -0,0 +1,106 @@
+"""
+Compare the parameter sweep with one counting run per combination.
+
+The grid is swept once with sweep.sweep_capture (one parse per trace, one OPTICS graph per min_samples). Then --check
+combinations per trace, picked at random, are counted again from scratch as argo.py does: the trace is read and parsed
+again and the clustering is fitted with create_clustering (--cluster_fit full refits sklearn.cluster.OPTICS on every
+probe request). The counts must be identical. The time of the runs from scratch is extrapolated to the whole grid.
+Exits with status 1 if any count differs.
+
+Example:
+    python benchmarks/bench_sweep.py --input_glob "./input/thesis_tests/*.pcap" --check 10
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def scratch_count(file, row, opt, matchers):
+    from pipeline import count_local_devices, create_bloom_filter, parse_records, read_records
+
+    run_opt = dict(opt, **{key: row[key] for key in ("min_percentage", "distance_metric", "min_samples", "epsilon",
+                                                      "cluster_method", "counting_method")})
+    if row["counting_method"] == "advanced":
+        run_opt.update(max_ratio=row["max_ratio"], default_counter=row["default_counter"])
+    models = matchers[row["rate_modality"] or opt["rate_modality"][0]]
+    main_bf = create_bloom_filter()
+    capture = parse_records(read_records(file, opt["ingest"], opt["power_threshold"]), opt["power_threshold"], main_bf)
+    return capture["global_counter"], count_local_devices(capture, models, main_bf, run_opt)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_glob", type=str, default="./input/thesis_tests/*.pcap", help="Glob of the .pcap traces.")
+    parser.add_argument("--check", type=int, default=10, help="Combinations per trace counted again from scratch.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the choice of the combinations.")
+    parser.add_argument("--cluster_fit", type=str, choices=["full", "weighted"], default="weighted",
+                        help="Fit of the runs from scratch, full refits sklearn.cluster.OPTICS on every probe request.")
+    parser.add_argument("--ingest", type=str, choices=["stream", "rdpcap", "raw"], default="raw",
+                        help="How the traces are read.")
+    parser.add_argument("--power_threshold", type=int, default=-70, help="Threshold for the capturing power.")
+    parser.add_argument("--min_percentage", type=float, nargs="+", default=[0.02])
+    parser.add_argument("--distance_metric", type=str, nargs="+", default=["euclidean", "manhattan"])
+    parser.add_argument("--min_samples", type=int, nargs="+", default=[5, 10, 15, 20])
+    parser.add_argument("--cluster_method", type=str, nargs="+", default=["optics", "dbscan"])
+    parser.add_argument("--epsilon", type=float, nargs="+", default=[0.001, 0.5, 1, 2, 4, 8])
+    parser.add_argument("--counting_method", type=str, nargs="+", default=["simple", "advanced"])
+    parser.add_argument("--rate_modality", type=str, nargs="+", default=["mean_rate", "awake_rate", "active_rate"])
+    parser.add_argument("--max_ratio", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--default_counter", type=int, nargs="+", default=[1, 2])
+    opt = vars(parser.parse_args())
+
+    from pipeline import create_bloom_filter, default_options, parse_records, read_records
+    from model_db import load_models
+    from sweep import CONFIG_COLUMNS, sweep_capture
+
+    logging.basicConfig(level=logging.ERROR)
+    base = default_options()
+    opt = dict(base, **opt)
+    grid = {column: opt[column] for column in CONFIG_COLUMNS}
+    matchers = {modality: load_models(opt["models"], modality, opt["models_cache"])
+                for modality in opt["rate_modality"]}
+    rng = random.Random(opt["seed"])
+
+    mismatches = 0
+    total_sweep, total_scratch = 0.0, 0.0
+    for file in sorted(glob.glob(opt["input_glob"])):
+        start = time.perf_counter()
+        capture = parse_records(read_records(file, opt["ingest"], opt["power_threshold"]), opt["power_threshold"],
+                                create_bloom_filter())
+        rows = list(sweep_capture(capture, grid, matchers))
+        sweep_seconds = time.perf_counter() - start
+
+        checked = rng.sample(rows, min(opt["check"], len(rows)))
+        start = time.perf_counter()
+        file_mismatches = 0
+        for row in checked:
+            expected = scratch_count(file, row, opt, matchers)
+            if expected != (row["global"], row["local"]):
+                file_mismatches += 1
+                print(json.dumps({"file": os.path.basename(file), "row": row, "expected": expected}))
+        scratch_seconds = (time.perf_counter() - start) / max(len(checked), 1) * len(rows)
+        mismatches += file_mismatches
+        total_sweep += sweep_seconds
+        total_scratch += scratch_seconds
+        print(json.dumps({
+            "file": os.path.basename(file),
+            "combinations": len(rows),
+            "checked": len(checked),
+            "mismatches": file_mismatches,
+            "sweep_seconds": round(sweep_seconds, 3),
+            "scratch_seconds_estimate": round(scratch_seconds, 1),
+            "speedup": round(scratch_seconds / sweep_seconds, 1),
+        }))
+
+    print(json.dumps({"sweep_seconds": round(total_sweep, 3), "scratch_seconds_estimate": round(total_scratch, 1),
+                      "speedup": round(total_scratch / total_sweep, 1) if total_sweep else None,
+                      "mismatches": mismatches}))
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,62 @@
+"""
+Compare the OPTICS fit on every probe request with the weighted fit on the distinct fingerprints.
+
+Both models are fitted on the fingerprints of the locally administered probe requests of every trace. The script exits
+with status 1 if the labels differ for any trace.
+
+Example:
+    python benchmarks/bench_weighted_optics.py --input_glob "./input/thesis_tests/*.pcap" --cluster_method dbscan --epsilon 4
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import warnings
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_glob", type=str, default="./input/**/*.pcap", help="Glob of the .pcap traces.")
+    from pipeline import add_counting_arguments, create_bloom_filter, create_clustering, parse_records, read_records
+    add_counting_arguments(parser)
+    parser.set_defaults(ingest="raw")
+    opt = vars(parser.parse_args())
+
+    # OPTICS warns about divisions by zero in the reachability ratios of duplicated points
+    warnings.simplefilter("ignore", RuntimeWarning)
+
+    mismatches = 0
+    for file in sorted(glob.glob(opt["input_glob"], recursive=True)):
+        records = read_records(file, opt["ingest"], opt["power_threshold"])
+        features = parse_records(records, opt["power_threshold"], create_bloom_filter())["features"]
+        if len(features) < opt["min_samples"]:
+            continue
+
+        start = time.perf_counter()
+        full = create_clustering(dict(opt, cluster_fit="full")).fit(features.to_dataframe()).labels_
+        full_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        weighted = create_clustering(dict(opt, cluster_fit="weighted")).fit(features.get_features()).labels_
+        weighted_seconds = time.perf_counter() - start
+
+        same = bool(numpy.array_equal(full, weighted))
+        mismatches += not same
+        print(json.dumps({
+            "file": os.path.basename(file),
+            "rows": len(features),
+            "distinct": len(numpy.unique(features.get_features(), axis=0)),
+            "clusters": len(set(full.tolist()) - {-1}),
+            "same_labels": same,
+            "full_seconds": round(full_seconds, 3),
+            "weighted_seconds": round(weighted_seconds, 3),
+        }))
+
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,77 @@
+"""
+Compare the sliding-window engine with an offline run of argo.py on every slice of the trace.
+
+The offline side reads the trace again for every window and counts the frames with window_start <= time < window_end,
+as rerunning the script per window would do, always fitting OPTICS on every probe request (--cluster_fit full).
+Exits with status 1 if any window gives different counts.
+
+Example:
+    python benchmarks/bench_windowed.py --input_glob "./input/test_5_different_time/*.pcap" --window 120 --step 60
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def offline_count(file, start, end, opt, models):
+    from pipeline import count_local_devices, create_bloom_filter, parse_records, read_records
+
+    records = read_records(file, opt["ingest"], opt["power_threshold"])
+    main_bf = create_bloom_filter()
+    capture = parse_records((r for r in records if start <= r[0] < end), opt["power_threshold"], main_bf)
+    local = count_local_devices(capture, models, main_bf, dict(opt, cluster_fit="full"))
+    return capture["pkt_counter"], capture["global_counter"], local
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_glob", type=str, default="./input/test_5_different_time/*.pcap",
+                        help="Glob of the .pcap traces.")
+    parser.add_argument("--window", type=float, default=120, help="Length of the sliding window in seconds.")
+    parser.add_argument("--step", type=float, default=60, help="Seconds between two consecutive counts.")
+    from pipeline import add_counting_arguments, read_records
+    add_counting_arguments(parser)
+    parser.set_defaults(ingest="raw")
+    opt = vars(parser.parse_args())
+
+    from model_db import load_models
+    from windowed import WindowedCounter
+
+    logging.basicConfig(level=logging.ERROR)
+    models = load_models(opt["models"], opt["rate_modality"], opt["models_cache"])
+
+    mismatches = 0
+    for file in sorted(glob.glob(opt["input_glob"])):
+        start = time.perf_counter()
+        counter = WindowedCounter(opt["window"], opt["step"], opt, models)
+        records = read_records(file, opt["ingest"], opt["power_threshold"])
+        rows = list(counter.feed(records)) + list(counter.flush())
+        windowed_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        file_mismatches = 0
+        for row in rows:
+            expected = offline_count(file, row["window_start"], row["window_end"], opt, models)
+            if expected != (row["packets"], row["global"], row["local"]):
+                file_mismatches += 1
+                print(f"MISMATCH {file} [{row['window_start']}, {row['window_end']}): "
+                      f"windowed {(row['packets'], row['global'], row['local'])} offline {expected}")
+        offline_seconds = time.perf_counter() - start
+        mismatches += file_mismatches
+
+        print(json.dumps({
+            "file": os.path.basename(file),
+            "windows": len(rows),
+            "mismatches": file_mismatches,
+            "windowed_seconds": round(windowed_seconds, 3),
+            "offline_seconds": round(offline_seconds, 3),
+        }))
+
+    sys.exit(1 if mismatches else 0)
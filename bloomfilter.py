@@ -11,9 +11,197 @@ import mmh3
 import numpy
 from numpy import random
 from bitarray import bitarray
+import struct
+import zlib
 # import requests
 
 
+# Binary serialization format of the Bloom Filter
+FORMAT_VERSION = 1
+ENCODING_RAW = 0
+ENCODING_RLE = 1
+ENCODING_ZLIB = 2
+_MAGIC = b"ABF"
+# magic, version, encoding, n, k, num_elem
+_HEADER = struct.Struct("<3sBBQIQ")
+_HLL_MAGIC = b"AHL"
+# magic, version, p, noise
+_HLL_HEADER = struct.Struct("<3sBBQ")
+
+_C1 = numpy.uint32(0xcc9e2d51)
+_C2 = numpy.uint32(0x1b873593)
+
+
+def _rotl32(x, r):
+    return (x << numpy.uint32(r)) | (x >> numpy.uint32(32 - r))
+
+
+def _join_items(items):
+    """
+    Concatenate the items encoded as mmh3.hash does (UTF-8 for str).
+
+    :param items: Sequence of elements (str or bytes)
+    :return: Tuple (uint8 NumPy array with all the encoded items, int64 NumPy array with their lengths)
+    """
+
+    try:
+        # Fast path for ASCII strings (e.g. MAC addresses): a single join and encode
+        text = "".join(items)
+        data = text.encode()
+        if len(data) == len(text):
+            lengths = numpy.fromiter(map(len, items), dtype=numpy.int64, count=len(items))
+            return numpy.frombuffer(data, dtype=numpy.uint8), lengths
+    except TypeError:
+        pass
+
+    encoded = [item.encode() if isinstance(item, str) else bytes(item) for item in items]
+    lengths = numpy.fromiter(map(len, encoded), dtype=numpy.int64, count=len(encoded))
+    return numpy.frombuffer(b"".join(encoded), dtype=numpy.uint8), lengths
+
+
+def _encode_varints(values) -> bytes:
+    """
+    Encode non-negative integers as LEB128 varints.
+
+    :param values: int64 NumPy array
+    :return: bytes
+    """
+
+    values = numpy.asarray(values, dtype=numpy.int64)
+    if len(values) == 0:
+        return b""
+    # Number of 7-bit groups of every value
+    sizes = numpy.ones(len(values), dtype=numpy.int64)
+    rest = values >> 7
+    while rest.any():
+        sizes += rest > 0
+        rest >>= 7
+    offsets = numpy.cumsum(sizes) - sizes
+    out = numpy.empty(int(sizes.sum()), dtype=numpy.uint8)
+    for j in range(int(sizes.max())):
+        selected = sizes > j
+        byte = (values[selected] >> (7 * j)) & 0x7f
+        byte |= numpy.where(sizes[selected] > j + 1, 0x80, 0)
+        out[offsets[selected] + j] = byte
+    return out.tobytes()
+
+
+def _decode_varints(data) -> numpy.ndarray:
+    """
+    Decode a sequence of LEB128 varints.
+
+    :param data: bytes-like object
+    :return: int64 NumPy array
+    """
+
+    raw = numpy.frombuffer(data, dtype=numpy.uint8)
+    if len(raw) == 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+    last = raw < 0x80
+    if not last[-1]:
+        raise ValueError("Truncated varint")
+    starts = numpy.flatnonzero(numpy.concatenate(([True], last[:-1])))
+    group = numpy.cumsum(numpy.concatenate(([0], last[:-1])))
+    shift = 7 * (numpy.arange(len(raw)) - starts[group])
+    return numpy.add.reduceat((raw & 0x7f).astype(numpy.int64) << shift, starts)
+
+
+def _popcount(array) -> int:
+    """
+    Count the bits at 1 of a uint8 NumPy array.
+
+    :param array: uint8 NumPy array
+    :return: Integer number of bits at 1
+    """
+
+    if hasattr(numpy, "bitwise_count"):
+        return int(numpy.bitwise_count(array).sum())
+    return int(numpy.unpackbits(array).sum())
+
+
+def murmur3_32_batch(data, k) -> numpy.ndarray:
+    """
+    MurmurHash3 x86 32-bit of many keys of the same length, with the seeds 0 .. k-1.
+
+    :param data: uint8 NumPy array of shape (number of keys, key length)
+    :param k: Number of seeds
+    :return: uint32 NumPy array of shape (number of keys, k), equal to mmh3.hash(key, seed) as unsigned
+    """
+
+    count, length = data.shape
+    h = numpy.tile(numpy.arange(k, dtype=numpy.uint32), (count, 1))
+
+    nblocks = length // 4
+    blocks = numpy.ascontiguousarray(data[:, :nblocks * 4]).view("<u4")
+    for j in range(nblocks):
+        block = blocks[:, j] * _C1
+        block = _rotl32(block, 15) * _C2
+        h ^= block[:, None]
+        h = _rotl32(h, 13) * numpy.uint32(5) + numpy.uint32(0xe6546b64)
+
+    tail = data[:, nblocks * 4:].astype(numpy.uint32)
+    if tail.shape[1]:
+        block = numpy.zeros(count, dtype=numpy.uint32)
+        for j in range(tail.shape[1] - 1, -1, -1):
+            block ^= tail[:, j] << numpy.uint32(8 * j)
+        block = _rotl32(block * _C1, 15) * _C2
+        h ^= block[:, None]
+
+    h ^= numpy.uint32(length & 0xffffffff)
+    h ^= h >> numpy.uint32(16)
+    h *= numpy.uint32(0x85ebca6b)
+    h ^= h >> numpy.uint32(13)
+    h *= numpy.uint32(0xc2b2ae35)
+    h ^= h >> numpy.uint32(16)
+    return h
+
+
+def _batch_hashes(items, k) -> numpy.ndarray:
+    """
+    MurmurHash3 x86 32-bit of every item with the seeds 0 .. k-1, the items of the same length are hashed together.
+
+    :param items: List of elements (str or bytes)
+    :param k: Number of seeds
+    :return: uint32 NumPy array of shape (len(items), k), equal to mmh3.hash(item, seed) as unsigned
+    """
+
+    hashes = numpy.empty((len(items), k), dtype=numpy.uint32)
+    if not items:
+        return hashes
+
+    data, lengths = _join_items(items)
+    if (lengths == lengths[0]).all():
+        groups = [(slice(None), data.reshape(len(items), int(lengths[0])))]
+    else:
+        starts = numpy.cumsum(lengths) - lengths
+        groups = []
+        for length in numpy.unique(lengths).tolist():
+            positions = numpy.flatnonzero(lengths == length)
+            groups.append((positions, data[starts[positions, None] + numpy.arange(length)]))
+
+    for positions, rows in groups:
+        hashes[positions] = murmur3_32_batch(rows, k)
+    return hashes
+
+
+def optimal_parameters(capacity, error_rate) -> tuple:
+    """
+    Size a Bloom Filter for a number of elements and a false positive probability.
+
+    :param capacity: Number of elements the filter must hold
+    :param error_rate: False positive probability with capacity elements, in (0, 1)
+    :return: Tuple (n, k) with the dimension in bit and the number of hash functions
+    """
+
+    if capacity <= 0:
+        raise ValueError(f"capacity must be positive, got {capacity}")
+    if not 0 < error_rate < 1:
+        raise ValueError(f"error_rate must be in (0, 1), got {error_rate}")
+    n = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+    k = max(1, int(round(n / capacity * math.log(2))))
+    return n, k
+
+
 class BloomFilter(object):
     """
     Class for Bloom filter, using murmur3 hash function
@@ -63,9 +251,94 @@ class BloomFilter(object):
             digest = mmh3.hash(item, i) % self.n
             digests.append(digest)
 
-            # set the bit True in bit_array
-            self.bit_array[digest] = True
-        self.m = self.bit_array.count(1)
+            # set the bit True in bit_array, keeping the count of bits at 1 up to date
+            if not self.bit_array[digest]:
+                self.bit_array[digest] = True
+                self.m += 1
+
+    def add_many(self, items) -> None:
+        """
+        Add a batch of items in the filter.
+
+        The bits set are the same of calling add() on every item, but the hashes and the bit updates are computed
+        with NumPy on the whole batch.
+
+        :param items: Sequence of elements (str or bytes) to be inserted
+        :return: None
+        """
+
+        digests = self._batch_digests(items)
+        self.num_elem += len(digests)
+        if len(digests) == 0:
+            return
+
+        bits = self._bit_view()
+        if digests.size * 32 >= self.n:
+            # Dense batch: build the packed bits of the batch and merge them with a single OR
+            flags = numpy.zeros(len(bits) * 8, dtype=bool)
+            flags[digests.ravel()] = True
+            endian = self.bit_array.endian
+            endian = endian() if callable(endian) else endian
+            batch_bits = numpy.packbits(flags, bitorder=endian)
+            # Only the bits still at 0 change the count of bits at 1
+            self.m += _popcount(batch_bits & ~bits)
+            bits |= batch_bits
+        else:
+            digests = numpy.unique(digests)
+            byte_index, masks = self._bit_masks(digests)
+            self.m += int(numpy.count_nonzero((bits[byte_index] & masks) == 0))
+            numpy.bitwise_or.at(bits, byte_index, masks)
+
+    def check_many(self, items) -> numpy.ndarray:
+        """
+        Check for existence of a batch of items in filter.
+
+        :param items: Sequence of elements (str or bytes) to verify
+        :return: Boolean NumPy array, True where the element is in the Bloom Filter
+        """
+
+        digests = self._batch_digests(items)
+        if len(digests) == 0:
+            return numpy.zeros(0, dtype=bool)
+
+        byte_index, masks = self._bit_masks(digests)
+        return numpy.all((self._bit_view()[byte_index] & masks) != 0, axis=1)
+
+    def _batch_digests(self, items) -> numpy.ndarray:
+        """
+        Compute the k digests of every item, equal to mmh3.hash(item, i) % n for i in [0, k).
+
+        :param items: Sequence of elements (str or bytes)
+        :return: int64 NumPy array of shape (len(items), k)
+        """
+
+        hashes = _batch_hashes(list(items), self.k)
+        # mmh3.hash returns a signed 32-bit integer, the modulo has the Python semantic
+        return hashes.view(numpy.int32).astype(numpy.int64) % self.n
+
+    def _bit_view(self) -> numpy.ndarray:
+        """
+        Get a writable NumPy view on the bytes of the bit array.
+
+        :return: uint8 NumPy array sharing the memory of bit_array
+        """
+
+        return numpy.frombuffer(self.bit_array, dtype=numpy.uint8)
+
+    def _bit_masks(self, digests):
+        """
+        Locate the bits of a set of digests inside the bytes of the bit array.
+
+        :param digests: int64 NumPy array of bit positions
+        :return: Tuple (byte index, uint8 mask) with the same shape of digests
+        """
+
+        endian = self.bit_array.endian
+        endian = endian() if callable(endian) else endian
+        shift = (digests & 7).astype(numpy.uint8)
+        if endian == "big":
+            shift = 7 - shift
+        return digests >> 3, numpy.left_shift(numpy.uint8(1), shift)
 
     def check(self, item) -> bool:
         """
@@ -103,7 +376,7 @@ class BloomFilter(object):
         """
         
         if len(bitarr) != self.n:
-            raise
+            raise ValueError(f"Bit array of {len(bitarr)} bits, the Bloom Filter has {self.n} bits")
 
         self.bit_array = bitarr
         self.m = self.bit_array.count(1)
@@ -189,34 +462,495 @@ class BloomFilter(object):
         for i in range(dim):
             arr_of_ones = random.randint(self.n, size=self.k)
             for val in arr_of_ones:
-                self.bit_array[val] = True
-            self.m = self.bit_array.count(1)
+                if not self.bit_array[val]:
+                    self.bit_array[val] = True
+                    self.m += 1
             self.num_elem += 1
             
         return None
     
     def compress(self) -> str:
         """
-        Compress the Bloom Filter
+        Compress the Bloom Filter as a run-length text: "value:length," for every run of equal bits.
 
         :return: str
         """
-        
-        s = ""
-        last = -1
-        counter = 0
-        for i in range(0, self.n):
-            if last == -1:
-                last = self.bit_array[i]
-                counter += 1
-            elif last == self.bit_array[i]:
-                counter += 1
+
+        value, lengths = self._runs()
+        s = []
+        for length in lengths.tolist():
+            s.append(f"{value}:{length},")
+            value ^= 1
+        return "".join(s)
+
+    def _runs(self):
+        """
+        Split the bit array in runs of equal bits.
+
+        :return: Tuple (value of the first run, int64 NumPy array with the length of every run)
+        """
+
+        if self.n == 0:
+            return 0, numpy.zeros(0, dtype=numpy.int64)
+        endian = self.bit_array.endian
+        endian = endian() if callable(endian) else endian
+        bits = numpy.unpackbits(self._bit_view(), count=self.n, bitorder=endian)
+        bounds = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(bits)) + 1, [self.n]))
+        return int(bits[0]), numpy.diff(bounds)
+
+    def to_bytes(self, encoding=ENCODING_RAW) -> bytes:
+        """
+        Serialize the Bloom Filter in the binary format: a header (version, encoding, n, k, num_elem) followed by
+        the bits, packed 8 per byte (big-endian bit order) and optionally compressed.
+
+        :param encoding: ENCODING_RAW, ENCODING_RLE (run lengths as varints) or ENCODING_ZLIB
+        :return: bytes
+        """
+
+        if encoding == ENCODING_RAW:
+            payload = self._packed_bits()
+        elif encoding == ENCODING_ZLIB:
+            payload = zlib.compress(self._packed_bits())
+        elif encoding == ENCODING_RLE:
+            value, lengths = self._runs()
+            payload = bytes([value]) + _encode_varints(lengths)
+        else:
+            raise ValueError(f"Unknown encoding {encoding}")
+
+        return _HEADER.pack(_MAGIC, FORMAT_VERSION, encoding, self.n, self.k, self.num_elem) + payload
+
+    @classmethod
+    def from_bytes(cls, data, copy=False, max_bits=None) -> "BloomFilter":
+        """
+        Load a Bloom Filter serialized with to_bytes.
+
+        A raw payload whose size is a multiple of 8 bits is not copied: the bit array uses the memory of data, and it is
+        read-only if data is read-only (e.g. bytes), unless copy is True.
+
+        :param data: bytes-like object with the serialized filter
+        :param copy: Always copy the bits into a new writable bit array
+        :param max_bits: Optional largest dimension accepted, checked before the payload is decoded
+        :return: BloomFilter
+        """
+
+        view = memoryview(data)
+        if len(view) < _HEADER.size:
+            raise ValueError("Truncated Bloom Filter header")
+        magic, version, encoding, n, k, num_elem = _HEADER.unpack_from(view)
+        if magic != _MAGIC:
+            raise ValueError("Not a serialized Bloom Filter")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported Bloom Filter format version {version}")
+        if max_bits is not None and n > max_bits:
+            raise ValueError(f"Bloom Filter of {n} bits, at most {max_bits} are accepted")
+        payload = view[_HEADER.size:]
+        nbytes = (n + 7) // 8
+
+        if encoding == ENCODING_RAW:
+            if len(payload) != nbytes:
+                raise ValueError(f"Bloom Filter payload of {len(payload)} bytes, expected {nbytes}")
+            if n % 8 == 0 and not copy:
+                bits = bitarray(buffer=payload, endian="big")
             else:
-                s = s.join(f"{last}:{counter},")
-                counter = 1
-                last = self.bit_array[i]
-        
-        return s
-        
-        
-        
\ No newline at end of file
+                bits = bitarray(endian="big")
+                bits.frombytes(bytes(payload))
+        elif encoding == ENCODING_ZLIB:
+            # At most one byte more than expected is decompressed, a longer payload is not inflated in memory
+            decompressor = zlib.decompressobj()
+            try:
+                packed = decompressor.decompress(payload, nbytes + 1)
+            except zlib.error as e:
+                raise ValueError(f"Corrupt Bloom Filter payload: {e}") from e
+            if len(packed) != nbytes or not decompressor.eof:
+                raise ValueError(f"Bloom Filter payload does not decompress to {nbytes} bytes")
+            bits = bitarray(endian="big")
+            bits.frombytes(packed)
+        elif encoding == ENCODING_RLE:
+            if len(payload) < 1:
+                raise ValueError("Truncated Bloom Filter payload")
+            lengths = _decode_varints(payload[1:])
+            if int(lengths.sum()) != n:
+                raise ValueError(f"Bloom Filter runs cover {int(lengths.sum())} bits, expected {n}")
+            values = (numpy.arange(len(lengths)) + payload[0]) % 2
+            bits = bitarray(endian="big")
+            bits.frombytes(numpy.packbits(numpy.repeat(values.astype(numpy.uint8), lengths)).tobytes())
+        else:
+            raise ValueError(f"Unknown encoding {encoding}")
+
+        if len(bits) != n:
+            bits = bits[:n]
+        bf = cls(0, k)
+        bf.n = n
+        bf.bit_array = bits
+        bf.m = bits.count(1)
+        bf.num_elem = num_elem
+        return bf
+
+    def _packed_bits(self) -> bytes:
+        """
+        Get the bits packed 8 per byte, in big-endian bit order.
+
+        :return: bytes
+        """
+
+        endian = self.bit_array.endian
+        endian = endian() if callable(endian) else endian
+        if endian == "big":
+            return self.bit_array.tobytes()
+        return bitarray(self.bit_array, endian="big").tobytes()
+
+
+class ScalableBloomFilter(object):
+    """
+    Scalable Bloom filter (Almeida et al., 2007): a chain of Bloom Filters (slices) sized from a target capacity and
+    false positive probability, a new slice is added when the last one is full. The anonymization noise is not counted
+    against the capacity of a slice, every slice is sized for its capacity plus the noise it holds.
+    """
+
+    def __init__(self, capacity=1000, error_rate=0.01, growth=2, ratio=0.9):
+        """
+        Declarate a new Scalable Bloom Filter with a single slice.
+
+        :param capacity: Number of elements of the first slice
+        :param error_rate: Bound on the false positive probability of the whole filter, in (0, 1)
+        :param growth: Factor between the capacities of two consecutive slices
+        :param ratio: Factor between the false positive probabilities of two consecutive slices, in (0, 1)
+        :return: None
+        """
+
+        if growth < 1:
+            raise ValueError(f"growth must be at least 1, got {growth}")
+        if not 0 < ratio < 1:
+            raise ValueError(f"ratio must be in (0, 1), got {ratio}")
+        # Validate the first slice before building it
+        optimal_parameters(capacity, error_rate)
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.ratio = ratio
+
+        # Random MACs of anonymization noise added to every slice, and held by every slice
+        self.noise = 0
+        self.slices = []
+        self.capacities = []
+        self.noises = []
+        self._add_slice()
+
+    def _new_slice(self, i) -> BloomFilter:
+        """
+        Build the empty slice i, sized for its capacity plus the anonymization noise of the filter, with the noise.
+
+        :param i: Position of the slice
+        :return: BloomFilter
+        """
+
+        capacity = int(math.ceil(self.capacity * pow(self.growth, i)))
+        # The probabilities of the slices are a geometric series that sums to error_rate
+        n, k = optimal_parameters(capacity + self.noise, self.error_rate * (1 - self.ratio) * pow(self.ratio, i))
+        bf = BloomFilter(n, k)
+        if self.noise:
+            bf.anonymization_noise(self.noise)
+        return bf
+
+    def _add_slice(self) -> BloomFilter:
+        """
+        Append a new empty slice, with the anonymization noise of the filter.
+
+        :return: The new slice
+        """
+
+        i = len(self.slices)
+        bf = self._new_slice(i)
+        self.slices.append(bf)
+        self.capacities.append(int(math.ceil(self.capacity * pow(self.growth, i))))
+        self.noises.append(self.noise)
+        return bf
+
+    def _free(self) -> int:
+        """
+        Get the number of elements the last slice can still hold, adding a new slice if the last one is full.
+
+        :return: Positive integer number of elements
+        """
+
+        # The noise of the slice is not an element of the capacity
+        free = self.capacities[-1] - (self.slices[-1].get_num_elem() - self.noises[-1])
+        while free <= 0:
+            self._add_slice()
+            free = self.capacities[-1] - (self.slices[-1].get_num_elem() - self.noises[-1])
+        return free
+
+    def add(self, item) -> None:
+        """
+        Add an item in the filter. An item already in the filter is not inserted again, so that repeated items do not
+        fill the slices.
+
+        :param item: Element to be inserted
+        :return: None
+        """
+
+        if self.check(item):
+            return
+        self._free()
+        self.slices[-1].add(item)
+
+    def add_many(self, items) -> None:
+        """
+        Add a batch of items in the filter. The batch is checked against the filter once, then the new items fill
+        the last slice and the ones added after it.
+
+        :param items: Sequence of elements (str or bytes) to be inserted
+        :return: None
+        """
+
+        # First occurrence of the items that are not in the filter yet
+        items = list(dict.fromkeys(items))
+        if not items:
+            return
+        items = [item for item, found in zip(items, self.check_many(items).tolist()) if not found]
+        start = 0
+        while start < len(items):
+            end = start + self._free()
+            self.slices[-1].add_many(items[start:end])
+            start = end
+
+    def check(self, item) -> bool:
+        """
+        Check for existence of an item in filter.
+
+        :param item: Element to verify
+        :return: Boolean value, True the element is in one of the slices, False otherwise
+        """
+
+        # The last slices are the largest ones, and the most recently filled
+        return any(bf.check(item) for bf in reversed(self.slices))
+
+    def check_many(self, items) -> numpy.ndarray:
+        """
+        Check for existence of a batch of items in filter.
+
+        :param items: Sequence of elements (str or bytes) to verify
+        :return: Boolean NumPy array, True where the element is in one of the slices
+        """
+
+        items = list(items)
+        found = numpy.zeros(len(items), dtype=bool)
+        for bf in self.slices:
+            found |= bf.check_many(items)
+        return found
+
+    def reset(self) -> None:
+        """
+        Reset the filter to a single empty slice, without anonymization noise.
+
+        :return: None
+        """
+
+        self.noise = 0
+        self.slices = []
+        self.capacities = []
+        self.noises = []
+        self._add_slice()
+
+    def anonymization_noise(self, dim) -> None:
+        """
+        Fill every slice, and the ones added later, with a noise. The slices with no element yet are sized again for
+        the noise, the others get the noise on top of their elements.
+
+        :dim: Random MACs to be added to every slice
+        :return: None
+        """
+
+        self.noise += dim
+        for i, bf in enumerate(self.slices):
+            if bf.get_num_elem() == self.noises[i]:
+                self.slices[i] = self._new_slice(i)
+            else:
+                bf.anonymization_noise(dim)
+            self.noises[i] += dim
+
+    def get_n(self) -> int:
+        """
+        Get the dimension in bit of all the slices.
+
+        :return: Integer number of bits
+        """
+
+        return sum(bf.get_n() for bf in self.slices)
+
+    def get_m(self) -> int:
+        """
+        Get the number of 1 in all the slices.
+
+        :return: Integer number of 1
+        """
+
+        return sum(bf.get_m() for bf in self.slices)
+
+    def get_num_elem(self) -> int:
+        """
+        Get the number of element stored in the filter, noise of every slice included.
+
+        :return: Integer number of stored element
+        """
+
+        return sum(bf.get_num_elem() for bf in self.slices)
+
+    def calculate_fp_probability(self) -> float:
+        """
+        Calculate the false positive probability of the filter: an item is a false positive if any slice reports it.
+
+        :return: Float number in [0,1] that represent the false positive probability
+        """
+
+        return float(1 - numpy.prod([1 - bf.calculate_fp_probability() for bf in self.slices]))
+
+
+class HyperLogLog(object):
+    """
+    HyperLogLog sketch (Flajolet et al., 2007) of the number of distinct items, mergeable between sensors. Library only:
+    the pipeline and the aggregator count with Bloom Filters, the sketch is measured by benchmarks/bench_sketches.py.
+    """
+
+    def __init__(self, p=14):
+        """
+        Declarate a new empty sketch.
+
+        :param p: Precision, the sketch has 2^p registers of one byte and a standard error of about 1.04 / sqrt(2^p)
+        :return: None
+        """
+
+        if not 4 <= p <= 18:
+            raise ValueError(f"p must be in [4, 18], got {p}")
+        self.p = p
+        self.m = 1 << p
+        self.registers = numpy.zeros(self.m, dtype=numpy.uint8)
+
+        # Random MACs of anonymization noise, counted by the estimate as distinct items
+        self.noise = 0
+
+    def _update(self, hashes) -> None:
+        """
+        Update the registers with the hashes of a batch of items.
+
+        :param hashes: uint32 NumPy array of shape (number of items, 2): the first hash selects the register, the rank
+            is the position of the first 1 in the second one
+        :return: None
+        """
+
+        index = (hashes[:, 0] >> numpy.uint32(32 - self.p)).astype(numpy.int64)
+        # frexp gives the number of significant bits of the integer (0 for 0), exact below 2^53
+        rank = 33 - numpy.frexp(hashes[:, 1].astype(numpy.float64))[1]
+        numpy.maximum.at(self.registers, index, rank.astype(numpy.uint8))
+
+    def add(self, item) -> None:
+        """
+        Add an item in the sketch.
+
+        :param item: Element to be inserted
+        :return: None
+        """
+
+        index = mmh3.hash(item, 0, signed=False) >> (32 - self.p)
+        rank = 33 - mmh3.hash(item, 1, signed=False).bit_length()
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add_many(self, items) -> None:
+        """
+        Add a batch of items in the sketch, with the same result of calling add() on every item.
+
+        :param items: Sequence of elements (str or bytes) to be inserted
+        :return: None
+        """
+
+        items = list(items)
+        if items:
+            self._update(_batch_hashes(items, 2))
+
+    def merge(self, other) -> None:
+        """
+        Merge another sketch into this one, the estimate becomes the one of the union of the items.
+
+        :param other: HyperLogLog with the same precision
+        :return: None
+        """
+
+        if other.p != self.p:
+            raise ValueError(f"HyperLogLog sketches with different precision: p={self.p} and p={other.p}")
+        numpy.maximum(self.registers, other.registers, out=self.registers)
+        self.noise += other.noise
+
+    def cardinality(self) -> float:
+        """
+        Estimate the number of distinct items added, anonymization noise included.
+
+        :return: Float number of distinct items
+        """
+
+        m = self.m
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / float(numpy.ldexp(1.0, -self.registers.astype(numpy.int64)).sum())
+        zeros = int(numpy.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small range correction: linear counting on the empty registers
+            return m * math.log(m / zeros)
+        return estimate
+
+    def reset(self) -> None:
+        """
+        Reset the sketch.
+
+        :return: None
+        """
+
+        self.registers[:] = 0
+        self.noise = 0
+
+    def anonymization_noise(self, dim) -> None:
+        """
+        Fill the sketch with a noise.
+
+        :dim: Random MACs to be added
+        :return: None
+        """
+
+        self._update(random.randint(0, 1 << 32, size=(dim, 2), dtype=numpy.uint64).astype(numpy.uint32))
+        self.noise += dim
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the sketch: a header (version, p, noise) followed by the registers.
+
+        :return: bytes
+        """
+
+        return _HLL_HEADER.pack(_HLL_MAGIC, FORMAT_VERSION, self.p, self.noise) + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data) -> "HyperLogLog":
+        """
+        Load a sketch serialized with to_bytes.
+
+        :param data: bytes-like object with the serialized sketch
+        :return: HyperLogLog
+        """
+
+        view = memoryview(data)
+        if len(view) < _HLL_HEADER.size:
+            raise ValueError("Truncated HyperLogLog header")
+        magic, version, p, noise = _HLL_HEADER.unpack_from(view)
+        if magic != _HLL_MAGIC:
+            raise ValueError("Not a serialized HyperLogLog")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported HyperLogLog format version {version}")
+        sketch = cls(p)
+        if len(view) - _HLL_HEADER.size != sketch.m:
+            raise ValueError(f"HyperLogLog payload of {len(view) - _HLL_HEADER.size} bytes, expected {sketch.m}")
+        sketch.registers[:] = numpy.frombuffer(view[_HLL_HEADER.size:], dtype=numpy.uint8)
+        sketch.noise = noise
+        return sketch
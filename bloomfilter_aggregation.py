@@ -0,0 +1,220 @@
+"""
+Aggregation of the Bloom Filters produced by many sensors.
+
+The filters are stacked into a single 2-D packed bit matrix, and the popcounts of all the pairwise intersections are
+computed in one pass as a product of bit matrices, instead of building a new BloomFilter for every pair. The
+cardinality estimates use the same formulas of bloomfilter_operations.
+"""
+
+from itertools import combinations
+
+import numpy
+from bitarray import bitarray
+
+from bloomfilter import BloomFilter
+
+# Bits processed by every matrix product, small enough to keep the float32 products exact
+_CHUNK_BITS = 1 << 16
+
+
+def check_compatible(filters) -> None:
+    """
+    Verify that a set of Bloom Filters can be combined.
+
+    :param filters: Sequence of Bloom Filters
+    :return: None
+    :raise ValueError: If the sequence is empty or the filters have different n or k
+    """
+
+    if len(filters) == 0:
+        raise ValueError("No Bloom Filter to aggregate")
+    n = filters[0].get_n()
+    k = filters[0].get_k()
+    mismatched = [i for i, bf in enumerate(filters) if bf.get_n() != n or bf.get_k() != k]
+    if mismatched:
+        shapes = ", ".join(f"#{i} (n={filters[i].get_n()}, k={filters[i].get_k()})" for i in mismatched)
+        raise ValueError(f"Bloom Filters must have the same shape of #0 (n={n}, k={k}), mismatched: {shapes}")
+
+
+def _estimate_elements(bits, n, k):
+    """
+    Vectorized calculate_num_of_stored_element: number of elements from the number of bits at 1.
+    """
+
+    with numpy.errstate(divide="ignore"):
+        return (-n / k) * numpy.log(1 - (numpy.asarray(bits, dtype=numpy.float64) / n))
+
+
+class BloomFilterStack(object):
+    """
+    Same-shape Bloom Filters of many sensors stacked in a packed bit matrix.
+    """
+
+    def __init__(self, filters, names=None):
+        """
+        Stack a set of Bloom Filters.
+
+        :param filters: Sequence of Bloom Filters with the same n and k
+        :param names: Optional names of the filters (e.g. sensor ids), usable in place of the indices
+        :return: None
+        """
+
+        filters = list(filters)
+        check_compatible(filters)
+        if names is not None and len(names) != len(filters):
+            raise ValueError(f"{len(names)} names given for {len(filters)} Bloom Filters")
+
+        self.n = filters[0].get_n()
+        self.k = filters[0].get_k()
+        self.names = list(names) if names is not None else list(range(len(filters)))
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+        # One row of packed bits (big-endian bit order) for every filter
+        self.bits = numpy.vstack([numpy.frombuffer(bf._packed_bits(), dtype=numpy.uint8) for bf in filters])
+        self.m = numpy.array([bf.get_m() for bf in filters], dtype=numpy.int64)
+        self._intersections = None
+
+    def __len__(self) -> int:
+        return len(self.m)
+
+    def _rows(self, keys) -> list:
+        rows = []
+        for key in keys:
+            if key in self._index:
+                rows.append(self._index[key])
+            else:
+                raise KeyError(f"Unknown Bloom Filter {key!r}")
+        return rows
+
+    def get_filter(self, key) -> BloomFilter:
+        """
+        Get a copy of one of the stacked filters as a BloomFilter.
+
+        :param key: Name of the filter
+        :return: BloomFilter
+        """
+
+        row = self._rows([key])[0]
+        return _filter_from_packed(self.bits[row], self.n, self.k)
+
+    def pairwise_intersection_bits(self) -> numpy.ndarray:
+        """
+        Number of bits at 1 in the AND of every pair of filters.
+
+        :return: int64 matrix (N, N), the diagonal is the number of bits at 1 of every filter
+        """
+
+        if self._intersections is None:
+            count = len(self)
+            result = numpy.zeros((count, count), dtype=numpy.int64)
+            chunk_bytes = _CHUNK_BITS // 8
+            for start in range(0, self.bits.shape[1], chunk_bytes):
+                block = numpy.unpackbits(self.bits[:, start:start + chunk_bytes], axis=1).astype(numpy.float32)
+                result += (block @ block.T).astype(numpy.int64)
+            self._intersections = result
+        return self._intersections
+
+    def pairwise_union_bits(self) -> numpy.ndarray:
+        """
+        Number of bits at 1 in the OR of every pair of filters.
+
+        :return: int64 matrix (N, N)
+        """
+
+        return self.m[:, None] + self.m[None, :] - self.pairwise_intersection_bits()
+
+    def cardinalities(self) -> numpy.ndarray:
+        """
+        Estimated number of elements of every filter (calculate_num_of_stored_element).
+
+        :return: float64 array (N,)
+        """
+
+        return _estimate_elements(self.m, self.n, self.k)
+
+    def pairwise_intersection_cardinality(self) -> numpy.ndarray:
+        """
+        Estimated number of elements in the intersection of every pair of filters
+        (calculate_num_of_element_in_intersection).
+
+        :return: float64 matrix (N, N)
+        """
+
+        n = self.n
+        ni = self.pairwise_intersection_bits().astype(numpy.float64)
+        n1 = self.m[:, None].astype(numpy.float64)
+        n2 = self.m[None, :].astype(numpy.float64)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            num = (ni * n) - (n1 * n2)
+            den = n - n1 - n2 + ni
+            return (numpy.log(n - (num / den)) - numpy.log(n)) / (self.k * numpy.log(1 - (1 / n)))
+
+    def pairwise_union_cardinality(self) -> numpy.ndarray:
+        """
+        Estimated number of elements in the union of every pair of filters (the OR is the filter of the union).
+
+        :return: float64 matrix (N, N)
+        """
+
+        return _estimate_elements(self.pairwise_union_bits(), self.n, self.k)
+
+    def union_cardinality(self, keys=None) -> float:
+        """
+        Estimated number of elements seen by at least one of the given filters.
+
+        :param keys: Names of the filters, all of them if None
+        :return: Float estimate
+        """
+
+        rows = self._rows(keys) if keys is not None else list(range(len(self)))
+        if not rows:
+            return 0.0
+        union = numpy.bitwise_or.reduce(self.bits[rows], axis=0)
+        return float(_estimate_elements(int(numpy.unpackbits(union).sum()), self.n, self.k))
+
+    def intersection_cardinality(self, keys) -> float:
+        """
+        Estimated number of elements seen by all the given filters, by inclusion-exclusion over the unions.
+        For two filters, pairwise_intersection_cardinality gives the estimate of calculate_num_of_element_in_intersection.
+
+        :param keys: Names of the filters
+        :return: Float estimate
+        """
+
+        rows = self._rows(keys)
+        if not rows:
+            raise ValueError("At least one Bloom Filter is needed for an intersection")
+        total = 0.0
+        for size in range(1, len(rows) + 1):
+            sign = 1 if size % 2 else -1
+            for subset in combinations(rows, size):
+                total += sign * self.union_cardinality([self.names[row] for row in subset])
+        return total
+
+    def cardinality(self, include, exclude=()) -> float:
+        """
+        Estimated number of elements seen by all the filters in include and by none of the filters in exclude,
+        e.g. the devices seen by sensor A and B but not C.
+
+        :param include: Names of the filters that must contain the element
+        :param exclude: Names of the filters that must not contain the element
+        :return: Float estimate
+        """
+
+        include = list(include)
+        exclude = list(exclude)
+        # |I \ (E1 u E2 ...)| by inclusion-exclusion over the excluded filters
+        total = self.intersection_cardinality(include)
+        for size in range(1, len(exclude) + 1):
+            sign = -1 if size % 2 else 1
+            for subset in combinations(exclude, size):
+                total += sign * self.intersection_cardinality(include + list(subset))
+        return total
+
+
+def _filter_from_packed(row, n, k) -> BloomFilter:
+    bits = bitarray(endian="big")
+    bits.frombytes(row.tobytes())
+    bf = BloomFilter(n, k)
+    bf.set_data(bits[:n])
+    return bf
@@ -59,7 +59,8 @@ def calculate_intersection_of_bf(bf1: BloomFilter, bf2: BloomFilter) -> BloomFil
     """
 
     if bf1.get_n() != bf2.get_n() or bf1.get_k() != bf2.get_k():
-        raise
+        raise ValueError(f"Bloom Filters with different shape: (n={bf1.get_n()}, k={bf1.get_k()}) and "
+                         f"(n={bf2.get_n()}, k={bf2.get_k()})")
     bfi = BloomFilter(bf1.get_n(), bf1.get_k())
     bfi.set_data(bf1.bit_array & bf2.bit_array)
 
@@ -0,0 +1,139 @@
+"""
+Incremental parse of the records of a trace into a capture.
+
+The records (timestamp, rssi, src_mac, quadruplet) are split between the globally unique MAC addresses, counted once
+and inserted in the Bloom Filter, and the fingerprints of the locally administered probe requests, collected for the
+clustering. The parser keeps its state between calls, so a trace can be fed in pieces (or as the partial results of
+parallel_parse) and gives the same capture of a single pass.
+"""
+
+from feature_buffer import FeatureBuffer
+from mac_set import MacSet, is_locally_administered
+
+
+class CaptureParser(object):
+    """
+    Counters, global MAC addresses and local fingerprints of the records parsed so far.
+    """
+
+    def __init__(self, power_threshold, main_bf):
+        """
+        Create an empty capture.
+
+        :param power_threshold: Frames at or below this power are not counted
+        :param main_bf: Bloom Filter that receives the globally unique MAC addresses
+        :return: None
+        """
+
+        self.power_threshold = power_threshold
+        self.main_bf = main_bf
+        self.flat_time = None
+        self.time_window = 0
+        self.frame_counter = 0
+        self.pkt_counter = 0
+        self.probe_counter = 0
+        self.features = FeatureBuffer()
+        self.global_macs = MacSet()
+        self.global_counter = 0
+
+    def update(self, records) -> int:
+        """
+        Parse more records, following the ones already parsed.
+
+        :param records: Iterable of tuples (timestamp, rssi, src_mac, quadruplet), in capture order
+        :return: Number of records parsed
+        """
+
+        # Local copies of the state, the loop runs once per frame
+        power_threshold = self.power_threshold
+        main_bf = self.main_bf
+        flat_time = self.flat_time
+        TIME_WINDOW = self.time_window
+        frame_counter = self.frame_counter
+        pkt_counter = self.pkt_counter
+        probe_counter = self.probe_counter
+        features = self.features
+        global_macs = self.global_macs
+        global_counter = self.global_counter
+        start_frames = frame_counter
+
+        try:
+            for timestamp, rssi, src, quadruplet in records:
+
+                frame_counter += 1
+                if flat_time is None:
+                    flat_time = timestamp
+                if rssi <= power_threshold:
+                    continue
+
+                pkt_counter += 1
+                TIME_WINDOW = timestamp - flat_time
+                # The fingerprint is only available for probe requests
+                if quadruplet is not None:
+                    probe_counter += 1
+                    # Check the nature of MAC address
+                    if not is_locally_administered(src):
+                        # Globally unique, the Bloom Filter is only updated the first time the address is seen
+                        if global_macs.add(src):
+                            global_counter += 1
+                            if not main_bf.check(src):
+                                main_bf.add(src)
+                        continue
+                    features.append(quadruplet, src, timestamp, rssi)
+        finally:
+            self.flat_time = flat_time
+            self.time_window = TIME_WINDOW
+            self.frame_counter = frame_counter
+            self.pkt_counter = pkt_counter
+            self.probe_counter = probe_counter
+            self.global_counter = global_counter
+
+        return frame_counter - start_frames
+
+    def merge(self, partial) -> None:
+        """
+        Add the partial result of the records that follow the ones already parsed.
+
+        :param partial: Dictionary returned by parallel_parse.parse_partial
+        :return: None
+        """
+
+        self.frame_counter += partial["frame_counter"]
+        self.pkt_counter += partial["pkt_counter"]
+        self.probe_counter += partial["probe_counter"]
+        if self.flat_time is None:
+            self.flat_time = partial["first_time"]
+        if partial["last_time"] is not None:
+            # Same subtraction of update, made once with the last counted packet of the partial
+            self.time_window = partial["last_time"] - self.flat_time
+        for src in partial["global_macs"]:
+            if self.global_macs.add(src):
+                self.global_counter += 1
+                if not self.main_bf.check(src):
+                    self.main_bf.add(src)
+        if len(self.features):
+            self.features.extend(partial["features"], partial["macs"], partial["times"], partial["rssi"])
+        else:
+            # The columns of the first partial are owned by the capture (or read-only maps), they are not copied
+            self.features = FeatureBuffer.wrap(partial["features"], partial["macs"], partial["times"],
+                                               partial["rssi"])
+
+    def capture(self) -> dict:
+        """
+        Get the capture parsed so far, as given to count_local_devices.
+
+        :return: Dictionary with flat_time, time_window, frame_counter, pkt_counter, probe_counter, global_counter,
+            global_macs, global_values and features (the last ones are shared with the parser, not copied)
+        """
+
+        return {
+            "flat_time": self.flat_time,
+            "time_window": self.time_window,
+            "frame_counter": self.frame_counter,
+            "pkt_counter": self.pkt_counter,
+            "probe_counter": self.probe_counter,
+            "global_counter": self.global_counter,
+            "global_macs": self.global_macs,
+            "global_values": dict(),
+            "features": self.features,
+        }
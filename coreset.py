@@ -0,0 +1,150 @@
+"""
+Clustering of a bounded sample of the fingerprints, with the labels given back to every probe request.
+
+The fit of OPTICS grows superlinearly with the number of probe requests, and the weighted fit with the number of
+distinct fingerprints, so the capture of a dense venue can be too large to cluster. CoresetClustering wraps a
+clustering model and fits it on at most budget rows:
+
+- the rows are collapsed into fingerprint cells (their distinct quadruplets) with the number of rows of every cell;
+- the budget is shared between the cells in proportion to their rows (stratified sampling): every cell keeps at least
+  one row when there are at most budget cells, otherwise the rows are drawn at random and the rarest cells may have
+  none;
+- the rows of every cell are chosen at random (a reservoir sample of the cell), and min_samples is scaled by the
+  sampling rate, so the density that makes a core point is the one of the whole capture;
+- every cell takes the most frequent label of its sampled rows, the cells with no sampled row the label of the nearest
+  sampled cell, and every row the label of its cell.
+
+Every probe request gets a label, so the number of probe requests N of every cluster, used by the advanced counting
+(K = N / (L * T)), and the MAC addresses and centroids are computed on the whole capture. Captures within the budget
+are given to the model unchanged, with the same labels.
+"""
+
+import numpy
+from sklearn.neighbors import NearestNeighbors
+
+
+def cell_quotas(counts, budget, rng) -> numpy.ndarray:
+    """
+    Share a budget of rows between the fingerprint cells in proportion to their rows.
+
+    :param counts: Number of rows of every cell, int array (U,)
+    :param budget: Rows to sample, fewer than counts.sum()
+    :param rng: numpy.random.Generator, used when there are more cells than rows to sample
+    :return: int64 array (U,) with the rows of every cell, at most counts and summing to at most budget
+    """
+
+    counts = numpy.asarray(counts, dtype=numpy.int64)
+    if len(counts) > budget:
+        # Uniform sample of the rows, cell by cell
+        return numpy.minimum(rng.multinomial(budget, counts / counts.sum()), counts)
+
+    # One row per cell, the others split by the largest remainder
+    quotas = numpy.ones(len(counts), dtype=numpy.int64)
+    rest = counts - 1
+    extra = budget - len(counts)
+    if extra > 0 and rest.sum() > 0:
+        shares = rest * (extra / rest.sum())
+        floors = numpy.minimum(numpy.floor(shares).astype(numpy.int64), rest)
+        left = extra - int(floors.sum())
+        if left > 0:
+            order = numpy.argsort(floors - shares, kind="stable")
+            order = order[floors[order] < rest[order]][:left]
+            floors[order] += 1
+        quotas += floors
+    return quotas
+
+
+def sample_rows(cells, quotas, rng) -> numpy.ndarray:
+    """
+    Choose at random the given number of rows of every cell.
+
+    :param cells: Cell of every row, int array (n,)
+    :param quotas: Rows to choose in every cell, int array (U,)
+    :param rng: numpy.random.Generator
+    :return: Sorted int64 array with the indices of the chosen rows
+    """
+
+    # Rows grouped by cell, in random order inside the cell
+    order = numpy.lexsort((rng.random(len(cells)), cells))
+    grouped = cells[order]
+    starts = numpy.searchsorted(grouped, numpy.arange(len(quotas)))
+    position = numpy.arange(len(cells)) - starts[grouped]
+    return numpy.sort(order[position < quotas[grouped]])
+
+
+class CoresetClustering(object):
+    """
+    Clustering model (OPTICS or WeightedOPTICS) fitted on a stratified sample of at most budget rows, labels_ only.
+    """
+
+    def __init__(self, model, budget, seed=0):
+        """
+        Wrap a clustering model.
+
+        :param model: Unfitted model with min_samples, metric, fit and labels_, e.g. create_clustering
+        :param budget: Maximum number of rows given to the model
+        :param seed: Seed of the sampling
+        :return: None
+        """
+
+        if budget < 2:
+            raise ValueError(f"budget must be at least 2, got {budget}")
+        self.model = model
+        self.budget = budget
+        self.seed = seed
+        self.min_samples = model.min_samples
+        self.labels_ = None
+        # Rows, fingerprint cells and rows given to the model by the last fit
+        self.n_rows_ = 0
+        self.n_cells_ = 0
+        self.sample_size_ = 0
+
+    def fit(self, X):
+        """
+        Cluster a fingerprint matrix.
+
+        :param X: Matrix (n, features), a NumPy array or a DataFrame
+        :return: self
+        """
+
+        X = numpy.asarray(X, dtype=numpy.float64)
+        n = len(X)
+        self.n_rows_ = n
+        self.model.min_samples = self.min_samples
+        if n <= self.budget:
+            self.n_cells_ = len(numpy.unique(X, axis=0)) if n else 0
+            self.sample_size_ = n
+            self.labels_ = numpy.asarray(self.model.fit(X).labels_)
+            return self
+
+        rng = numpy.random.default_rng(self.seed)
+        points, cells, counts = numpy.unique(X, axis=0, return_inverse=True, return_counts=True)
+        cells = cells.ravel()
+        sampled = sample_rows(cells, cell_quotas(counts, self.budget, rng), rng)
+        self.n_cells_ = len(points)
+        self.sample_size_ = len(sampled)
+
+        # Same density threshold on the sample, a fraction of the rows is already independent of their number
+        if self.min_samples > 1:
+            self.model.min_samples = min(max(2, int(round(self.min_samples * len(sampled) / n))), len(sampled))
+        sample_labels = numpy.asarray(self.model.fit(X[sampled]).labels_, dtype=numpy.int64)
+
+        # Most frequent label of the sampled rows of every cell, the smallest on ties
+        pairs, votes = numpy.unique(numpy.column_stack((cells[sampled], sample_labels)), axis=0, return_counts=True)
+        order = numpy.lexsort((pairs[:, 1], -votes, pairs[:, 0]))
+        pairs = pairs[order]
+        first = numpy.concatenate(([True], pairs[1:, 0] != pairs[:-1, 0]))
+        cell_labels = numpy.full(len(points), -1, dtype=numpy.int64)
+        cell_labels[pairs[first, 0]] = pairs[first, 1]
+
+        covered = numpy.zeros(len(points), dtype=bool)
+        covered[pairs[:, 0]] = True
+        if not covered.all():
+            # The cells with no sampled row take the label of the nearest sampled cell
+            known = numpy.flatnonzero(covered)
+            nbrs = NearestNeighbors(n_neighbors=1, metric=self.model.metric).fit(points[known])
+            nearest = nbrs.kneighbors(points[~covered], return_distance=False)[:, 0]
+            cell_labels[~covered] = cell_labels[known[nearest]]
+
+        self.labels_ = cell_labels[cells]
+        return self
@@ -0,0 +1,198 @@
+"""
+Growable columnar buffer for the locally administered probe requests.
+
+Every probe is stored as a row of a struct of arrays: the fingerprint in an int64 matrix, the source MAC address packed
+into a uint64, the capture time as float64 and the RSSI as int8, about 49 bytes per probe with no Python object behind
+it. Rows are appended in amortized O(1) time into preallocated arrays that double their capacity when full, so the
+collection of n probes costs O(n) instead of the O(n^2) of growing a DataFrame one row at a time.
+"""
+
+import numpy
+
+from mac_set import pack_mac, unpack_mac
+
+FEATURE_COLUMNS = ["vht_cap", "ext_cap", "ht_cap", "vendor"]
+
+
+class FeatureBuffer(object):
+    """
+    Fingerprint matrix (int64, 4 columns) with the parallel columns of packed MAC addresses, timestamps and RSSI.
+    """
+
+    def __init__(self, capacity=1024):
+        """
+        Create an empty buffer.
+
+        :param capacity: Initial number of rows allocated
+        :return: None
+        """
+
+        capacity = max(capacity, 1)
+        self.size = 0
+        self.features = numpy.empty((capacity, len(FEATURE_COLUMNS)), dtype=numpy.int64)
+        self.macs = numpy.empty(capacity, dtype=numpy.uint64)
+        self.times = numpy.empty(capacity, dtype=numpy.float64)
+        self.rssi = numpy.empty(capacity, dtype=numpy.int8)
+
+    @classmethod
+    def wrap(cls, features, macs, times, rssi):
+        """
+        Create a full buffer on existing columns without copying them (e.g. read-only memory-mapped arrays).
+
+        :param features: Matrix (n, 4) of fingerprints
+        :param macs: Array (n,) of packed MAC addresses
+        :param times: Array (n,) of timestamps
+        :param rssi: Array (n,) of signal powers
+        :return: FeatureBuffer, the columns are copied into new arrays only by the first append that needs more rows
+        """
+
+        buffer = cls(1)
+        n = len(features)
+        if not len(macs) == len(times) == len(rssi) == n:
+            raise ValueError(f"{n} fingerprints with {len(macs)} MAC addresses, {len(times)} timestamps and "
+                             f"{len(rssi)} RSSI values")
+        if n:
+            buffer.features = numpy.asarray(features, dtype=numpy.int64).reshape(-1, len(FEATURE_COLUMNS))
+            buffer.macs = numpy.asarray(macs, dtype=numpy.uint64)
+            buffer.times = numpy.asarray(times, dtype=numpy.float64)
+            buffer.rssi = numpy.asarray(rssi, dtype=numpy.int8)
+            buffer.size = n
+        return buffer
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _grow(self, needed) -> None:
+        capacity = len(self.features)
+        while capacity < needed:
+            capacity *= 2
+        for name in ("features", "macs", "times", "rssi"):
+            old = getattr(self, name)
+            new = numpy.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def append(self, quadruplet, mac, timestamp, rssi) -> None:
+        """
+        Append a probe request.
+
+        :param quadruplet: List [vht_cap, ext_cap, ht_cap, vendor]
+        :param mac: Source MAC address of the probe request
+        :param timestamp: Capture time of the probe request
+        :param rssi: Signal power of the probe request in dBm
+        :return: None
+        """
+
+        size = self.size
+        if size == len(self.features):
+            self._grow(size + 1)
+        self.features[size] = quadruplet
+        self.macs[size] = pack_mac(mac)
+        self.times[size] = timestamp
+        self.rssi[size] = rssi
+        self.size = size + 1
+
+    def extend(self, features, macs, times, rssi) -> None:
+        """
+        Append the rows of another buffer, as if they were appended one at a time.
+
+        :param features: Matrix (n, 4) of fingerprints
+        :param macs: Array (n,) of packed MAC addresses
+        :param times: Array (n,) of timestamps
+        :param rssi: Array (n,) of signal powers
+        :return: None
+        """
+
+        features = numpy.asarray(features, dtype=numpy.int64).reshape(-1, len(FEATURE_COLUMNS))
+        n = len(features)
+        if not len(macs) == len(times) == len(rssi) == n:
+            raise ValueError(f"{n} fingerprints with {len(macs)} MAC addresses, {len(times)} timestamps and "
+                             f"{len(rssi)} RSSI values")
+        # Nothing to write, the columns may be read-only maps (see wrap)
+        if n == 0:
+            return
+
+        if self.size + n > len(self.features):
+            self._grow(self.size + n)
+        end = self.size + n
+        self.features[self.size:end] = features
+        self.macs[self.size:end] = macs
+        self.times[self.size:end] = times
+        self.rssi[self.size:end] = rssi
+        self.size = end
+
+    def drop(self, n) -> None:
+        """
+        Remove the first rows, the others are moved to the front of the arrays (e.g. the probes that leave a window).
+
+        :param n: Number of rows removed, at most size
+        :return: None
+        """
+
+        if not 0 <= n <= self.size:
+            raise ValueError(f"Cannot drop {n} of {self.size} rows")
+        # Nothing to write, the columns may be read-only maps (see wrap)
+        if n == 0:
+            return
+
+        rest = self.size - n
+        for name in ("features", "macs", "times", "rssi"):
+            column = getattr(self, name)
+            column[:rest] = column[n:self.size]
+        self.size = rest
+
+    def get_features(self) -> numpy.ndarray:
+        """
+        Get the fingerprint matrix.
+
+        :return: View of shape (size, 4) on the stored rows
+        """
+
+        return self.features[:self.size]
+
+    def get_macs(self) -> numpy.ndarray:
+        """
+        Get the packed source MAC address of every row (see mac_set.unpack_mac).
+
+        :return: View of shape (size,) uint64
+        """
+
+        return self.macs[:self.size]
+
+    def get_times(self) -> numpy.ndarray:
+        """
+        Get the capture time of every row.
+
+        :return: View of shape (size,) float64
+        """
+
+        return self.times[:self.size]
+
+    def get_rssi(self) -> numpy.ndarray:
+        """
+        Get the signal power of every row.
+
+        :return: View of shape (size,) int8
+        """
+
+        return self.rssi[:self.size]
+
+    def distinct_macs(self) -> list:
+        """
+        Get the distinct source MAC addresses of the rows.
+
+        :return: List of MAC addresses in the "aa:bb:cc:dd:ee:ff" form, sorted by packed value
+        """
+
+        return [unpack_mac(value) for value in numpy.unique(self.get_macs()).tolist()]
+
+    def to_dataframe(self):
+        """
+        Build the DataFrame given to the clustering algorithm.
+
+        :return: pandas DataFrame with one column per fingerprint element
+        """
+
+        import pandas as pd
+
+        return pd.DataFrame(self.get_features(), columns=FEATURE_COLUMNS)
@@ -0,0 +1,149 @@
+"""
+Bounded LRU cache of the fingerprints, keyed by the raw bytes of the Information Elements.
+
+Devices with randomized MAC addresses send the same set of elements over and over, so most of the probe requests of a
+capture decode to a fingerprint already seen. The cache maps the raw tagged parameters of a probe request to its
+quadruplet (and to the number of elements that could not be decoded), evicting the least recently used entries beyond
+its size. It can be saved to a .npz file and loaded by the next run of the same sensor, which then skips the decoding
+of the fingerprints it already knows.
+"""
+
+import logging
+import os
+import zipfile
+from collections import OrderedDict
+
+import numpy
+
+from ie_decoder import quadruplet_from_ies
+
+# Version of the saved layout and of the decoder, bumped when either changes so that old files are not reused
+FORMAT_VERSION = 1
+
+logger = logging.getLogger()
+
+
+class FingerprintCache(object):
+    """
+    LRU map raw Information Elements -> fingerprint quadruplet, with hit and miss counters.
+    """
+
+    def __init__(self, size=65536):
+        """
+        Create an empty cache.
+
+        :param size: Maximum number of fingerprints kept
+        :return: None
+        """
+
+        if size <= 0:
+            raise ValueError(f"size must be positive, got {size}")
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        # Key -> (quadruplet tuple, decode failures), the most recently used at the end
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def decode(self, ies, stats=None) -> list:
+        """
+        Get the fingerprint quadruplet of the raw tagged parameters of a probe request, decoding it on a miss.
+
+        :param ies: Raw bytes (or memoryview) of the tagged parameters
+        :param stats: Optional dictionary whose "ie_decode_failures" counts the elements left at -1 (hits included)
+        :return: List [vht_cap, ext_cap, ht_cap, vendor], as quadruplet_from_ies
+        :raise ValueError: If an element cannot be decoded exactly (not cached), the caller should fall back to scapy
+        """
+
+        key = bytes(ies)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            failures = dict()
+            entry = (tuple(quadruplet_from_ies(ies, failures)), failures.get("ie_decode_failures", 0))
+            self._entries[key] = entry
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        if entry[1] and stats is not None:
+            stats["ie_decode_failures"] = stats.get("ie_decode_failures", 0) + entry[1]
+        return list(entry[0])
+
+    def hit_rate(self) -> float:
+        """
+        Get the fraction of the lookups answered by the cache.
+
+        :return: Float in [0, 1], 0 if there was no lookup
+        """
+
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def counters(self) -> dict:
+        """
+        Get the counters of the cache.
+
+        :return: Dictionary with hits, misses, entries and hit_rate
+        """
+
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                "hit_rate": round(self.hit_rate(), 4)}
+
+    def save(self, path) -> None:
+        """
+        Save the entries, from the least to the most recently used.
+
+        :param path: Path of the .npz file
+        :return: None
+        """
+
+        keys = list(self._entries.keys())
+        lengths = numpy.fromiter(map(len, keys), dtype=numpy.int64, count=len(keys))
+        offsets = numpy.zeros(len(keys) + 1, dtype=numpy.int64)
+        numpy.cumsum(lengths, out=offsets[1:])
+        values = list(self._entries.values())
+        quadruplets = numpy.array([value[0] for value in values], dtype=numpy.int64).reshape(-1, 4)
+        failures = numpy.array([value[1] for value in values], dtype=numpy.int64)
+
+        # Written under a temporary name and renamed, a concurrent run never reads a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as fw:
+            numpy.savez(fw, version=numpy.int64(FORMAT_VERSION),
+                        keys=numpy.frombuffer(b"".join(keys), dtype=numpy.uint8), offsets=offsets,
+                        quadruplets=quadruplets, failures=failures)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, size=65536):
+        """
+        Create a cache with the entries saved by a previous run, an empty one if the file is missing or stale.
+
+        :param path: Path of the .npz file
+        :param size: Maximum number of fingerprints kept, the most recently used are loaded first
+        :return: FingerprintCache
+        """
+
+        cache = cls(size)
+        if not os.path.exists(path):
+            return cache
+        try:
+            with numpy.load(path) as data:
+                if int(data["version"]) != FORMAT_VERSION:
+                    logger.warning(f"Ignoring the fingerprint cache {path}, saved with another version")
+                    return cache
+                keys = data["keys"].tobytes()
+                offsets = data["offsets"].tolist()
+                quadruplets = data["quadruplets"].tolist()
+                failures = data["failures"].tolist()
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            logger.warning(f"Ignoring the fingerprint cache {path}: {e}")
+            return cache
+
+        first = max(len(failures) - size, 0)
+        for i in range(first, len(failures)):
+            cache._entries[keys[offsets[i]:offsets[i + 1]]] = (tuple(quadruplets[i]), failures[i])
+        return cache
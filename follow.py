@@ -0,0 +1,372 @@
+"""
+Live counting of a capture that is still being written.
+
+The radiotap + 802.11 pcap records are read from the standard input or a FIFO (e.g. tcpdump -w - piped into this
+script), or by tailing a directory of rotating capture files (e.g. tcpdump -G / -C) while they grow. A reader thread
+only splits the byte stream into records and puts them in a bounded queue, the main thread parses the frames and counts
+them with the sliding window of windowed.py, writing a row every --step seconds of capture time over the last --window
+seconds. The frames are parsed by the raw parser of frame_parser.py, with scapy as fallback for the frames it cannot
+decode, unless another --ingest is given (stream and rdpcap dissect every frame with scapy).
+
+When the queue is full the reader either waits (--on_full block, the default: the pressure propagates to the writer of
+the pipe and no frame is lost) or drops the frame (--on_full drop: the capture is never slowed down, the counts are made
+on the frames that fit). Every row carries the queue counters, that can also be written as JSON or Prometheus metrics.
+
+Example:
+    tcpdump -i wlan0mon -w - -U | python follow.py --window 60 --step 30 --format jsonl
+    python follow.py --directory /var/spool/captures --pattern "*.pcap*" --window 60 --step 30
+"""
+
+import argparse
+import glob
+import logging
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+from pipeline import add_counting_arguments, create_fingerprint_cache
+from frame_parser import frame_record
+from metrics import Metrics
+from model_db import load_models
+from pcap_stream import LINKTYPE_IEEE802_11_RADIOTAP, file_records, read_pcap_header, stream_fileobj_records
+from windowed import OUTPUT_COLUMNS, WindowedCounter, write_rows
+
+FOLLOW_COLUMNS = OUTPUT_COLUMNS + ["frames_read", "frames_dropped", "backpressure_waits", "queue_depth",
+                                   "queue_high_water", "late_frames"]
+
+# Put in the queue by the reader when its source ends
+_END = None
+
+logger = logging.getLogger()
+
+
+class _TailedFile(object):
+    """
+    Pcap file that may still be growing, read one complete record at a time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, "rb")
+        self._header = None
+        self._position = 0
+
+    def records(self):
+        """
+        Read the complete records written so far.
+
+        :return: Generator of tuples (timestamp, data), a partial record is read again at the next call
+        :raise ValueError: If the file is not a classic radiotap + 802.11 pcap trace
+        """
+
+        f = self._f
+        if self._header is None:
+            f.seek(0)
+            if len(f.read(24)) < 24:
+                return
+            f.seek(0)
+            endian, nano, linktype = read_pcap_header(f)
+            if linktype != LINKTYPE_IEEE802_11_RADIOTAP:
+                raise ValueError(f"{self.path} has link type {linktype}, {LINKTYPE_IEEE802_11_RADIOTAP} expected")
+            self._header = (endian, nano)
+            self._position = f.tell()
+        f.seek(self._position)
+        for timestamp, data in file_records(f, *self._header):
+            self._position += 16 + len(data)
+            yield timestamp, data
+
+    def close(self) -> None:
+        self._f.close()
+
+
+def pipe_records(path):
+    """
+    Read the records of a radiotap + 802.11 pcap stream until it ends.
+
+    :param path: Path of the stream (e.g. a FIFO), - for the standard input, the file is closed when the stream ends
+    :return: Generator of tuples (timestamp, data)
+    :raise ValueError: If the stream is not a classic radiotap + 802.11 pcap trace
+    """
+
+    if path == "-":
+        yield from stream_fileobj_records(sys.stdin.buffer, LINKTYPE_IEEE802_11_RADIOTAP)
+        return
+    with open(path, "rb") as f:
+        yield from stream_fileobj_records(f, LINKTYPE_IEEE802_11_RADIOTAP)
+
+
+def tail_directory(directory, pattern="*.pcap*", poll=0.5, stop=None, idle_exit=None):
+    """
+    Read the records of the rotating capture files of a directory, following the last one while it grows.
+
+    The files are read in order of modification time. The file being read is considered complete, and left, when it
+    has no new record and a newer file matching the pattern exists.
+
+    :param directory: Directory where the capture files are written
+    :param pattern: Glob of the capture files inside the directory
+    :param poll: Seconds between two checks when there is no new data
+    :param stop: Optional threading.Event, the reading ends when it is set
+    :param idle_exit: If given, the reading ends after these seconds without new records
+    :return: Generator of tuples (timestamp, data)
+    :raise ValueError: If a capture file is not a classic radiotap + 802.11 pcap trace
+    """
+
+    done = set()
+    current = None
+    last_data = time.monotonic()
+    try:
+        while stop is None or not stop.is_set():
+            found = False
+            if current is not None:
+                for record in current.records():
+                    found = True
+                    yield record
+            if found:
+                last_data = time.monotonic()
+                continue
+
+            paths = set(glob.glob(os.path.join(directory, pattern)))
+            # Forget the files removed by the rotation, so the set does not grow forever
+            done &= paths
+            pending = [path for path in paths if path not in done and (current is None or path != current.path)]
+            if pending:
+                if current is not None:
+                    # A newer file exists and nothing was added to this one, the writer moved on
+                    current.close()
+                    done.add(current.path)
+                pending.sort(key=lambda path: (os.path.getmtime(path), path))
+                current = _TailedFile(pending[0])
+                continue
+
+            if idle_exit is not None and time.monotonic() - last_data >= idle_exit:
+                return
+            time.sleep(poll)
+    finally:
+        if current is not None:
+            current.close()
+
+
+class QueueReader(threading.Thread):
+    """
+    Thread that moves the records of a source into a bounded queue, counting the frames it waited for or dropped.
+    """
+
+    def __init__(self, records, max_queue=10000, on_full="block"):
+        """
+        Create the reader, start it with start().
+
+        :param records: Iterable of tuples (timestamp, data), e.g. pipe_records or tail_directory
+        :param max_queue: Maximum number of records waiting to be parsed
+        :param on_full: "block" to wait for room in the queue, "drop" to discard the record
+        :return: None
+        """
+
+        if max_queue <= 0:
+            raise ValueError(f"max_queue must be positive, got {max_queue}")
+        if on_full not in ("block", "drop"):
+            raise ValueError(f"on_full must be block or drop, got {on_full}")
+
+        super().__init__(name="pcap-reader", daemon=True)
+        self.records = records
+        self.on_full = on_full
+        self.queue = queue.Queue(max_queue)
+        self.error = None
+        # Written by the reader only, read by the consumer
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+        self.queue_high_water = 0
+
+    def run(self) -> None:
+        q = self.queue
+        try:
+            for record in self.records:
+                self.frames_read += 1
+                try:
+                    q.put_nowait(record)
+                except queue.Full:
+                    if self.on_full == "drop":
+                        self.frames_dropped += 1
+                        continue
+                    self.backpressure_waits += 1
+                    start = time.perf_counter()
+                    q.put(record)
+                    self.backpressure_seconds += time.perf_counter() - start
+                depth = q.qsize()
+                if depth > self.queue_high_water:
+                    self.queue_high_water = depth
+        except Exception as e:
+            self.error = e
+        finally:
+            q.put(_END)
+
+    def counters(self) -> dict:
+        """
+        Get the counters of the reader.
+
+        :return: Dictionary with frames_read, frames_dropped, backpressure_waits, backpressure_seconds, queue_depth and
+            queue_high_water
+        """
+
+        return {
+            "frames_read": self.frames_read,
+            "frames_dropped": self.frames_dropped,
+            "backpressure_waits": self.backpressure_waits,
+            "backpressure_seconds": round(self.backpressure_seconds, 6),
+            "queue_depth": self.queue.qsize(),
+            "queue_high_water": self.queue_high_water,
+        }
+
+
+def follow(reader, counter, opt, cache=None, metrics=None, stop=None, idle_flush=None, batch_size=1024):
+    """
+    Parse the records of a running reader and yield the windows they close.
+
+    :param reader: QueueReader, started by this function if it is not running yet
+    :param counter: WindowedCounter
+    :param opt: Counting options (power_threshold, ingest)
+    :param cache: Optional FingerprintCache of the raw ingest
+    :param metrics: Optional Metrics updated with the stage times and the counters of the reader
+    :param stop: Optional threading.Event, the windows still open are flushed when it is set
+    :param idle_flush: If given, after these seconds without records the windows ending before the capture time
+        estimated from the wall clock are closed, so that the counts keep coming when the traffic stops
+    :param batch_size: Maximum number of records taken from the queue at once
+    :return: Generator of dictionaries with the FOLLOW_COLUMNS keys
+    :raise Exception: The error that stopped the reader, after the windows read before it
+    """
+
+    if metrics is None:
+        metrics = Metrics()
+    if reader.ident is None:
+        reader.start()
+    q = reader.queue
+    power_threshold = opt["power_threshold"]
+    fast = opt["ingest"] == "raw"
+    stats = dict()
+    last_time = None
+    last_wall = time.monotonic()
+
+    def rows(windows):
+        for row in windows:
+            row.update(reader.counters())
+            row["late_frames"] = counter.late_frames
+            metrics.add("windows")
+            for name, value in {**reader.counters(), **stats}.items():
+                metrics.set(name, value)
+            metrics.set("late_frames", counter.late_frames)
+            if cache is not None:
+                for name, value in cache.counters().items():
+                    metrics.set(f"fingerprint_cache_{name}", value)
+            yield {column: row[column] for column in FOLLOW_COLUMNS}
+
+    ended = False
+    while not ended and (stop is None or not stop.is_set()):
+        try:
+            item = q.get(timeout=0.5)
+        except queue.Empty:
+            if idle_flush is not None and last_time is not None and time.monotonic() - last_wall >= idle_flush:
+                with metrics.stage("count"):
+                    windows = list(counter.advance(last_time + time.monotonic() - last_wall))
+                yield from rows(windows)
+            continue
+
+        batch = list()
+        while True:
+            if item is _END:
+                ended = True
+                break
+            batch.append(item)
+            if len(batch) >= batch_size:
+                break
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                break
+
+        with metrics.stage("parse"):
+            records = [frame_record(timestamp, data, power_threshold, stats, fast, cache) for timestamp, data in batch]
+        if records:
+            last_time = records[-1][0]
+            last_wall = time.monotonic()
+        with metrics.stage("count"):
+            windows = list(counter.feed(records))
+        yield from rows(windows)
+
+    with metrics.stage("count"):
+        windows = list(counter.flush())
+    yield from rows(windows)
+    if reader.error is not None:
+        raise reader.error
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_file", type=str, default="-",
+                        help="Pcap stream to follow, a FIFO or - for the standard input (the default).")
+    parser.add_argument("--directory", type=str, default=None,
+                        help="Directory of rotating capture files to tail instead of --input_file.")
+    parser.add_argument("--pattern", type=str, default="*.pcap*", help="Glob of the capture files in --directory.")
+    parser.add_argument("--poll", type=float, default=0.5, help="Seconds between two checks of --directory.")
+    parser.add_argument("--idle_exit", type=float, default=None,
+                        help="Stop tailing --directory after these seconds without new records.")
+    parser.add_argument("--window", type=float, default=60, help="Length of the sliding window in seconds.")
+    parser.add_argument("--step", type=float, default=None,
+                        help="Seconds between two consecutive counts, the window length if not given.")
+    parser.add_argument("--max_queue", type=int, default=10000, help="Records waiting to be parsed at most.")
+    parser.add_argument("--on_full", type=str, choices=["block", "drop"], default="block",
+                        help="When the queue is full wait for the parser (block) or discard the record (drop).")
+    parser.add_argument("--idle_flush", type=float, default=None,
+                        help="Close the windows that are over by the wall clock after these seconds without records.")
+    parser.add_argument("--format", type=str, choices=["csv", "jsonl"], default="jsonl",
+                        help="Format of the time series, the possible choices are csv and jsonl.")
+    parser.add_argument("--output", type=str, default=None, help="Output file, the standard output if not given.")
+    parser.add_argument("--metrics", type=str, default=None,
+                        help="Path of a JSON report of the stage times and queue counters, rewritten at every count.")
+    parser.add_argument("--prometheus", type=str, default=None,
+                        help="Path of the same report in the Prometheus text format, rewritten at every count.")
+    add_counting_arguments(parser)
+    # The frames are radiotap + 802.11, the raw parser decodes them and falls back to scapy for the others
+    parser.set_defaults(ingest="raw")
+    opt = vars(parser.parse_args())
+
+    logging.basicConfig(level=logging.WARNING)
+
+    models = load_models(opt["models"], opt["rate_modality"], opt["models_cache"])
+    counter = WindowedCounter(opt["window"], opt["step"] or opt["window"], opt, models)
+    cache = create_fingerprint_cache(opt)
+    metrics = Metrics({"input": opt["directory"] or opt["input_file"]})
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    if opt["directory"]:
+        source = tail_directory(opt["directory"], opt["pattern"], opt["poll"], stop, opt["idle_exit"])
+    else:
+        source = pipe_records(opt["input_file"])
+    reader = QueueReader(source, opt["max_queue"], opt["on_full"])
+
+    def windows():
+        for row in follow(reader, counter, opt, cache, metrics, stop, opt["idle_flush"]):
+            yield row
+            if opt["metrics"]:
+                metrics.write_json(opt["metrics"])
+            if opt["prometheus"]:
+                metrics.write_prometheus(opt["prometheus"])
+
+    if opt["output"]:
+        with open(opt["output"], "w", newline="") as fw:
+            write_rows(windows(), fw, opt["format"], FOLLOW_COLUMNS)
+    else:
+        write_rows(windows(), sys.stdout, opt["format"], FOLLOW_COLUMNS)
+    if cache is not None and opt["fingerprint_cache"]:
+        cache.save(opt["fingerprint_cache"])
+    counters = reader.counters()
+    if counters["frames_dropped"] or counters["backpressure_waits"]:
+        logger.warning(f"Frames dropped: {counters['frames_dropped']}, "
+                       f"backpressure waits: {counters['backpressure_waits']}")
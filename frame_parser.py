@@ -0,0 +1,182 @@
+"""
+Lightweight parser of radiotap + 802.11 management frames.
+
+Only the few fields used by the counting pipeline are read, straight from the raw pcap records with memoryview and
+struct, without building scapy packet trees. Frames that the fast path cannot decode exactly are handed to scapy.
+Every frame becomes a record (timestamp, rssi, src_mac, quadruplet), where quadruplet is None for frames that are not
+probe requests.
+"""
+
+from ie_decoder import extract_quadruplet, quadruplet_from_ies
+from pcap_stream import LINKTYPE_IEEE802_11_RADIOTAP, pcap_linktype, stream_packets, stream_records
+
+# Radiotap present flags read by the fast path (the fields before dBm_AntSignal must be skipped)
+_RT_TSFT = 1 << 0
+_RT_FLAGS = 1 << 1
+_RT_RATE = 1 << 2
+_RT_CHANNEL = 1 << 3
+_RT_FHSS = 1 << 4
+_RT_DBM_ANTSIGNAL = 1 << 5
+_RT_EXT = 1 << 31
+# Radiotap Flags: the frame includes the FCS at the end
+_RT_FLAGS_FCS = 0x10
+
+# Frame Control of a probe request (protocol 0, type management, subtype 4)
+_FC_PROBE_REQ = 0x40
+# Frame Control flags that change the frame layout (protected, +HTC/order)
+_FC_FLAGS_UNSUPPORTED = 0xc0
+_DOT11_MGMT_HEADER_LEN = 24
+
+
+def parse_frame(timestamp: float, data, power_threshold=None, stats=None, cache=None) -> tuple:
+    """
+    Parse a radiotap + 802.11 frame from its raw bytes.
+
+    :param timestamp: Capture time of the frame
+    :param data: Raw bytes of the pcap record
+    :param power_threshold: If given, the Information Elements of frames at or below this power are not decoded
+    :param stats: Optional dictionary updated with the number of "ie_decode_failures"
+    :param cache: Optional FingerprintCache of the fingerprints already decoded
+    :return: Tuple (timestamp, rssi, src_mac, quadruplet), src_mac and quadruplet are None if not a probe request
+    :raise ValueError: If the frame cannot be decoded exactly, the caller should fall back to scapy
+    """
+
+    view = memoryview(data)
+    size = len(view)
+    if size < 8 or view[0] != 0:
+        raise ValueError("Unsupported radiotap header")
+    rt_len = view[2] | (view[3] << 8)
+    # Every read of the header below stays within rt_len, so within the record
+    if rt_len < 8 or rt_len > size:
+        raise ValueError("Truncated radiotap header")
+    present = view[4] | (view[5] << 8) | (view[6] << 16) | (view[7] << 24)
+    if not present & _RT_DBM_ANTSIGNAL:
+        raise ValueError("Radiotap header without dBm_AntSignal")
+
+    # Skip the extended present bitmaps, the fields start after the last one
+    offset = 8
+    word = present
+    while word & _RT_EXT:
+        if offset + 4 > rt_len:
+            raise ValueError("Truncated radiotap header")
+        word = view[offset + 3] << 24
+        offset += 4
+
+    # Fields are aligned to their natural size, relatively to the beginning of the header
+    flags = 0
+    if present & _RT_TSFT:
+        offset = ((offset + 7) & ~7) + 8
+    if present & _RT_FLAGS:
+        if offset >= rt_len:
+            raise ValueError("Truncated radiotap header")
+        flags = view[offset]
+        offset += 1
+    if present & _RT_RATE:
+        offset += 1
+    if present & _RT_CHANNEL:
+        offset = ((offset + 1) & ~1) + 4
+    if present & _RT_FHSS:
+        offset += 2
+    if offset >= rt_len:
+        raise ValueError("Truncated radiotap header")
+    rssi = view[offset]
+    if rssi > 127:
+        rssi -= 256
+
+    if rt_len >= size or view[rt_len] & 0xfc != _FC_PROBE_REQ:
+        return timestamp, rssi, None, None
+    if rt_len + 2 > size:
+        raise ValueError("Truncated probe request")
+    if view[rt_len] != _FC_PROBE_REQ or view[rt_len + 1] & _FC_FLAGS_UNSUPPORTED:
+        raise ValueError("Unsupported probe request layout")
+    end = size - 4 if flags & _RT_FLAGS_FCS else size
+    start = rt_len + _DOT11_MGMT_HEADER_LEN
+    if end < start:
+        raise ValueError("Truncated probe request")
+
+    src = view[rt_len + 10:rt_len + 16].hex(":")
+    if power_threshold is not None and rssi <= power_threshold:
+        return timestamp, rssi, src, None
+    if cache is not None:
+        return timestamp, rssi, src, cache.decode(view[start:end], stats)
+    return timestamp, rssi, src, quadruplet_from_ies(view[start:end], stats)
+
+
+def scapy_record(packet, power_threshold=None, stats=None) -> tuple:
+    """
+    Build the record of a frame already dissected by scapy.
+
+    :param packet: Scapy packet
+    :param power_threshold: If given, the Information Elements of frames at or below this power are not decoded
+    :param stats: Optional dictionary updated with the number of "ie_decode_failures"
+    :return: Tuple (timestamp, rssi, src_mac, quadruplet), quadruplet is None if not a probe request
+    """
+
+    rssi = packet.dBm_AntSignal
+    quadruplet = None
+    if packet.getlayer("Dot11ProbeReq") and (power_threshold is None or rssi > power_threshold):
+        quadruplet = extract_quadruplet(packet, stats)
+    return float(packet.time), rssi, packet.addr2, quadruplet
+
+
+def frame_record(timestamp: float, data, power_threshold=None, stats=None, fast=True, cache=None) -> tuple:
+    """
+    Build the record of a raw radiotap + 802.11 frame, with the fast path or, if it cannot decode the frame, scapy.
+
+    :param timestamp: Capture time of the frame
+    :param data: Raw bytes of the pcap record
+    :param power_threshold: If given, the Information Elements of frames at or below this power are not decoded
+    :param stats: Optional dictionary updated with the number of "fast" and "fallback" frames and "ie_decode_failures"
+    :param fast: If False the frame is dissected by scapy, as the stream and rdpcap ingests do
+    :param cache: Optional FingerprintCache used by the fast path
+    :return: Tuple (timestamp, rssi, src_mac, quadruplet)
+    """
+
+    if stats is None:
+        stats = {}
+    if fast:
+        try:
+            record = parse_frame(timestamp, data, power_threshold, stats, cache)
+            stats["fast"] = stats.get("fast", 0) + 1
+            return record
+        except ValueError:
+            pass
+
+    from scapy.layers.dot11 import RadioTap
+
+    packet = RadioTap(data)
+    packet.time = timestamp
+    stats["fallback"] = stats.get("fallback", 0) + 1
+    return scapy_record(packet, power_threshold, stats)
+
+
+def stream_frame_records(file, power_threshold=None, stats=None, start=None, end=None, fast=True, cache=None):
+    """
+    Read the records of a pcap trace with the fast path, falling back to scapy frame by frame.
+
+    :param file: Path of the .pcap trace
+    :param power_threshold: If given, the Information Elements of frames at or below this power are not decoded
+    :param stats: Optional dictionary updated with the number of "fast" and "fallback" frames and "ie_decode_failures"
+    :param start: Optional byte offset of the first record to read (see pcap_stream.record_ranges)
+    :param end: Optional byte offset where the reading stops
+    :param fast: If False every frame is dissected by scapy, as the stream and rdpcap ingests do
+    :param cache: Optional FingerprintCache used by the fast path
+    :return: Generator of tuples (timestamp, rssi, src_mac, quadruplet)
+    :raise ValueError: If a byte range is given for a trace that is not radiotap + 802.11
+    """
+
+    if stats is None:
+        stats = {}
+    stats.setdefault("fast", 0)
+    stats.setdefault("fallback", 0)
+
+    if pcap_linktype(file) != LINKTYPE_IEEE802_11_RADIOTAP:
+        if start is not None or end is not None:
+            raise ValueError("Byte ranges are only supported for radiotap + 802.11 traces")
+        for packet in stream_packets(file):
+            stats["fallback"] += 1
+            yield scapy_record(packet, power_threshold, stats)
+        return
+
+    for timestamp, data in stream_records(file, start, end):
+        yield frame_record(timestamp, data, power_threshold, stats, fast, cache)
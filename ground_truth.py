@@ -0,0 +1,60 @@
+"""
+Ground truth of the bundled capture datasets.
+
+Every dataset states the number of devices of its traces in its own way:
+- simulation logs (*.txt next to the pcap): number of devices created;
+- Ground_Truth.txt: one number per pcap of the directory, in name order;
+- Results_3.txt: "GroundTruth -> Detected" lines, one per pcap of the directory, in name order;
+- otherwise the number (or range, e.g. 6-7) in the name of the trace, as in D_test_70.pcap.
+"""
+
+import glob
+import os
+import re
+
+
+def read_ground_truths(directory) -> dict:
+    """
+    Ground truth of the traces of a directory.
+
+    :param directory: Directory of the .pcap traces
+    :return: Dictionary pcap path -> (low, high) number of devices, only for the traces with a known ground truth
+    """
+
+    pcaps = sorted(glob.glob(os.path.join(directory, "*.pcap")))
+    truths = dict()
+
+    values = None
+    if os.path.exists(os.path.join(directory, "Ground_Truth.txt")):
+        with open(os.path.join(directory, "Ground_Truth.txt"), "r") as fr:
+            values = [int(line) for line in fr if line.strip()]
+    elif os.path.exists(os.path.join(directory, "Results_3.txt")):
+        with open(os.path.join(directory, "Results_3.txt"), "r") as fr:
+            values = [int(m.group(1)) for m in (re.match(r"\s*(\d+)\s*->", line) for line in fr) if m]
+    if values is not None and len(values) == len(pcaps):
+        truths.update({pcap: (value, value) for pcap, value in zip(pcaps, values)})
+
+    for pcap in pcaps:
+        log = os.path.splitext(pcap)[0] + ".txt"
+        if os.path.exists(log):
+            with open(log, "r") as fr:
+                devices = set(re.findall(r"Device number (\d+) \(.*\) created", fr.read()))
+            truths[pcap] = (len(devices), len(devices))
+        elif pcap not in truths:
+            m = re.search(r"_test_(\d+)(?:-(\d+))?$", os.path.splitext(os.path.basename(pcap))[0])
+            if m:
+                truths[pcap] = (int(m.group(1)), int(m.group(2) or m.group(1)))
+    return truths
+
+
+def count_error(total, truth) -> int:
+    """
+    Error of a count against a ground truth, 0 inside a ground truth range.
+
+    :param total: Number of devices counted
+    :param truth: Tuple (low, high) of read_ground_truths
+    :return: Negative if the count is below the range, positive if above
+    """
+
+    low, high = truth
+    return total - low if total < low else max(total - high, 0)
@@ -0,0 +1,184 @@
+"""
+Direct decoder of the Information Elements used as device fingerprint.
+
+The quadruplet [VHT Capabilities, Extended Capabilities, HT Capabilities, Vendor Specific] was originally computed by
+rendering the packet with show2(dump=True) and parsing the text back (see process_input_string, calculate_combined_sum
+and process_oui in argo.py). The functions below compute the same values straight from the element bytes, so that the
+fingerprints stay compatible with the ones already stored in models.json.
+"""
+
+VHT_CAPABILITIES = 191
+EXTENDED_CAPABILITIES = 127
+HT_CAPABILITIES = 45
+VENDOR_SPECIFIC = 221
+
+# Value of every "\xHH" token of a bytes repr, the most frequent token by far
+_ESCAPE_VALUES = {"x%02x" % b: b for b in range(256)}
+
+# Layout of the HT Capabilities element body (802.11-2020 9.4.2.55) as dissected by scapy: groups of little-endian
+# bytes, each one split in bit fields starting from the most significant bit.
+# 0 marks a field whose value is always shown through an enum (never a number), 2 marks SM_Power_Save,
+# that is shown as a number only for the reserved value 2, 1 marks a plain numeric field.
+_HT_LAYOUT = (
+    (2, ((1, 1), (1, 1), (1, 1), (1, 1), (1, 0), (1, 1), (2, 1), (1, 1), (1, 1), (1, 1), (1, 1), (2, 2), (1, 0),
+         (1, 1))),
+    (1, ((3, 1), (3, 1), (2, 1))),
+    (16, ((27, 1), (1, 1), (2, 1), (1, 1), (1, 1), (6, 1), (10, 1), (3, 1), (77, 1))),
+    (2, ((4, 1), (1, 1), (1, 1), (2, 1), (5, 1), (2, 1), (1, 1))),
+    (4, ((3, 1), (2, 1), (2, 1), (2, 1), (2, 1), (2, 1), (2, 1), (2, 1), (2, 1), (2, 1), (1, 1), (1, 1), (1, 1),
+         (2, 1), (1, 1), (1, 1), (1, 1), (1, 1), (1, 1), (1, 1))),
+)
+HT_CAPABILITIES_LEN = 26
+
+
+def info_sum(info: bytes) -> int:
+    """
+    Compute the fingerprint value of a raw element payload.
+
+    Equivalent to process_input_string applied to the repr of the payload, quirks included: the "b'" prefix is counted,
+    spaces are dropped and of every printable run only the first and the last character are summed.
+
+    :param info: Raw bytes of the element payload
+    :return: Integer fingerprint value
+    :raise ValueError: If the text based decoder would have failed on the same payload
+    """
+
+    text = repr(info).strip("'").replace(r'\n', r'\\x0a').replace("\\", " ")
+    total = 0
+    for token in text.split():
+        value = _ESCAPE_VALUES.get(token)
+        if value is not None:
+            total += value
+        elif token[0] == "x":
+            body = token[1:]
+            if len(body) > 2:
+                total += int(body[:2], 16) + ord(body[-1])
+            elif body:
+                total += int(body, 16)
+        else:
+            total += ord(token[0])
+            if len(token) > 1:
+                total += ord(token[-1])
+    return total
+
+
+def ht_capabilities_sum(body: bytes) -> int:
+    """
+    Compute the fingerprint value of an HT Capabilities element.
+
+    Equivalent to calculate_combined_sum: the element length plus every field shown as a plain number.
+
+    :param body: Raw bytes of the element payload (without ID and length)
+    :return: Integer fingerprint value
+    :raise ValueError: If the payload has not the standard length
+    """
+
+    if len(body) != HT_CAPABILITIES_LEN:
+        raise ValueError(f"HT Capabilities element of {len(body)} bytes, expected {HT_CAPABILITIES_LEN}")
+
+    total = len(body)
+    offset = 0
+    for size, fields in _HT_LAYOUT:
+        value = int.from_bytes(body[offset:offset + size], "little")
+        shift = size * 8
+        for width, kind in fields:
+            shift -= width
+            if kind:
+                field = (value >> shift) & ((1 << width) - 1)
+                if kind == 1 or field == 2:
+                    total += field
+        offset += size
+    return total
+
+
+def vendor_sum(oui: int, info: bytes) -> int:
+    """
+    Compute the fingerprint value of a Vendor Specific element.
+
+    Equivalent to process_oui: the sum of the OUI bytes plus the value of the payload following the OUI.
+
+    :param oui: OUI as a 24-bit integer
+    :param info: Raw bytes of the payload following the OUI
+    :return: Integer fingerprint value
+    """
+
+    return (oui >> 16) + ((oui >> 8) & 0xff) + (oui & 0xff) + info_sum(info)
+
+
+def quadruplet_from_ies(ies, stats=None) -> list:
+    """
+    Compute the fingerprint quadruplet walking the raw tagged parameters of a management frame.
+
+    :param ies: Raw bytes (or memoryview) of the tagged parameters
+    :param stats: Optional dictionary whose "ie_decode_failures" counts the elements left at -1 because undecodable
+    :return: List [vht_cap, ext_cap, ht_cap, vendor], -1 marks a missing element
+    :raise ValueError: If an element cannot be decoded exactly, the caller should fall back to scapy
+    """
+
+    quadruplet = [-1, -1, -1, -1]
+    # Only counted once the whole frame is decoded, a frame handed to scapy is counted there
+    failures = 0
+    offset = 0
+    end = len(ies)
+    while offset < end:
+        if end - offset < 2:
+            raise ValueError("Truncated element header")
+        elt_id = ies[offset]
+        length = ies[offset + 1]
+        offset += 2
+        if offset + length > end:
+            raise ValueError(f"Truncated element {elt_id}")
+        if elt_id == VHT_CAPABILITIES or elt_id == EXTENDED_CAPABILITIES:
+            try:
+                quadruplet[0 if elt_id == VHT_CAPABILITIES else 1] = info_sum(bytes(ies[offset:offset + length]))
+            except ValueError:
+                failures += 1
+        elif elt_id == HT_CAPABILITIES:
+            quadruplet[2] = ht_capabilities_sum(ies[offset:offset + length])
+        elif elt_id == VENDOR_SPECIFIC:
+            if length < 3:
+                raise ValueError("Vendor Specific element without OUI")
+            oui = int.from_bytes(ies[offset:offset + 3], "big")
+            quadruplet[3] += vendor_sum(oui, bytes(ies[offset + 3:offset + length]))
+        offset += length
+    if failures and stats is not None:
+        stats["ie_decode_failures"] = stats.get("ie_decode_failures", 0) + failures
+    return quadruplet
+
+
+def extract_quadruplet(packet, stats=None) -> list:
+    """
+    Compute the fingerprint quadruplet walking the Dot11Elt chain of a scapy packet.
+
+    :param packet: Scapy packet containing a probe request
+    :param stats: Optional dictionary whose "ie_decode_failures" counts the elements left at -1 because undecodable
+    :return: List [vht_cap, ext_cap, ht_cap, vendor], -1 marks a missing element
+    """
+
+    from scapy.layers.dot11 import Dot11Elt
+
+    quadruplet = [-1, -1, -1, -1]
+    elt = packet.getlayer(Dot11Elt)
+    while isinstance(elt, Dot11Elt):
+        elt_id = elt.ID
+        if elt_id == VHT_CAPABILITIES or elt_id == EXTENDED_CAPABILITIES:
+            try:
+                quadruplet[0 if elt_id == VHT_CAPABILITIES else 1] = info_sum(elt.getfieldval("info") or b"")
+            except ValueError:
+                if stats is not None:
+                    stats["ie_decode_failures"] = stats.get("ie_decode_failures", 0) + 1
+        elif elt_id == HT_CAPABILITIES:
+            # Same fields that show2 prints as plain numbers
+            quadruplet[2] = sum(
+                int(value) for value in (str(f.i2repr(elt, elt.getfieldval(f.name))).strip() for f in elt.fields_desc)
+                if value.isdigit()
+            )
+        elif elt_id == VENDOR_SPECIFIC:
+            if "info" in elt.fieldtype:
+                info = elt.getfieldval("info") or b""
+            else:
+                # Vendor sub-classes (e.g. Microsoft WPA) dissect the payload, keep the bytes after the OUI
+                info = bytes(elt.original[5:2 + elt.len])
+            quadruplet[3] += vendor_sum(elt.oui or 0, info)
+        elt = elt.payload
+    return quadruplet
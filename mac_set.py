@@ -0,0 +1,91 @@
+"""
+Compact set of MAC addresses.
+
+A MAC address is packed into its 48-bit integer value, so membership is a hash lookup on a small int instead of a scan
+of a list of strings, and the whole set can be exported as a uint64 NumPy array.
+"""
+
+import numpy
+
+
+def pack_mac(mac: str) -> int:
+    """
+    Pack a MAC address into a 48-bit integer.
+
+    :param mac: MAC address in the "aa:bb:cc:dd:ee:ff" form
+    :return: Integer value of the address
+    """
+
+    return int(mac.replace(":", ""), 16)
+
+
+def unpack_mac(value: int) -> str:
+    """
+    Unpack a 48-bit integer into a MAC address.
+
+    :param value: Integer value of the address
+    :return: MAC address in the "aa:bb:cc:dd:ee:ff" form
+    """
+
+    return value.to_bytes(6, "big").hex(":")
+
+
+def is_locally_administered(mac: str) -> bool:
+    """
+    Check the U/L bit of a MAC address.
+
+    :param mac: MAC address in the "aa:bb:cc:dd:ee:ff" form
+    :return: True for locally administered (e.g. randomized) addresses, False for globally unique ones
+    """
+
+    return (int(mac[1], 16) & 2) != 0
+
+
+class MacSet(object):
+    """
+    Set of MAC addresses stored as packed 48-bit integers.
+    """
+
+    def __init__(self, macs=()):
+        """
+        Create a new set.
+
+        :param macs: Optional iterable of MAC addresses to insert
+        :return: None
+        """
+
+        self.values = set()
+        for mac in macs:
+            self.add(mac)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __contains__(self, mac) -> bool:
+        return pack_mac(mac) in self.values
+
+    def __iter__(self):
+        return (unpack_mac(value) for value in self.values)
+
+    def add(self, mac) -> bool:
+        """
+        Insert a MAC address.
+
+        :param mac: MAC address in the "aa:bb:cc:dd:ee:ff" form
+        :return: True if the address was not in the set yet, False otherwise
+        """
+
+        value = pack_mac(mac)
+        if value in self.values:
+            return False
+        self.values.add(value)
+        return True
+
+    def to_array(self) -> numpy.ndarray:
+        """
+        Export the set as a sorted array.
+
+        :return: uint64 NumPy array of the packed addresses
+        """
+
+        return numpy.sort(numpy.fromiter(self.values, dtype=numpy.uint64, count=len(self.values)))
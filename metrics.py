@@ -0,0 +1,177 @@
+"""
+Per-stage timers and counters of a counting run.
+
+The stages are timed with the monotonic perf_counter clock and the counters collect what the pipeline saw (frames,
+packets dropped by the power threshold, probe requests, decode failures, ...). The whole report can be written as JSON
+or in the Prometheus text exposition format, e.g. for the textfile collector of node_exporter.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _write_file(path, text) -> None:
+    # Written under a temporary name and renamed, a scraper never reads a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as fw:
+        fw.write(text)
+    os.replace(tmp_path, path)
+
+
+class Metrics(object):
+    """
+    Timers and counters of the stages of a run.
+    """
+
+    def __init__(self, labels=None):
+        """
+        Start the clock of a run.
+
+        :param labels: Optional dictionary of labels of the run (e.g. the input file), written with every metric
+        :return: None
+        """
+
+        self.labels = dict(labels or {})
+        # Seconds spent in every stage, in the order the stages were first entered
+        self.timers = dict()
+        self.counters = dict()
+        self._start = time.perf_counter()
+
+    def _add_time(self, name, seconds) -> None:
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name, exclude=()):
+        """
+        Time a block of code, the time is added to the stage if the block runs more than once.
+
+        :param name: Name of the stage
+        :param exclude: Names of the stages timed inside the block whose time must not be counted twice
+        :return: Context manager
+        """
+
+        excluded = sum(self.timers.get(other, 0.0) for other in exclude)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            inner = sum(self.timers.get(other, 0.0) for other in exclude) - excluded
+            self._add_time(name, time.perf_counter() - start - inner)
+
+    def timed(self, iterable, name):
+        """
+        Time the production of the items of an iterable, e.g. the records read from a trace.
+
+        :param iterable: Iterable to consume
+        :param name: Name of the stage
+        :return: Generator of the same items
+        """
+
+        iterator = iter(iterable)
+        seconds = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.perf_counter() - start
+                yield item
+        finally:
+            self._add_time(name, seconds)
+
+    def add(self, name, value=1) -> None:
+        """
+        Increment a counter.
+
+        :param name: Name of the counter
+        :param value: Increment
+        :return: None
+        """
+
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value) -> None:
+        """
+        Set the value of a counter.
+
+        :param name: Name of the counter
+        :param value: Value
+        :return: None
+        """
+
+        self.counters[name] = value
+
+    def elapsed(self) -> float:
+        """
+        Get the seconds since the run started.
+
+        :return: Float seconds
+        """
+
+        return time.perf_counter() - self._start
+
+    def to_dict(self) -> dict:
+        """
+        Get the report of the run.
+
+        :return: Dictionary with labels, stages (seconds), total_seconds and counters
+        """
+
+        return {
+            "labels": self.labels,
+            "stages": {name: round(seconds, 6) for name, seconds in self.timers.items()},
+            "total_seconds": round(self.elapsed(), 6),
+            "counters": dict(self.counters),
+        }
+
+    def to_prometheus(self, prefix="argo") -> str:
+        """
+        Get the report of the run in the Prometheus text exposition format.
+
+        :param prefix: Prefix of the metric names
+        :return: Text with one gauge per counter and a gauge with the seconds of every stage
+        """
+
+        labels = ",".join(f'{key}="{_escape_label(value)}"' for key, value in self.labels.items())
+        lines = [f"# HELP {prefix}_stage_seconds Wall time spent in a stage of the pipeline.",
+                 f"# TYPE {prefix}_stage_seconds gauge"]
+        for name, seconds in self.timers.items():
+            stage_labels = f'stage="{_escape_label(name)}"' + ("," + labels if labels else "")
+            lines.append(f"{prefix}_stage_seconds{{{stage_labels}}} {seconds:.6f}")
+        lines += [f"# HELP {prefix}_run_seconds Wall time of the whole run.", f"# TYPE {prefix}_run_seconds gauge",
+                  f"{prefix}_run_seconds{{{labels}}} {self.elapsed():.6f}" if labels else
+                  f"{prefix}_run_seconds {self.elapsed():.6f}"]
+        for name, value in self.counters.items():
+            lines += [f"# TYPE {prefix}_{name} gauge",
+                      f"{prefix}_{name}{{{labels}}} {value}" if labels else f"{prefix}_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path) -> None:
+        """
+        Write the report of the run as JSON.
+
+        :param path: Output path
+        :return: None
+        """
+
+        _write_file(path, json.dumps(self.to_dict(), indent=4) + "\n")
+
+    def write_prometheus(self, path, prefix="argo") -> None:
+        """
+        Write the report of the run in the Prometheus text exposition format.
+
+        :param path: Output path (e.g. a .prom file of the node_exporter textfile directory)
+        :param prefix: Prefix of the metric names
+        :return: None
+        """
+
+        _write_file(path, self.to_prometheus(prefix))
@@ -0,0 +1,187 @@
+"""
+Device-model database compiled into a memory-mapped NumPy artifact.
+
+models.json is parsed once and stored as a structured .npy array (id, cap_id vector and one column per rate
+modality) next to a small metadata file with the size, mtime and SHA-256 of the JSON it was compiled from. The next runs
+map the array instead of parsing the JSON: the artifact is reused while the mtime and size are unchanged, or when the
+JSON was touched but its hash is the same, and it is compiled again as soon as the content changes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+import numpy
+
+from model_matching import ModelMatcher
+
+RATE_MODALITIES = ("locked_rate", "awake_rate", "active_rate", "mean_rate")
+# Version of the artifact layout, bumped when the compiled columns change
+FORMAT_VERSION = 1
+
+logger = logging.getLogger()
+
+
+def load_rates(models_path, rate_modality) -> dict:
+    """
+    Read the device-model database straight from the JSON file.
+
+    :param models_path: Path of models.json
+    :param rate_modality: One of RATE_MODALITIES, mean_rate is used for the models where it is 0
+    :return: Dictionary id -> (cap_id, rate)
+    """
+
+    with open(models_path, "r") as fr:
+        hash_dict = json.load(fr)
+
+    rates_dict = dict()
+
+    for k, values in hash_dict.items():
+        if values[rate_modality] == 0:
+            rates_dict[values["id"]] = (values["cap_id"], values["mean_rate"])
+        else:
+            rates_dict[values["id"]] = (values["cap_id"], values[rate_modality])
+
+    return rates_dict
+
+
+def default_cache_path(models_path) -> str:
+    """
+    Path of the compiled artifact of a model database, next to it.
+
+    :param models_path: Path of models.json
+    :return: Path of the .npy artifact, the metadata file has the same name with .json in place of .npy
+    """
+
+    return os.path.splitext(models_path)[0] + ".cache.npy"
+
+
+def _meta_path(cache_path) -> str:
+    return os.path.splitext(cache_path)[0] + ".json"
+
+
+def _file_hash(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fr:
+        for chunk in iter(lambda: fr.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_meta(models_path) -> dict:
+    stat = os.stat(models_path)
+    return {"version": FORMAT_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def compile_models(models_path) -> numpy.ndarray:
+    """
+    Convert the JSON database into a structured array, in the order of the JSON file.
+
+    :param models_path: Path of models.json
+    :return: Structured array with the fields id, cap_id and one per rate modality
+    """
+
+    with open(models_path, "r") as fr:
+        hash_dict = json.load(fr)
+
+    # Keyed by id as the dictionary built by load_rates, a repeated id keeps the first position and the last values
+    models = dict()
+    for values in hash_dict.values():
+        models[values["id"]] = values
+    if not models:
+        raise ValueError(f"No device model in {models_path}")
+
+    width = len(next(iter(models.values()))["cap_id"])
+    dtype = numpy.dtype([("id", numpy.int64), ("cap_id", numpy.float64, (width,))] +
+                        [(modality, numpy.float64) for modality in RATE_MODALITIES])
+    table = numpy.empty(len(models), dtype=dtype)
+    for i, (model_id, values) in enumerate(models.items()):
+        if len(values["cap_id"]) != width:
+            raise ValueError(f"Model {model_id} has a cap_id of {len(values['cap_id'])} elements, expected {width}")
+        table[i] = (model_id, values["cap_id"], *(values[modality] for modality in RATE_MODALITIES))
+    return table
+
+
+def _replace(path, write, mode) -> None:
+    # Written under a temporary name and renamed, a concurrent run never reads a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, mode) as fw:
+        write(fw)
+    os.replace(tmp_path, path)
+
+
+def _write_meta(cache_path, meta) -> None:
+    _replace(_meta_path(cache_path), lambda fw: json.dump(meta, fw), "w")
+
+
+def open_models(models_path, cache_path=None) -> numpy.ndarray:
+    """
+    Get the compiled device-model database, compiling it if the artifact is missing or stale.
+
+    :param models_path: Path of models.json
+    :param cache_path: Path of the .npy artifact, next to models.json if None
+    :return: Structured array (memory-mapped when the artifact is reused) with the fields of compile_models
+    """
+
+    cache_path = cache_path or default_cache_path(models_path)
+    meta = _source_meta(models_path)
+
+    try:
+        with open(_meta_path(cache_path), "r") as fr:
+            cached = json.load(fr)
+    except (OSError, ValueError):
+        cached = None
+
+    if cached is not None and cached.get("version") == FORMAT_VERSION and os.path.exists(cache_path):
+        if cached.get("size") == meta["size"] and cached.get("mtime_ns") == meta["mtime_ns"]:
+            return numpy.load(cache_path, mmap_mode="r")
+        # Touched but maybe not modified, the hash decides
+        meta["sha256"] = _file_hash(models_path)
+        if cached.get("sha256") == meta["sha256"]:
+            try:
+                _write_meta(cache_path, meta)
+            except OSError:
+                pass
+            return numpy.load(cache_path, mmap_mode="r")
+
+    logger.info(f"Compiling the device-model database {models_path}")
+    meta.setdefault("sha256", _file_hash(models_path))
+    table = compile_models(models_path)
+    try:
+        _replace(cache_path, lambda fw: numpy.save(fw, table), "wb")
+        _write_meta(cache_path, meta)
+    except OSError as e:
+        logger.warning(f"Cannot write the compiled device-model database {cache_path}: {e}")
+        return table
+    return numpy.load(cache_path, mmap_mode="r")
+
+
+def select_rates(table, rate_modality) -> numpy.ndarray:
+    """
+    Rate of every model for a modality, mean_rate where the modality rate is 0 (as load_rates).
+
+    :param table: Structured array returned by open_models
+    :param rate_modality: One of RATE_MODALITIES
+    :return: float64 array (models,)
+    """
+
+    if rate_modality not in RATE_MODALITIES:
+        raise ValueError(f"Unknown rate modality {rate_modality}, "
+                         f"the possible choices are {', '.join(RATE_MODALITIES)}")
+    rates = numpy.asarray(table[rate_modality])
+    return numpy.where(rates == 0, table["mean_rate"], rates)
+
+
+def load_models(models_path, rate_modality, cache_path=None) -> ModelMatcher:
+    """
+    Load the device-model database through its compiled artifact.
+
+    :param models_path: Path of models.json
+    :param rate_modality: One of RATE_MODALITIES
+    :param cache_path: Path of the .npy artifact, next to models.json if None
+    :return: ModelMatcher of the database
+    """
+
+    table = open_models(models_path, cache_path)
+    return ModelMatcher.from_arrays(table["id"].tolist(), table["cap_id"], select_rates(table, rate_modality))
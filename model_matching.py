@@ -0,0 +1,118 @@
+"""
+Matching of the cluster fingerprints with the device-model database.
+
+The cap_id vectors of the models are indexed once in a KD-tree over the distinct vectors, together with the average
+rate of the models sharing each vector, so every cluster centroid is matched with a single batched query instead of a
+scan of the whole database. The selection is the same of the original scan: the closest model in database order,
+whose rate is averaged with the ones of the models with the same cap_id.
+"""
+
+import numpy
+from scipy import spatial
+
+# Relative margin on the KD-tree distance used to collect the candidates of a tie
+_TIE_MARGIN = 1e-9
+
+
+class ModelMatcher(object):
+    """
+    Nearest device model of a fingerprint.
+    """
+
+    def __init__(self, rates_dict):
+        """
+        Index a device-model database.
+
+        :param rates_dict: Dictionary id -> (cap_id, rate), as returned by model_db.load_rates
+        :return: None
+        """
+
+        ids = list(rates_dict.keys())
+        caps = [rates_dict[k][0] for k in ids]
+        rates = [rates_dict[k][1] for k in ids]
+        self._index(ids, numpy.array(caps, dtype=numpy.float64), numpy.array(rates, dtype=numpy.float64))
+
+    @classmethod
+    def from_arrays(cls, ids, caps, rates):
+        """
+        Index a device-model database given as columns, in database order.
+
+        :param ids: Sequence of model ids
+        :param caps: Matrix (models, 4) of cap_id vectors
+        :param rates: Array (models,) of rates
+        :return: ModelMatcher
+        """
+
+        matcher = cls.__new__(cls)
+        matcher._index(list(ids), numpy.asarray(caps, dtype=numpy.float64), numpy.asarray(rates, dtype=numpy.float64))
+        return matcher
+
+    def _index(self, ids, caps, rates) -> None:
+        if len(ids) == 0:
+            raise ValueError("Empty device-model database")
+        if len(caps) != len(ids) or len(rates) != len(ids):
+            raise ValueError(f"{len(ids)} models with {len(caps)} cap_id vectors and {len(rates)} rates")
+
+        self.ids = ids
+        self.caps, first, inverse = numpy.unique(caps, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        # Position in the database of the first model of every distinct cap_id, it breaks the ties
+        self.first = first
+
+        # Rates of the models sharing a cap_id, summed in database order as the original average
+        counts = numpy.bincount(inverse, minlength=len(self.caps))
+        self.rates = numpy.bincount(inverse, weights=rates, minlength=len(self.caps)) / counts
+
+        self._tree = spatial.cKDTree(self.caps)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def nearest(self, points) -> numpy.ndarray:
+        """
+        Find the closest distinct cap_id of every point.
+
+        :param points: Matrix (n, 4) of fingerprints (e.g. cluster centroids)
+        :return: int array (n,) of indices into caps and rates
+        """
+
+        points = numpy.atleast_2d(numpy.asarray(points, dtype=numpy.float64))
+        if len(points) == 0:
+            return numpy.empty(0, dtype=int)
+        distances, nearest = self._tree.query(points, k=1)
+        nearest = numpy.asarray(nearest, dtype=int)
+
+        # Models at (almost) the same distance: keep the first one in database order, as min() over the database
+        radii = distances * (1 + _TIE_MARGIN) + _TIE_MARGIN
+        candidates = self._tree.query_ball_point(points, radii)
+        for i, group in enumerate(candidates):
+            if len(group) > 1:
+                exact = [(spatial.distance.euclidean(self.caps[c], points[i]), self.first[c], c) for c in group]
+                nearest[i] = min(exact)[2]
+        return nearest
+
+    def match_rates(self, points) -> numpy.ndarray:
+        """
+        Rate of the closest device model of every point.
+
+        :param points: Matrix (n, 4) of fingerprints (e.g. cluster centroids)
+        :return: float64 array (n,) of rates, averaged over the models with the same cap_id
+        """
+
+        return self.rates[self.nearest(points)]
+
+
+def nearest_centroids(points, centroids) -> numpy.ndarray:
+    """
+    Index of the closest centroid of every point, the first one in case of ties.
+
+    :param points: Matrix (n, 4) of fingerprints
+    :param centroids: Matrix (m, 4) of cluster centroids
+    :return: int array (n,)
+    """
+
+    points = numpy.atleast_2d(numpy.asarray(points, dtype=numpy.float64))
+    centroids = numpy.atleast_2d(numpy.asarray(centroids, dtype=numpy.float64))
+    if len(points) == 0 or centroids.size == 0:
+        return numpy.empty(0, dtype=int)
+    return numpy.argmin(spatial.distance.cdist(points, centroids), axis=1)
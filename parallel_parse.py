@@ -0,0 +1,162 @@
+"""
+Parallel parsing of a single pcap trace.
+
+The trace is split into record-aligned byte ranges (pcap_stream.record_ranges) and every range is parsed by a worker
+process into a partial result: frame and packet counters, first and last timestamps, the globally unique MAC addresses
+in order of first appearance and the fingerprints of the locally administered probe requests. The partial results are
+merged in file order, so the capture is the same that pipeline.parse_records builds reading the trace sequentially
+(pkt_counter, global_counter, TIME_WINDOW, fingerprint rows and Bloom Filter insertions included).
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from capture import CaptureParser
+from feature_buffer import FeatureBuffer
+from frame_parser import scapy_record, stream_frame_records
+from mac_set import is_locally_administered
+from pcap_stream import LINKTYPE_IEEE802_11_RADIOTAP, pcap_linktype, record_ranges, stream_packets
+
+logger = logging.getLogger()
+
+
+def parse_partial(records, power_threshold) -> dict:
+    """
+    Parse a run of consecutive records without touching the Bloom Filter.
+
+    :param records: Iterable of tuples (timestamp, rssi, src_mac, quadruplet), in capture order
+    :param power_threshold: Frames at or below this power are not counted
+    :return: Dictionary with frame_counter, pkt_counter, probe_counter, first_time (first frame), last_time (last counted packet),
+        global_macs (list, in order of first appearance), features, macs, times and rssi (see FeatureBuffer)
+    """
+
+    first_time = None
+    last_time = None
+    frame_counter = 0
+    pkt_counter = 0
+    probe_counter = 0
+    features = FeatureBuffer()
+    global_macs = dict()
+
+    for timestamp, rssi, src, quadruplet in records:
+
+        frame_counter += 1
+        if first_time is None:
+            first_time = timestamp
+        if rssi <= power_threshold:
+            continue
+
+        pkt_counter += 1
+        last_time = timestamp
+        if quadruplet is not None:
+            probe_counter += 1
+            if not is_locally_administered(src):
+                global_macs.setdefault(src, None)
+                continue
+            features.append(quadruplet, src, timestamp, rssi)
+
+    return {
+        "frame_counter": frame_counter,
+        "pkt_counter": pkt_counter,
+        "probe_counter": probe_counter,
+        "first_time": first_time,
+        "last_time": last_time,
+        "global_macs": list(global_macs),
+        # Copies, the views would pickle the whole preallocated matrix
+        "features": features.get_features().copy(),
+        "macs": features.get_macs().copy(),
+        "times": features.get_times().copy(),
+        "rssi": features.get_rssi().copy(),
+    }
+
+
+def parse_range(file, start, end, power_threshold, fast=True) -> dict:
+    """
+    Parse the records of a byte range of a trace, the work of a single worker.
+
+    :param file: Path of the .pcap trace
+    :param start: Byte offset of the first record
+    :param end: Byte offset where the range ends
+    :param power_threshold: Frames at or below this power are not counted
+    :param fast: If False every frame is dissected by scapy instead of the raw fast path
+    :return: Partial result of parse_partial, with the decoding counters of stream_frame_records in stats
+    """
+
+    stats = dict()
+    partial = parse_partial(stream_frame_records(file, power_threshold, stats, start=start, end=end, fast=fast),
+                            power_threshold)
+    partial["stats"] = stats
+    return partial
+
+
+def merge_partials(partials, main_bf) -> dict:
+    """
+    Merge the partial results of consecutive ranges into a capture.
+
+    :param partials: Partial results of parse_partial, in file order
+    :param main_bf: Bloom Filter that receives the globally unique MAC addresses, in order of first appearance
+    :return: Dictionary with the same keys of pipeline.parse_records
+    """
+
+    parser = CaptureParser(None, main_bf)
+    for partial in partials:
+        parser.merge(partial)
+    return parser.capture()
+
+
+def parse_partials(file, power_threshold, workers=1, parts=None, fast=True, stats=None) -> list:
+    """
+    Parse the record ranges of a trace over a pool of worker processes.
+
+    :param file: Path of the .pcap trace
+    :param power_threshold: Frames at or below this power are not counted
+    :param workers: Number of worker processes, the ranges are parsed in this process if 1
+    :param parts: Number of byte ranges, workers if None
+    :param fast: If False every frame is dissected by scapy instead of the raw fast path
+    :param stats: Optional dictionary updated with the decoding counters of all the ranges (see stream_frame_records)
+    :return: List of the partial results of parse_partial, in file order
+    """
+
+    if workers <= 0:
+        raise ValueError(f"workers must be positive, got {workers}")
+    if stats is None:
+        stats = {}
+
+    try:
+        linktype = pcap_linktype(file)
+    except ValueError:
+        linktype = None
+    if linktype != LINKTYPE_IEEE802_11_RADIOTAP:
+        # Only classic radiotap traces can be split, the others are read by scapy in this process
+        logger.warning(f"{file} cannot be split into record ranges, parsing it sequentially")
+        records = (scapy_record(packet, power_threshold, stats) for packet in stream_packets(file))
+        return [parse_partial(records, power_threshold)]
+
+    ranges = record_ranges(file, parts or workers)
+    if workers == 1 or len(ranges) <= 1:
+        partials = [parse_range(file, start, end, power_threshold, fast) for start, end in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+            futures = [executor.submit(parse_range, file, start, end, power_threshold, fast) for start, end in ranges]
+            partials = [future.result() for future in futures]
+    for partial in partials:
+        for key, value in partial["stats"].items():
+            stats[key] = stats.get(key, 0) + value
+    return partials
+
+
+def parse_parallel(file, power_threshold, main_bf, workers=1, parts=None, fast=True, stats=None) -> dict:
+    """
+    Parse a trace over a pool of worker processes, with the same result of a sequential parse_records.
+
+    :param file: Path of the .pcap trace
+    :param power_threshold: Frames at or below this power are not counted
+    :param main_bf: Bloom Filter that receives the globally unique MAC addresses
+    :param workers: Number of worker processes, the ranges are parsed in this process if 1
+    :param parts: Number of byte ranges, workers if None
+    :param fast: If False every frame is dissected by scapy instead of the raw fast path
+    :param stats: Optional dictionary updated with the decoding counters of all the ranges (see stream_frame_records)
+    :return: Dictionary with the same keys of pipeline.parse_records
+    """
+
+    return merge_partials(parse_partials(file, power_threshold, workers, parts, fast, stats), main_bf)
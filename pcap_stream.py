@@ -0,0 +1,175 @@
+"""
+Streaming access to pcap traces.
+
+The whole capture is never materialized: packets (or raw records) are yielded one at a time
+so that the memory used by the parsing stage depends on the devices seen, not on the trace length.
+"""
+
+import os
+import struct
+from scapy.all import PcapReader
+
+
+def stream_packets(file):
+    """
+    Read the packets of a pcap trace one at a time.
+
+    :param file: Path of the .pcap trace
+    :return: Generator of scapy packets, in capture order
+    """
+
+    with PcapReader(file) as reader:
+        for packet in reader:
+            yield packet
+
+
+LINKTYPE_IEEE802_11_RADIOTAP = 127
+
+_PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", False),
+    b"\xa1\xb2\xc3\xd4": (">", False),
+    b"\x4d\x3c\xb2\xa1": ("<", True),
+    b"\xa1\xb2\x3c\x4d": (">", True),
+}
+
+
+def read_pcap_header(f):
+    """
+    Read the global header of a pcap trace.
+
+    :param f: Binary file object positioned at the beginning of the trace
+    :return: Tuple (endian, nano, linktype), endian is a struct byte-order character
+    :raise ValueError: If the file is not a classic pcap trace (e.g. pcapng)
+    """
+
+    header = f.read(24)
+    if len(header) < 24 or header[:4] not in _PCAP_MAGICS:
+        raise ValueError("Not a pcap trace")
+    endian, nano = _PCAP_MAGICS[header[:4]]
+    linktype = struct.unpack(endian + "I", header[20:24])[0] & 0x0fffffff
+    return endian, nano, linktype
+
+
+def record_time(sec: int, frac: int, nano: bool) -> float:
+    """
+    Convert a pcap record timestamp to seconds, rounded exactly as float(packet.time) of scapy.
+
+    :param sec: Seconds of the record header
+    :param frac: Microseconds (or nanoseconds) of the record header
+    :param nano: True if the trace has nanosecond resolution
+    :return: Float timestamp
+    """
+
+    return float(f"{sec}.{frac:09d}" if nano else f"{sec}.{frac:06d}")
+
+
+def pcap_linktype(file) -> int:
+    """
+    Get the link type of a pcap trace.
+
+    :param file: Path of the .pcap trace
+    :return: Integer link type (127 for radiotap + 802.11)
+    :raise ValueError: If the file is not a classic pcap trace
+    """
+
+    with open(file, "rb") as f:
+        return read_pcap_header(f)[2]
+
+
+def file_records(f, endian, nano, end=None):
+    """
+    Read the raw records of a pcap trace from a binary file object, starting at its current position.
+
+    :param f: Binary file object positioned at the beginning of a record (e.g. after read_pcap_header), it can be a
+        pipe when end is None
+    :param endian: Struct byte-order character of the trace, as given by read_pcap_header
+    :param nano: True if the trace has nanosecond resolution
+    :param end: Optional byte offset where the reading stops, the records starting at or after it are not read
+    :return: Generator of tuples (timestamp, data), it ends at the end of the file or at a truncated record, that is not
+        yielded
+    """
+
+    record_header = struct.Struct(endian + "IIII")
+    position = f.tell() if end is not None else 0
+    while end is None or position < end:
+        header = f.read(16)
+        if len(header) < 16:
+            return
+        sec, frac, caplen, _ = record_header.unpack(header)
+        data = f.read(caplen)
+        if len(data) < caplen:
+            return
+        position += 16 + caplen
+        yield record_time(sec, frac, nano), data
+
+
+def stream_records(file, start=None, end=None):
+    """
+    Read the raw records of a pcap trace one at a time, without dissecting them.
+
+    :param file: Path of the .pcap trace
+    :param start: Optional byte offset of the first record to read, it must be the beginning of a record
+    :param end: Optional byte offset where the reading stops, the records starting at or after it are not read
+    :return: Generator of tuples (timestamp, data)
+    :raise ValueError: If the file is not a classic pcap trace
+    """
+
+    with open(file, "rb") as f:
+        endian, nano, _ = read_pcap_header(f)
+        if start is not None and start > f.tell():
+            f.seek(start)
+        yield from file_records(f, endian, nano, end)
+
+
+def stream_fileobj_records(f, linktype=None):
+    """
+    Read the raw records of a pcap byte stream (e.g. the standard input or a FIFO) until it ends.
+
+    :param f: Binary file object positioned at the beginning of the trace, reads block until data is available
+    :param linktype: If given, the link type the stream must have (e.g. LINKTYPE_IEEE802_11_RADIOTAP)
+    :return: Generator of tuples (timestamp, data), a truncated last record is not yielded
+    :raise ValueError: If the stream is not a classic pcap trace or has another link type
+    """
+
+    endian, nano, found = read_pcap_header(f)
+    if linktype is not None and found != linktype:
+        raise ValueError(f"The pcap stream has link type {found}, {linktype} expected")
+    yield from file_records(f, endian, nano)
+
+
+def record_ranges(file, parts: int) -> list:
+    """
+    Split a pcap trace into byte ranges that start and end on record boundaries.
+
+    Pcap records have no sync marker, so the boundaries are found by walking the record headers (without reading the
+    frames) and cutting at the first record that starts after every multiple of size / parts.
+
+    :param file: Path of the .pcap trace
+    :param parts: Number of ranges wanted, fewer are returned if the trace has fewer records
+    :return: List of tuples (start, end) of byte offsets, in file order, covering all the records
+    :raise ValueError: If the file is not a classic pcap trace
+    """
+
+    if parts <= 0:
+        raise ValueError(f"parts must be positive, got {parts}")
+
+    size = os.path.getsize(file)
+    with open(file, "rb", buffering=1 << 20) as f:
+        endian, _, _ = read_pcap_header(f)
+        caplen_field = struct.Struct(endian + "I")
+        first = position = f.tell()
+        cuts = [first]
+        targets = [first + (size - first) * i // parts for i in range(1, parts)]
+        for target in targets:
+            while position < target:
+                header = f.read(16)
+                if len(header) < 16:
+                    break
+                position += 16 + caplen_field.unpack_from(header, 8)[0]
+                f.seek(position)
+            if position >= size:
+                break
+            if position > cuts[-1]:
+                cuts.append(position)
+    cuts.append(max(size, cuts[-1]))
+    return [(cuts[i], cuts[i + 1]) for i in range(len(cuts) - 1) if cuts[i + 1] > cuts[i]]
@@ -0,0 +1,557 @@
+"""
+Counting pipeline as an importable library.
+
+The stages of argo.py (reading, parsing, clustering and counting) are plain functions, and Pipeline keeps the heavy
+state of a counter warm between runs: the device-model database (compiled and indexed once), the Bloom Filter (reset
+instead of allocated again) and the imported parsers. A collector can create one Pipeline and call it for every trace
+or batch of frames, without paying for the start of a new process every time:
+
+    pipeline = Pipeline(counting_method="advanced")
+    result = pipeline.run("./capture.pcap")
+
+    pipeline.reset()
+    pipeline.feed(packets)
+    pipeline.cluster()
+    result = pipeline.count()
+"""
+
+import argparse
+import logging
+import os
+from dataclasses import dataclass, field
+from math import ceil
+from operator import mul
+
+import numpy
+from scapy.all import rdpcap
+from sklearn.cluster import OPTICS
+
+from bloomfilter import BloomFilter, ScalableBloomFilter
+from capture import CaptureParser
+from coreset import CoresetClustering
+from fingerprint_cache import FingerprintCache
+from frame_parser import frame_record, scapy_record, stream_frame_records
+from metrics import Metrics
+from model_db import load_models
+from parallel_parse import parse_partials
+from pcap_stream import stream_packets
+from probe_store import ProbeStore, pcap_digest, records_table, table_partial
+from weighted_optics import WeightedOPTICS
+
+# Device-model database shipped next to the scripts, independent of the working directory
+DEFAULT_MODELS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models.json")
+
+# Random MACs added to every Bloom Filter
+ANONYMIZATION_NOISE = 30
+
+logger = logging.getLogger()
+
+
+def group_by_label(labels) -> dict:
+    # Group-by of the rows on their labels: dictionary label -> array of the row indices, in row order
+    order = numpy.argsort(labels, kind="stable")
+    keys, starts = numpy.unique(labels[order], return_index=True)
+    return dict(zip(keys.tolist(), numpy.split(order, starts[1:])))
+
+
+def exact_mean(values) -> list:
+    # Average of every column, the same of the Python sum of the integers divided by their number:
+    # the sums are made on the distinct rows in Python integers, so they never overflow nor lose precision
+    rows, counts = numpy.unique(values, axis=0, return_counts=True)
+    counts = counts.tolist()
+    n = sum(counts)
+    return [sum(map(mul, column, counts)) / n for column in rows.T.tolist()]
+
+
+def bloom_filter_insertion(main_bf, cluster_mac):
+    # Insert the MAC address averages inside the Bloom Filter,
+    # cluster_mac maps every cluster to its distinct packed MAC addresses and to their number of probe requests
+    list_macs_mean = list()
+    for macs, counts in cluster_mac.values():
+        counts = counts.tolist()
+        total = sum(map(mul, macs.tolist(), counts))
+        n = sum(counts)
+        # Same value of statistics.mean on the integer addresses: an int if the division is exact, a float otherwise
+        list_macs_mean.append(total // n if total % n == 0 else total / n)
+
+    # Fill the Bloom Filter with a single batch
+    # Insert the mean value but cast as string because mmh3 hash functions wants a bytes object
+    main_bf.add_many([str(elem) for elem in list_macs_mean])
+
+
+def add_counting_arguments(parser):
+    # Options shared by every entry point that counts devices
+    parser.add_argument("--models", type=str, default=DEFAULT_MODELS,
+                        help="Path of the device-model database, the models.json next to the scripts if not given.")
+    parser.add_argument("--models_cache", type=str, default=None,
+                        help="Path of the compiled device-model database, next to the JSON database if not given.")
+    parser.add_argument("--max_ratio", type=int, default=100, help="Maximum Ratio for clustering algorithm.")
+    parser.add_argument("--power_threshold", type=int, default=-70, help="Threshold for the capturing power.")
+    parser.add_argument("--default_counter", type=int, default=1,
+                        help="Default number assigned to a cluster if the condition on the Maximum Ratio is not respected.")
+    parser.add_argument("--min_percentage", type=float, default=0.02,
+                        help="Minimum percentage of probe request that must have locally administered MAC address for doing clustering.")
+    parser.add_argument("--epsilon", type=float, default=0.001, help="Epsilon parameter for DBSCAN clustering.")
+    parser.add_argument("--min_samples", type=int, default=15, help="Min samples parameter for clustering.")
+    parser.add_argument("--distance_metric", type=str, default="euclidean",
+                        help="Metric parameter for clustering.")
+    parser.add_argument("--rate_modality", type=str, default="mean_rate",
+                        choices=["locked_rate", "awake_rate", "active_rate", "mean_rate"],
+                        help="Choose the rate to get from the database. The possibilities are: locked_rate, awake_rate, active_rate or mean_rate.")
+    parser.add_argument("--cluster_method", type=str, choices=["dbscan", "optics"], default="optics",
+                        help="Clustering method, the possible choices are dbscan and optics.")
+    parser.add_argument("--cluster_fit", type=str, choices=["full", "weighted"], default="weighted",
+                        help="How the clustering is fitted: on every probe request (full) or on the distinct fingerprints weighted by their number of copies (weighted, same labels).")
+    parser.add_argument("--cluster_budget", type=int, default=0,
+                        help="Probe requests given to the clustering at most: larger captures are clustered on a sample stratified by fingerprint and every probe request takes the label of its fingerprint (0, the default, clusters all of them).")
+    parser.add_argument("--counting_method", type=str, choices=["simple", "advanced"], default="simple",
+                        help="Counting method when a cluster is examined, the possible choices are simple and advanced.")
+    parser.add_argument("--ingest", type=str, choices=["stream", "rdpcap", "raw"], default="stream",
+                        help="How to read the trace: stream packets one at a time, load the whole capture with rdpcap or parse the raw records without scapy (falling back to scapy when needed).")
+    parser.add_argument("--fingerprint_cache_size", type=int, default=65536,
+                        help="Fingerprints kept by the LRU cache of the raw ingest (keyed by the raw Information Elements), 0 disables it.")
+    parser.add_argument("--fingerprint_cache", type=str, default=None,
+                        help="Path of a .npz file where the fingerprint cache is loaded from and saved to, for warm restarts.")
+    parser.add_argument("--bloom_filter", type=str, choices=["fixed", "scalable"], default="fixed",
+                        help="Bloom Filter of the MAC addresses: fixed (10000 bits, 7 hash functions) or scalable, sized from --bf_capacity and --bf_error_rate and growing as it fills.")
+    parser.add_argument("--bf_capacity", type=int, default=1000,
+                        help="Elements of the first slice of the scalable Bloom Filter.")
+    parser.add_argument("--bf_error_rate", type=float, default=0.01,
+                        help="False positive probability of the scalable Bloom Filter.")
+    parser.add_argument("--probe_store", type=str, default=None,
+                        help="Directory of the decoded tables of the traces, keyed by their content hash: a trace is parsed and exported the first time, then its table is memory-mapped instead.")
+
+
+def create_bloom_filter(opt=None):
+    # BF Creation, the fixed filter of the sensors unless the options ask for a scalable one
+    if opt is not None and opt["bloom_filter"] == "scalable":
+        main_bf = ScalableBloomFilter(opt["bf_capacity"], opt["bf_error_rate"])
+    else:
+        main_bf = BloomFilter(10000, 7)
+    # Anonymization Noise
+    main_bf.anonymization_noise(ANONYMIZATION_NOISE)
+    return main_bf
+
+
+def read_records(file, ingest, power_threshold, stats=None, cache=None):
+    # Records (timestamp, rssi, src, quadruplet) of the trace, in capture order,
+    # stats is an optional dictionary updated with the decoding counters (see stream_frame_records),
+    # cache an optional FingerprintCache of the raw ingest
+    if ingest == "raw":
+        return stream_frame_records(file, power_threshold, stats, cache=cache)
+    capture = rdpcap(file) if ingest == "rdpcap" else stream_packets(file)
+    return (scapy_record(packet, power_threshold, stats) for packet in capture)
+
+
+def create_fingerprint_cache(opt):
+    # Fingerprint cache of the options, loaded from its file if any, None if disabled
+    if opt["fingerprint_cache_size"] <= 0:
+        return None
+    if opt["fingerprint_cache"]:
+        return FingerprintCache.load(opt["fingerprint_cache"], opt["fingerprint_cache_size"])
+    return FingerprintCache(opt["fingerprint_cache_size"])
+
+
+def read_table(file, opt, stats=None, cache=None, metrics=None):
+    # Decoded table of the trace from the probe store of the options, parsed and exported if the store does not have it
+    metrics = metrics if metrics is not None else Metrics()
+    store = ProbeStore(opt["probe_store"])
+    with metrics.stage("load"):
+        digest = pcap_digest(file)
+        table = store.load(digest)
+    if table is None:
+        # Read with no power threshold, the table serves every threshold
+        with metrics.stage("parse", exclude=("read",)):
+            table = records_table(metrics.timed(read_records(file, opt["ingest"], None, stats, cache), "read"))
+        with metrics.stage("export"):
+            store.save(digest, table, {"file": os.path.basename(file)})
+    return table
+
+
+def parse_file(file, opt, main_bf, stats=None, cache=None):
+    # Capture of a trace as parse_records gives it, through the probe store of the options if set
+    parser = CaptureParser(opt["power_threshold"], main_bf)
+    if opt["probe_store"]:
+        parser.merge(table_partial(read_table(file, opt, stats, cache), opt["power_threshold"]))
+    else:
+        parser.update(read_records(file, opt["ingest"], opt["power_threshold"], stats, cache))
+    return parser.capture()
+
+
+def parse_records(records, power_threshold, main_bf):
+    # Split the probe requests between globally unique and locally administered MAC addresses
+    parser = CaptureParser(power_threshold, main_bf)
+    parser.update(records)
+    return parser.capture()
+
+
+def default_options() -> dict:
+    # Options of add_counting_arguments with their default values
+    parser = argparse.ArgumentParser(add_help=False)
+    add_counting_arguments(parser)
+    return vars(parser.parse_args([]))
+
+
+def create_clustering(opt):
+    # Clustering model of the fingerprints, the weighted one gives the same labels of OPTICS,
+    # with a cluster_budget the model is fitted on a sample of at most that many rows (see coreset.py)
+    optics = WeightedOPTICS if opt["cluster_fit"] == "weighted" else OPTICS
+    if opt["cluster_method"] == "optics":
+        model = optics(min_samples=opt["min_samples"], metric=opt["distance_metric"])
+    else:
+        model = optics(eps=opt["epsilon"], min_samples=opt["min_samples"], metric=opt["distance_metric"],
+                       cluster_method="dbscan")
+    if opt["cluster_budget"] > 0:
+        return CoresetClustering(model, opt["cluster_budget"])
+    return model
+
+
+def cluster_statistics(features, labels) -> dict:
+    # Statistics of the clusters of a labeling of the rows of features (a FeatureBuffer), the noise (-1) excluded:
+    # sizes (probe requests of every cluster), macs (distinct packed MAC addresses of every cluster with their
+    # number of probe requests), centroids (average fingerprint of every cluster) and noise (noise probe requests)
+    # Filter the noise group, the other probe requests are grouped by cluster with a single sort
+    clusters = group_by_label(numpy.asarray(labels, dtype=numpy.int64))
+    noise = clusters.pop(-1, ())
+    macs = features.get_macs()
+    values = features.get_features()
+    return {
+        # Number of packets inside every cluster
+        "sizes": {key: len(rows) for key, rows in clusters.items()},
+        # Single MAC addresses associated with a certain device model
+        "macs": {key: numpy.unique(macs[rows], return_counts=True) for key, rows in clusters.items()},
+        # Average of the IEs inside clusters
+        "centroids": {key: exact_mean(values[rows]) for key, rows in clusters.items()},
+        "noise": len(noise),
+    }
+
+
+def advanced_device_count(statistics, rates, time_window, max_ratio, default_counter) -> int:
+    # Devices behind the clusters of cluster_statistics with the advanced counting method,
+    # rates is the probe rate of the device model matched by every cluster, in the order of statistics["centroids"]
+    device_numbers = dict()
+    for key, L in zip(statistics["centroids"], rates):
+        N = statistics["sizes"][key]
+        # Capture time window
+        T = time_window
+        if N / T < max_ratio:
+            K = N / (L * T)
+            K = ceil(K)
+            device_numbers[key] = K if K > 0 else 1
+        else:
+            device_numbers[key] = default_counter
+
+        mac_count = len(statistics["macs"][key][0])
+        if device_numbers[key] > mac_count:
+            device_numbers[key] = mac_count
+    return sum(device_numbers.values())
+
+
+def clusterable(capture, opt) -> bool:
+    # True if count_local_devices clusters the capture: at least min_percentage of the packets have a locally
+    # administered MAC address, and there are at least min_samples of their probe requests (the minimum of OPTICS)
+    pkt_counter = capture["pkt_counter"]
+    return (pkt_counter - capture["global_counter"]) > opt["min_percentage"] * pkt_counter and \
+        len(capture["features"]) >= opt["min_samples"]
+
+
+def fit_clustering(capture, opt, metrics=None):
+    # Fit the clustering of the options on the locally administered probe requests of the capture,
+    # None if count_local_devices would not cluster it (see clusterable)
+    if not clusterable(capture, opt):
+        return None
+    metrics = metrics or Metrics()
+    features = capture["features"]
+    clustering = create_clustering(opt)
+    # OPTICS is fitted on the DataFrame, built once right before the fit, the weighted model (and the sample of
+    # a cluster_budget) on the matrix
+    with metrics.stage("features"):
+        if opt["cluster_fit"] == "weighted" or opt["cluster_budget"] > 0:
+            data = features.get_features()
+        else:
+            data = features.to_dataframe()
+    with metrics.stage("cluster"):
+        clustering.fit(data)
+    return clustering
+
+
+def count_local_devices(capture, models, main_bf, opt, clustering=None, metrics=None):
+    # Cluster the locally administered probe requests and estimate the number of devices behind them,
+    # models is the ModelMatcher of the device-model database (model_db.load_models),
+    # clustering can be a model already fitted on the rows of capture["features"],
+    # metrics is an optional Metrics that receives the time of the stages and the number of clusters
+    metrics = metrics or Metrics()
+    features = capture["features"]
+    TIME_WINDOW = capture["time_window"]
+    max_ratio = opt["max_ratio"]
+    default_counter = opt["default_counter"]
+    min_samples = opt["min_samples"]
+    counting_method = opt["counting_method"]
+
+    cluster_devices = 0
+
+    # Check that at least the 2% of packets have a locally administered MAC address, OPTICS cannot be fitted on
+    # fewer samples than min_samples
+    if not clusterable(capture, opt):
+        if len(features) < min_samples:
+            logger.warning(f"Only {len(features)} locally administered probe requests, "
+                           f"at least {min_samples} are needed for clustering")
+        return cluster_devices
+    logger.info("Model clustering")
+    # Perform the clustering
+    if clustering is None:
+        clustering = fit_clustering(capture, opt, metrics)
+    with metrics.stage("cluster"):
+        cluster_labels = numpy.asarray(clustering.labels_, dtype=numpy.int64)
+    statistics = cluster_statistics(features, cluster_labels)
+    metrics.set("clusters", len(statistics["sizes"]))
+    if isinstance(clustering, CoresetClustering):
+        metrics.set("cluster_sample_rows", clustering.sample_size_)
+    metrics.set("noise_probes", statistics["noise"])
+
+    with metrics.stage("bloom_filter"):
+        bloom_filter_insertion(main_bf, statistics["macs"])
+    cluster_values = statistics["centroids"]
+
+    logger.info("Counting devices")
+    if counting_method == "advanced":
+        # Choose the closest device with similar characteristics
+        # If multiple matches are found, take the average rate
+        with metrics.stage("model_matching"):
+            rates = models.match_rates(list(cluster_values.values()))
+        cluster_devices = advanced_device_count(statistics, rates.tolist(), TIME_WINDOW, max_ratio, default_counter)
+    elif counting_method == "simple":
+        cluster_devices = len(set(cluster_values.keys()))
+    return cluster_devices
+
+
+@dataclass
+class CountResult:
+    """
+    Outcome of a counting run.
+    """
+
+    global_devices: int
+    local_devices: int
+    total_devices: int
+    frames: int
+    packets: int
+    probe_requests: int
+    local_probes: int
+    time_window: float
+    clusters: int
+    # Seconds spent in every stage, see Metrics
+    stages: dict = field(default_factory=dict)
+
+
+class Pipeline(object):
+    """
+    Reusable counter: feed frames, cluster and count, then reset and start again with the same warm state.
+    """
+
+    def __init__(self, options=None, models=None, **kwargs):
+        """
+        Load the device-model database and create the Bloom Filter.
+
+        :param options: Optional dictionary of options, e.g. the arguments of argo.py (see add_counting_arguments)
+        :param models: Optional ModelMatcher already loaded, shared between pipelines
+        :param kwargs: Single options, e.g. counting_method="advanced", they override options
+        :return: None
+        """
+
+        self.opt = default_options()
+        self.opt.update(options or {})
+        for key in kwargs:
+            if key not in self.opt:
+                raise ValueError(f"Unknown option {key}, the possible ones are {', '.join(self.opt)}")
+        self.opt.update(kwargs)
+
+        # The first run also accounts for the loading of the database
+        self.metrics = Metrics()
+        with self.metrics.stage("models"):
+            self.models = models or load_models(self.opt["models"], self.opt["rate_modality"],
+                                                self.opt["models_cache"])
+        self.main_bf = create_bloom_filter(self.opt)
+        self.cache = create_fingerprint_cache(self.opt)
+        self._start_run()
+
+    def reset(self, labels=None) -> None:
+        """
+        Forget the frames fed so far and start a new run, the Bloom Filter gets a new anonymization noise.
+
+        :param labels: Optional labels of the metrics of the new run (e.g. the input file)
+        :return: None
+        """
+
+        self.main_bf.reset()
+        self.main_bf.anonymization_noise(ANONYMIZATION_NOISE)
+        self.metrics = Metrics(labels)
+        self._start_run()
+
+    def _start_run(self) -> None:
+        self.stats = dict()
+        # The cache lives across runs, its counters of the run are the difference from here
+        self._cache_start = (self.cache.hits, self.cache.misses) if self.cache is not None else (0, 0)
+        self._parser = CaptureParser(self.opt["power_threshold"], self.main_bf)
+        self._clustering = None
+        self._result = None
+
+    def _records(self, packets):
+        power_threshold = self.opt["power_threshold"]
+        for packet in packets:
+            if isinstance(packet, tuple):
+                # Raw (timestamp, data) pcap records or records already parsed
+                if len(packet) == 2:
+                    yield frame_record(packet[0], packet[1], power_threshold, self.stats, cache=self.cache)
+                else:
+                    yield packet
+            else:
+                yield scapy_record(packet, power_threshold, self.stats)
+
+    def feed(self, packets) -> int:
+        """
+        Parse more frames, following the ones already fed.
+
+        :param packets: Iterable of scapy packets, of raw (timestamp, data) pcap records or of parsed
+            (timestamp, rssi, src_mac, quadruplet) records
+        :return: Number of frames parsed
+        """
+
+        self._clustering = self._result = None
+        with self.metrics.stage("parse", exclude=("read",)):
+            return self._parser.update(self.metrics.timed(self._records(packets), "read"))
+
+    def feed_file(self, file, workers=1) -> int:
+        """
+        Parse the frames of a trace, following the ones already fed.
+
+        :param file: Path of the .pcap trace, read as set by the ingest option
+        :param workers: Worker processes that parse record-aligned byte ranges of the trace (see parallel_parse),
+            not used with the probe_store option
+        :return: Number of frames parsed
+        """
+
+        self._clustering = self._result = None
+        power_threshold = self.opt["power_threshold"]
+        if self.opt["probe_store"]:
+            frames = self._parser.frame_counter
+            table = read_table(file, self.opt, self.stats, self.cache, self.metrics)
+            with self.metrics.stage("parse"):
+                self._parser.merge(table_partial(table, power_threshold))
+            return self._parser.frame_counter - frames
+        if workers > 1:
+            frames = self._parser.frame_counter
+            with self.metrics.stage("parse"):
+                for partial in parse_partials(file, power_threshold, workers, fast=self.opt["ingest"] == "raw",
+                                              stats=self.stats):
+                    self._parser.merge(partial)
+            return self._parser.frame_counter - frames
+        records = read_records(file, self.opt["ingest"], power_threshold, self.stats, self.cache)
+        # The records are read (and decoded) while they are parsed, the two times are kept apart
+        with self.metrics.stage("parse", exclude=("read",)):
+            return self._parser.update(self.metrics.timed(records, "read"))
+
+    def capture(self) -> dict:
+        """
+        Get the capture of the frames fed so far.
+
+        :return: Dictionary with the keys of parse_records
+        """
+
+        return self._parser.capture()
+
+    def cluster(self):
+        """
+        Fit the clustering on the locally administered probe requests fed so far, if there are enough of them.
+
+        :return: Fitted clustering model, None if count_local_devices would not cluster the capture
+        """
+
+        if self._clustering is None:
+            self._clustering = fit_clustering(self._parser.capture(), self.opt, self.metrics)
+        return self._clustering
+
+    def count(self) -> CountResult:
+        """
+        Count the devices of the frames fed so far, clustering them first if cluster was not called.
+
+        :return: CountResult, the same until more frames are fed
+        """
+
+        if self._result is None:
+            capture = self._parser.capture()
+            local_devices = count_local_devices(capture, self.models, self.main_bf, self.opt, self.cluster(),
+                                                self.metrics)
+            metrics = self.metrics
+            global_devices = capture["global_counter"]
+            metrics.set("frames", capture["frame_counter"])
+            metrics.set("dropped_power", capture["frame_counter"] - capture["pkt_counter"])
+            metrics.set("packets", capture["pkt_counter"])
+            metrics.set("probe_requests", capture["probe_counter"])
+            metrics.set("global_macs", global_devices)
+            metrics.set("local_probes", len(capture["features"]))
+            metrics.set("local_macs", len(numpy.unique(capture["features"].get_macs())))
+            metrics.set("ie_decode_failures", self.stats.get("ie_decode_failures", 0))
+            metrics.set("fallback_frames", self.stats.get("fallback", 0))
+            if self.cache is not None:
+                metrics.set("fingerprint_cache_hits", self.cache.hits - self._cache_start[0])
+                metrics.set("fingerprint_cache_misses", self.cache.misses - self._cache_start[1])
+            metrics.set("bloom_filter_elements", self.main_bf.get_num_elem())
+            metrics.set("bloom_filter_fp_probability", self.main_bf.calculate_fp_probability())
+            metrics.set("local_devices", local_devices)
+            metrics.set("total_devices", global_devices + local_devices)
+            self._result = CountResult(
+                global_devices=global_devices,
+                local_devices=local_devices,
+                total_devices=global_devices + local_devices,
+                frames=capture["frame_counter"],
+                packets=capture["pkt_counter"],
+                probe_requests=capture["probe_counter"],
+                local_probes=len(capture["features"]),
+                time_window=capture["time_window"],
+                clusters=metrics.counters.get("clusters", 0),
+                stages=dict(metrics.timers),
+            )
+        return self._result
+
+    def save_cache(self) -> None:
+        """
+        Save the fingerprint cache to the file of the fingerprint_cache option, if both are set.
+
+        :return: None
+        """
+
+        if self.cache is not None and self.opt["fingerprint_cache"]:
+            self.cache.save(self.opt["fingerprint_cache"])
+
+    def report(self, client, sensor, timestamp=None) -> dict:
+        """
+        Send the count of the frames fed so far and the Bloom Filter to an aggregator (see aggregator.py).
+
+        :param client: aggregator.AggregatorClient
+        :param sensor: Name of the sensor
+        :param timestamp: Capture time of the report, the time of the last counted packet if None
+        :return: Reply of the aggregator
+        """
+
+        result = self.count()
+        capture = self._parser.capture()
+        if timestamp is None:
+            timestamp = capture["flat_time"] + capture["time_window"] if capture["flat_time"] is not None else 0
+        # Only the fixed filter has a binary format, the scalable one is not sent
+        bf = self.main_bf if isinstance(self.main_bf, BloomFilter) else None
+        counts = {"global": result.global_devices, "local": result.local_devices, "total": result.total_devices}
+        return client.report(sensor, timestamp, counts, bf, ANONYMIZATION_NOISE)
+
+    def run(self, file, workers=1) -> CountResult:
+        """
+        Count the devices of a trace in a new run.
+
+        :param file: Path of the .pcap trace
+        :param workers: Worker processes that parse the trace (see feed_file)
+        :return: CountResult
+        """
+
+        self.reset({"input_file": file})
+        self.feed_file(file, workers)
+        return self.count()
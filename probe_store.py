@@ -0,0 +1,234 @@
+"""
+Columnar store of the decoded frames of a trace, so that a capture is decoded once and analysed many times.
+
+The expensive output of the parse is the table of the frames: capture time and RSSI of every frame and, for the probe
+requests, the source MAC address and the fingerprint quadruplet. ProbeStore writes it once per trace into a directory
+named after the SHA-256 of the pcap content, with one uncompressed .npy file per column and a JSON header:
+- frame_time (float64) and frame_rssi (int8): every frame, for the packet counters and the time window;
+- global_mac (uint64) and global_rssi (int8): the probe requests with a globally unique address, in capture order;
+- local_features (int64, n x 4), local_mac, local_time and local_rssi: the FeatureBuffer columns of the probe
+  requests with a locally administered address.
+The fingerprints are decoded whatever the power of the frame, so the same table serves every power_threshold. The
+columns are loaded with numpy.load(..., mmap_mode="r") (any tool that reads .npy files can do the same): nothing is
+read or copied until it is used, and when no local probe request is below the threshold the fingerprint matrix given
+to the clustering is the mapped file itself.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from array import array
+
+import numpy
+
+from feature_buffer import FeatureBuffer
+from mac_set import is_locally_administered, pack_mac, unpack_mac
+
+# Version of the layout and of the decoder, bumped when either changes so that old tables are not reused
+FORMAT_VERSION = 1
+
+TABLE_COLUMNS = {
+    "frame_time": numpy.float64,
+    "frame_rssi": numpy.int8,
+    "global_mac": numpy.uint64,
+    "global_rssi": numpy.int8,
+    "local_features": numpy.int64,
+    "local_mac": numpy.uint64,
+    "local_time": numpy.float64,
+    "local_rssi": numpy.int8,
+}
+
+HEADER_FILE = "table.json"
+
+logger = logging.getLogger()
+
+
+def pcap_digest(file, chunk_size=1 << 20) -> str:
+    """
+    Hash the content of a trace, the key of its table in the store.
+
+    :param file: Path of the .pcap trace
+    :param chunk_size: Bytes read at a time
+    :return: Hexadecimal SHA-256 of the file
+    """
+
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def records_table(records) -> dict:
+    """
+    Collect the columns of the table of a trace.
+
+    :param records: Iterable of tuples (timestamp, rssi, src_mac, quadruplet) read with no power_threshold, so that
+        every probe request has its fingerprint
+    :return: Dictionary column name -> NumPy array, with the keys of TABLE_COLUMNS
+    """
+
+    frame_time = array("d")
+    frame_rssi = array("b")
+    global_mac = array("Q")
+    global_rssi = array("b")
+    local = FeatureBuffer()
+
+    for timestamp, rssi, src, quadruplet in records:
+        frame_time.append(timestamp)
+        frame_rssi.append(rssi)
+        if quadruplet is None:
+            continue
+        if not is_locally_administered(src):
+            global_mac.append(pack_mac(src))
+            global_rssi.append(rssi)
+        else:
+            local.append(quadruplet, src, timestamp, rssi)
+
+    return {
+        "frame_time": numpy.frombuffer(frame_time, dtype=numpy.float64),
+        "frame_rssi": numpy.frombuffer(frame_rssi, dtype=numpy.int8),
+        "global_mac": numpy.frombuffer(global_mac, dtype=numpy.uint64),
+        "global_rssi": numpy.frombuffer(global_rssi, dtype=numpy.int8),
+        "local_features": local.get_features(),
+        "local_mac": local.get_macs(),
+        "local_time": local.get_times(),
+        "local_rssi": local.get_rssi(),
+    }
+
+
+def table_partial(table, power_threshold) -> dict:
+    """
+    Select the frames of a table above a power, as parse_partial would have parsed them from the trace.
+
+    :param table: Dictionary returned by records_table or ProbeStore.load
+    :param power_threshold: Frames at or below this power are not counted
+    :return: Dictionary with the keys of parallel_parse.parse_partial, to be merged by CaptureParser.merge
+    """
+
+    frame_time = table["frame_time"]
+    counted = numpy.flatnonzero(table["frame_rssi"] > power_threshold)
+
+    global_mac = table["global_mac"][table["global_rssi"] > power_threshold]
+    # Addresses in order of first appearance, as they reach the Bloom Filter when the trace is parsed
+    _, first = numpy.unique(global_mac, return_index=True)
+    global_macs = [unpack_mac(value) for value in global_mac[numpy.sort(first)].tolist()]
+
+    local_rssi = table["local_rssi"]
+    kept = local_rssi > power_threshold
+    columns = [table["local_features"], table["local_mac"], table["local_time"], local_rssi]
+    if not kept.all():
+        columns = [column[kept] for column in columns]
+
+    return {
+        "frame_counter": len(frame_time),
+        "pkt_counter": len(counted),
+        "probe_counter": len(global_mac) + len(columns[0]),
+        "first_time": float(frame_time[0]) if len(frame_time) else None,
+        "last_time": float(frame_time[counted[-1]]) if len(counted) else None,
+        "global_macs": global_macs,
+        "features": columns[0],
+        "macs": columns[1],
+        "times": columns[2],
+        "rssi": columns[3],
+    }
+
+
+class ProbeStore(object):
+    """
+    Directory of the tables of the traces, one sub-directory per content hash.
+    """
+
+    def __init__(self, directory):
+        """
+        Create the store, the directory is created by the first save.
+
+        :param directory: Path of the store
+        :return: None
+        """
+
+        self.directory = directory
+
+    def path(self, digest) -> str:
+        """
+        Get the directory of the table of a trace.
+
+        :param digest: Content hash of the trace (see pcap_digest)
+        :return: Path of the table
+        """
+
+        return os.path.join(self.directory, digest)
+
+    def save(self, digest, table, info=None) -> str:
+        """
+        Write the table of a trace, if the store does not have it yet. A table that load() rejects (other version,
+        unreadable or truncated column) is replaced.
+
+        :param digest: Content hash of the trace (see pcap_digest)
+        :param table: Dictionary returned by records_table
+        :param info: Optional dictionary saved in the header (e.g. the name of the trace)
+        :return: Path of the table
+        """
+
+        path = self.path(digest)
+        if os.path.exists(path) and self.load(digest) is not None:
+            return path
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Written under a temporary name and renamed, a concurrent run never reads a partial table
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+        try:
+            for name, dtype in TABLE_COLUMNS.items():
+                numpy.save(os.path.join(tmp_path, f"{name}.npy"), numpy.asarray(table[name], dtype=dtype))
+            header = dict(info or {}, version=FORMAT_VERSION, digest=digest, frames=len(table["frame_time"]),
+                          local_probes=len(table["local_features"]), global_probes=len(table["global_mac"]))
+            with open(os.path.join(tmp_path, HEADER_FILE), "w") as fw:
+                json.dump(header, fw)
+            if os.path.exists(path):
+                # A directory is not replaced by a rename, the stale table is moved aside first
+                stale_path = f"{path}.{os.getpid()}.stale"
+                os.replace(path, stale_path)
+                shutil.rmtree(stale_path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another run renamed the same table first
+            if self.load(digest) is None:
+                raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return path
+
+    def load(self, digest, mmap=True):
+        """
+        Read the table of a trace.
+
+        :param digest: Content hash of the trace (see pcap_digest)
+        :param mmap: If True the columns are read-only memory maps of the files, if False they are read into memory
+        :return: Dictionary column name -> NumPy array, None if the store does not have the table or it is stale
+        """
+
+        path = self.path(digest)
+        header_path = os.path.join(path, HEADER_FILE)
+        if not os.path.exists(header_path):
+            return None
+        try:
+            with open(header_path) as f:
+                header = json.load(f)
+            if header.get("version") != FORMAT_VERSION:
+                logger.warning(f"Ignoring the table {path}, saved with another version")
+                return None
+            table = {name: numpy.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                     for name in TABLE_COLUMNS}
+            # Columns cut by an interrupted copy can still be valid .npy files
+            rows = {"frame_time": header.get("frames"), "local_features": header.get("local_probes"),
+                    "global_mac": header.get("global_probes")}
+            for name, expected in rows.items():
+                if len(table[name]) != expected:
+                    raise ValueError(f"{name} has {len(table[name])} rows, the header says {expected}")
+            return table
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring the table {path}: {e}")
+            return None
@@ -0,0 +1,232 @@
+"""
+Parameter sweep of the counting over a set of traces, with the error against the ground truth.
+
+Tuning a site by running argo.py once per combination reads and decodes the trace, and fits OPTICS from scratch, every
+time. Here every trace is parsed once, the OPTICS graph (ordering, reachability, core distances) is computed once per
+distance metric and min_samples, and the labels of every epsilon (dbscan) and of the xi extraction (optics) are taken
+from that graph. The statistics of every labeling (cluster sizes, MAC addresses, centroids) are computed once and the
+device models are matched once per rate modality, so the counting options (max_ratio, default_counter, simple or
+advanced counting) only cost the final arithmetic. Every row gives the same counts of argo.py run with its options.
+
+Example:
+    python sweep.py --input ./input/thesis_tests --epsilon 0.5 1 2 4 --min_samples 5 10 15 20 \\
+        --counting_method simple advanced --max_ratio 50 100 200 --output ./sweep.csv --summary ./best.jsonl
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+
+from batch import find_traces
+from ground_truth import count_error, read_ground_truths
+from pipeline import (add_counting_arguments, advanced_device_count, cluster_statistics, create_bloom_filter,
+                      create_fingerprint_cache, parse_file)
+from model_db import RATE_MODALITIES, load_models
+from weighted_optics import WeightedOPTICS
+from windowed import write_rows
+
+CONFIG_COLUMNS = ["min_percentage", "distance_metric", "min_samples", "cluster_method", "epsilon", "counting_method",
+                  "rate_modality", "max_ratio", "default_counter"]
+OUTPUT_COLUMNS = ["file"] + CONFIG_COLUMNS + ["global", "local", "total", "truth", "error"]
+SUMMARY_COLUMNS = CONFIG_COLUMNS + ["traces", "mean_abs_error", "max_abs_error", "exact"]
+
+logger = logging.getLogger()
+
+
+def counting_configs(grid) -> list:
+    """
+    Expand the counting options of the grid, the simple counting ignores the rate, max_ratio and default_counter.
+
+    :param grid: Dictionary option -> list of values
+    :return: List of dictionaries with the counting_method, rate_modality, max_ratio and default_counter keys
+    """
+
+    configs = []
+    for counting_method in grid["counting_method"]:
+        if counting_method == "simple":
+            configs.append({"counting_method": "simple", "rate_modality": None, "max_ratio": None,
+                            "default_counter": None})
+            continue
+        for rate_modality, max_ratio, default_counter in itertools.product(grid["rate_modality"], grid["max_ratio"],
+                                                                           grid["default_counter"]):
+            configs.append({"counting_method": "advanced", "rate_modality": rate_modality, "max_ratio": max_ratio,
+                            "default_counter": default_counter})
+    return configs
+
+
+def labelings(grid) -> list:
+    """
+    Expand the extraction options of the grid, the optics (xi) extraction ignores the epsilon.
+
+    :param grid: Dictionary option -> list of values
+    :return: List of tuples (cluster_method, epsilon)
+    """
+
+    extractions = []
+    for cluster_method in grid["cluster_method"]:
+        if cluster_method == "optics":
+            extractions.append(("optics", None))
+        else:
+            extractions.extend(("dbscan", epsilon) for epsilon in grid["epsilon"])
+    return extractions
+
+
+def sweep_capture(capture, grid, matchers):
+    """
+    Count the devices of a parsed capture with every combination of the grid.
+
+    :param capture: Dictionary returned by pipeline.parse_records
+    :param grid: Dictionary option -> list of values, for the CONFIG_COLUMNS options
+    :param matchers: Dictionary rate modality -> ModelMatcher (model_db.load_models)
+    :return: Generator of dictionaries with the CONFIG_COLUMNS keys and global, local and total
+    """
+
+    features = capture["features"]
+    pkt_counter = capture["pkt_counter"]
+    global_counter = capture["global_counter"]
+    time_window = capture["time_window"]
+    configs = counting_configs(grid)
+    extractions = labelings(grid)
+
+    models = dict()
+    for min_percentage, metric, min_samples in itertools.product(grid["min_percentage"], grid["distance_metric"],
+                                                                 grid["min_samples"]):
+        # Same conditions of count_local_devices, without them no device is counted whatever the other options
+        clustered = (pkt_counter - global_counter) > min_percentage * pkt_counter and len(features) >= min_samples
+        if clustered and metric not in models:
+            # The distances between the distinct fingerprints are computed once per metric
+            models[metric] = WeightedOPTICS(metric=metric).fit(features.get_features())
+
+        for cluster_method, epsilon in extractions:
+            statistics = None
+            rates = dict()
+            if clustered:
+                labels = models[metric].extract("xi" if cluster_method == "optics" else "dbscan", epsilon,
+                                                min_samples=min_samples)
+                statistics = cluster_statistics(features, labels)
+            for config in configs:
+                local = 0
+                if statistics is not None:
+                    if config["counting_method"] == "simple":
+                        local = len(statistics["centroids"])
+                    else:
+                        modality = config["rate_modality"]
+                        if modality not in rates:
+                            rates[modality] = matchers[modality].match_rates(
+                                list(statistics["centroids"].values())).tolist()
+                        local = advanced_device_count(statistics, rates[modality], time_window, config["max_ratio"],
+                                                      config["default_counter"])
+                row = dict(config, min_percentage=min_percentage, distance_metric=metric, min_samples=min_samples,
+                           cluster_method=cluster_method, epsilon=epsilon, local=local)
+                row["global"] = global_counter
+                row["total"] = global_counter + local
+                yield row
+
+
+def summarize(rows) -> list:
+    """
+    Rank the combinations of the grid by their mean absolute error over the traces with a ground truth.
+
+    :param rows: Iterable of dictionaries with the OUTPUT_COLUMNS keys
+    :return: List of dictionaries with the SUMMARY_COLUMNS keys, the best combination first
+    """
+
+    errors = dict()
+    for row in rows:
+        if row["error"] is not None:
+            errors.setdefault(tuple(row[column] for column in CONFIG_COLUMNS), []).append(abs(row["error"]))
+    summary = [dict(zip(CONFIG_COLUMNS, config), traces=len(values),
+                    mean_abs_error=round(sum(values) / len(values), 4), max_abs_error=max(values),
+                    exact=sum(1 for value in values if value == 0))
+               for config, values in errors.items()]
+    summary.sort(key=lambda row: (row["mean_abs_error"], row["max_abs_error"]))
+    return summary
+
+
+if __name__ == "__main__":
+
+    # The options of the grid replace the single-valued ones of argo.py
+    parser = argparse.ArgumentParser(conflict_handler="resolve")
+    parser.add_argument("--input", type=str, nargs="+", required=True,
+                        help="Directories (searched recursively for .pcap files), globs or paths of the traces.")
+    parser.add_argument("--format", type=str, choices=["csv", "jsonl"], default="csv",
+                        help="Format of the results grid, the possible choices are csv and jsonl.")
+    parser.add_argument("--output", type=str, default=None, help="Output file, the standard output if not given.")
+    parser.add_argument("--summary", type=str, default=None,
+                        help="JSON lines file with the combinations ranked by mean absolute error.")
+    add_counting_arguments(parser)
+    parser.add_argument("--min_percentage", type=float, nargs="+", default=[0.02],
+                        help="Minimum percentages of locally administered probe requests for clustering.")
+    parser.add_argument("--distance_metric", type=str, nargs="+", default=["euclidean"], help="Metrics for clustering.")
+    parser.add_argument("--min_samples", type=int, nargs="+", default=[15], help="Min samples for clustering.")
+    parser.add_argument("--cluster_method", type=str, nargs="+", choices=["dbscan", "optics"], default=["optics"],
+                        help="Clustering methods, dbscan is swept over --epsilon.")
+    parser.add_argument("--epsilon", type=float, nargs="+", default=[0.001], help="Epsilons for DBSCAN clustering.")
+    parser.add_argument("--counting_method", type=str, nargs="+", choices=["simple", "advanced"],
+                        default=["simple", "advanced"], help="Counting methods.")
+    parser.add_argument("--rate_modality", type=str, nargs="+", choices=RATE_MODALITIES, default=["mean_rate"],
+                        help="Rates to get from the database, for the advanced counting.")
+    parser.add_argument("--max_ratio", type=int, nargs="+", default=[100],
+                        help="Maximum Ratios, for the advanced counting.")
+    parser.add_argument("--default_counter", type=int, nargs="+", default=[1],
+                        help="Default numbers of a cluster beyond the Maximum Ratio, for the advanced counting.")
+    opt = vars(parser.parse_args())
+
+    logging.basicConfig(level=logging.INFO)
+
+    if opt["cluster_budget"] > 0:
+        parser.error("--cluster_budget is not supported by the sweep, every trace is clustered on all its rows")
+    traces = find_traces(opt["input"])
+    if not traces:
+        parser.error(f"No .pcap trace found in {' '.join(opt['input'])}")
+    grid = {column: opt[column] for column in CONFIG_COLUMNS}
+    matchers = {modality: load_models(opt["models"], modality, opt["models_cache"])
+                for modality in opt["rate_modality"]}
+    cache = create_fingerprint_cache(opt)
+    truths = dict()
+    for directory in sorted({os.path.dirname(trace) for trace in traces}):
+        truths.update(read_ground_truths(directory))
+
+    def results():
+        for trace in traces:
+            start = time.perf_counter()
+            capture = parse_file(trace, opt, create_bloom_filter(opt), cache=cache)
+            truth = truths.get(trace)
+            count = 0
+            for row in sweep_capture(capture, grid, matchers):
+                row["file"] = trace
+                row["truth"] = None if truth is None else truth[0] if truth[0] == truth[1] else list(truth)
+                row["error"] = None if truth is None else count_error(row["total"], truth)
+                count += 1
+                yield {column: row[column] for column in OUTPUT_COLUMNS}
+            logger.info(f"{trace}: {count} combinations in {round(time.perf_counter() - start, 2)} seconds")
+
+    start = time.perf_counter()
+    rows = list()
+
+    def collect():
+        for row in results():
+            rows.append(row)
+            yield row
+
+    if opt["output"]:
+        with open(opt["output"], "w", newline="") as fw:
+            write_rows(collect(), fw, opt["format"], OUTPUT_COLUMNS)
+    else:
+        write_rows(collect(), sys.stdout, opt["format"], OUTPUT_COLUMNS)
+    if cache is not None and opt["fingerprint_cache"]:
+        cache.save(opt["fingerprint_cache"])
+    logger.info(f"{len(rows)} rows of {len(traces)} traces in {round(time.perf_counter() - start, 2)} seconds")
+
+    summary = summarize(rows)
+    if opt["summary"]:
+        with open(opt["summary"], "w") as fw:
+            for row in summary:
+                fw.write(json.dumps(row) + "\n")
+    for row in summary[:5]:
+        logger.info(f"MAE {row['mean_abs_error']} over {row['traces']} traces: "
+                    + ", ".join(f"{column}={row[column]}" for column in CONFIG_COLUMNS))
@@ -0,0 +1,96 @@
+"""
+Round trip of BloomFilter.to_bytes / from_bytes with the raw, RLE and zlib encodings.
+
+Empty, full and partially filled filters, of a size multiple of 8 bits or not, must load with the same bits, size,
+number of hashes and number of elements. A filter larger than max_bits must be rejected before its payload is decoded,
+and a truncated or corrupt zlib payload must raise ValueError.
+
+Run from the repository root:
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import zlib
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bloomfilter import _HEADER, ENCODING_RAW, ENCODING_RLE, ENCODING_ZLIB, BloomFilter
+
+ENCODINGS = {"raw": ENCODING_RAW, "rle": ENCODING_RLE, "zlib": ENCODING_ZLIB}
+SIZES = [10000, 9999]
+
+
+def filled(n, items=0):
+    bf = BloomFilter(n, 7)
+    bf.add_many([f"02:00:00:00:{i // 256:02x}:{i % 256:02x}" for i in range(items)])
+    return bf
+
+
+def full(n):
+    bf = BloomFilter(n, 7)
+    bf.bit_array.setall(1)
+    bf.m = n
+    return bf
+
+
+def assert_same(loaded, bf):
+    assert loaded.get_n() == bf.get_n()
+    assert loaded.k == bf.k
+    assert loaded.get_num_elem() == bf.get_num_elem()
+    assert loaded.bit_array == bf.bit_array
+    assert loaded.m == bf.bit_array.count(1)
+
+
+@pytest.mark.parametrize("encoding", sorted(ENCODINGS))
+@pytest.mark.parametrize("n", SIZES)
+@pytest.mark.parametrize("build", [filled, lambda n: filled(n, 500), full], ids=["empty", "partial", "full"])
+def test_round_trip(build, n, encoding):
+    bf = build(n)
+    data = bf.to_bytes(ENCODINGS[encoding])
+    assert_same(BloomFilter.from_bytes(data), bf)
+
+    loaded = BloomFilter.from_bytes(data, copy=True)
+    assert_same(loaded, bf)
+    # A copy is writable even when data is not
+    loaded.add("02:11:22:33:44:55")
+
+
+@pytest.mark.parametrize("encoding", sorted(ENCODINGS))
+def test_max_bits(encoding):
+    data = filled(10000, 100).to_bytes(ENCODINGS[encoding])
+    assert_same(BloomFilter.from_bytes(data, max_bits=10000), filled(10000, 100))
+    with pytest.raises(ValueError):
+        BloomFilter.from_bytes(data, max_bits=9999)
+    # The size is checked before the payload, a missing payload gives the same error
+    with pytest.raises(ValueError, match="at most"):
+        BloomFilter.from_bytes(data[:_HEADER.size], max_bits=9999)
+
+
+def test_zlib_truncated():
+    data = filled(10000, 500).to_bytes(ENCODING_ZLIB)
+    for cut in (1, 8, len(data) - _HEADER.size):
+        with pytest.raises(ValueError):
+            BloomFilter.from_bytes(data[:-cut])
+
+
+def test_zlib_corrupt():
+    data = bytearray(filled(10000, 500).to_bytes(ENCODING_ZLIB))
+    data[_HEADER.size] ^= 0xff
+    with pytest.raises(ValueError):
+        BloomFilter.from_bytes(bytes(data))
+
+    header = data[:_HEADER.size]
+    with pytest.raises(ValueError):
+        BloomFilter.from_bytes(bytes(header) + b"not zlib")
+
+
+@pytest.mark.parametrize("size", [10000 // 8 - 1, 10000 // 8 + 1, 1 << 20])
+def test_zlib_wrong_size(size):
+    # A valid stream that does not inflate to the size of the filter, a longer one is not inflated in memory
+    header = filled(10000).to_bytes(ENCODING_RAW)[:_HEADER.size]
+    with pytest.raises(ValueError):
+        BloomFilter.from_bytes(header + zlib.compress(bytes(size)))
@@ -0,0 +1,102 @@
+"""
+Parity of the fingerprint decoders of ie_decoder.py with the show2 text round-trip (argo.show2_quadruplet).
+
+The locally administered probe requests of the bundled captures must get the same quadruplet from show2_quadruplet, the
+Dot11Elt walk (extract_quadruplet) and the raw tagged parameters (quadruplet_from_ies). The elements the raw decoder
+does not decode by hand (HT Capabilities of a non-standard length, Vendor Specific without a whole OUI, a truncated
+element chain) must raise ValueError, and frame_record must give the show2 quadruplet through the scapy fallback.
+
+Run from the repository root:
+    python -m pytest -q tests
+"""
+
+import glob
+import itertools
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scapy.all import raw
+from scapy.layers.dot11 import Dot11, Dot11Elt, Dot11ProbeReq, RadioTap
+
+from argo import show2_quadruplet
+from frame_parser import frame_record
+from ie_decoder import HT_CAPABILITIES_LEN, extract_quadruplet, quadruplet_from_ies
+from pcap_stream import stream_packets
+
+TRACES = sorted(glob.glob(os.path.join(ROOT, "input", "**", "*.pcap"), recursive=True))
+# Probe requests checked per trace, show2 takes about a millisecond per packet
+PROBES_PER_TRACE = 300
+
+
+def local_probes(file):
+    for packet in stream_packets(file):
+        if packet.haslayer(Dot11ProbeReq) and int(packet.addr2[1], 16) & 2:
+            yield packet
+
+
+def probe_request(*elements, tail=b""):
+    # Raw radiotap + 802.11 probe request with the given elements, tail is appended to the tagged parameters
+    packet = RadioTap(present="dBm_AntSignal", dBm_AntSignal=-40) / \
+        Dot11(type=0, subtype=4, addr1="ff:ff:ff:ff:ff:ff", addr2="02:11:22:33:44:55", addr3="ff:ff:ff:ff:ff:ff") / \
+        Dot11ProbeReq()
+    for element in elements:
+        packet = packet / element
+    return raw(packet) + tail
+
+
+@pytest.mark.parametrize("file", TRACES, ids=os.path.basename)
+def test_bundled_traces(file):
+    packets = list(itertools.islice(local_probes(file), PROBES_PER_TRACE))
+    if not packets:
+        pytest.skip("No locally administered probe request")
+    for i, packet in enumerate(packets):
+        expected = show2_quadruplet(packet)
+        assert extract_quadruplet(packet) == expected, f"probe {i}"
+        assert quadruplet_from_ies(raw(packet[Dot11ProbeReq].payload)) == expected, f"probe {i}"
+
+
+EDGE_CASES = {
+    "ht_short": probe_request(Dot11Elt(ID=0, info=b"ssid"),
+                              Dot11Elt(ID=45, info=bytes(range(HT_CAPABILITIES_LEN - 1)))),
+    "ht_long": probe_request(Dot11Elt(ID=45, info=bytes(range(HT_CAPABILITIES_LEN + 1)))),
+    "vendor_2_bytes": probe_request(Dot11Elt(ID=221, info=b"\x00\x50")),
+    "vendor_empty": probe_request(Dot11Elt(ID=221, info=b"")),
+    "truncated_element": probe_request(Dot11Elt(ID=127, info=b"\x04\x00"), tail=b"\xdd\x09\x00\x50"),
+    "truncated_header": probe_request(Dot11Elt(ID=127, info=b"\x04\x00"), tail=b"\xdd"),
+}
+
+
+@pytest.mark.parametrize("name", sorted(EDGE_CASES))
+def test_edge_cases_fall_back_to_scapy(name):
+    data = EDGE_CASES[name]
+    packet = RadioTap(data)
+    expected = show2_quadruplet(packet)
+    with pytest.raises(ValueError):
+        quadruplet_from_ies(raw(packet[Dot11ProbeReq].payload))
+    assert extract_quadruplet(packet) == expected
+
+    stats = {}
+    record = frame_record(0.0, data, stats=stats)
+    assert record[3] == expected
+    assert stats.get("fallback") == 1 and not stats.get("fast")
+
+
+@pytest.mark.parametrize("elements", [
+    [Dot11Elt(ID=45, info=bytes(range(HT_CAPABILITIES_LEN)))],
+    [Dot11Elt(ID=221, info=b"\x00\x50\xf2\x08\x00\x10")],
+    [Dot11Elt(ID=191, info=b"\x32\x00\x80\x33"), Dot11Elt(ID=127, info=b"\x04\x00\x0a\x02\x01\x40\x40\x80")],
+], ids=["ht", "vendor", "vht_ext"])
+def test_standard_elements_use_the_fast_path(elements):
+    data = probe_request(*elements)
+    packet = RadioTap(data)
+    expected = show2_quadruplet(packet)
+    assert quadruplet_from_ies(raw(packet[Dot11ProbeReq].payload)) == expected
+
+    stats = {}
+    assert frame_record(0.0, data, stats=stats)[3] == expected
+    assert stats.get("fast") == 1
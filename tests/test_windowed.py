@@ -0,0 +1,60 @@
+"""
+Parity of the sliding-window counter of windowed.py with offline counts of the slices of a trace.
+
+Every window of WindowedCounter must give the packets, global and local devices of parse_records and
+count_local_devices (OPTICS fitted on every row) run on the frames with window_start <= time < window_end, with the
+weighted fit that follows the window and with a fit of every window on its own.
+
+Run from the repository root:
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import warnings
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from model_db import load_models
+from pipeline import count_local_devices, create_bloom_filter, default_options, parse_records, read_records
+from windowed import WindowedCounter
+
+TRACE = os.path.join(ROOT, "input", "test_5_different_time", "3_minutes.pcap")
+
+
+@pytest.fixture(scope="module")
+def records():
+    if not os.path.exists(TRACE):
+        pytest.skip(f"{TRACE} not found")
+    return list(read_records(TRACE, "raw", default_options()["power_threshold"]))
+
+
+@pytest.fixture(scope="module")
+def models():
+    opt = default_options()
+    return load_models(opt["models"], opt["rate_modality"], opt["models_cache"])
+
+
+def offline_count(records, start, end, opt, models):
+    main_bf = create_bloom_filter(opt)
+    capture = parse_records([r for r in records if start <= r[0] < end], opt["power_threshold"], main_bf)
+    local = count_local_devices(capture, models, main_bf, dict(opt, cluster_fit="full", cluster_budget=0))
+    return capture["pkt_counter"], capture["global_counter"], local
+
+
+@pytest.mark.parametrize("cluster_fit", ["weighted", "full"])
+@pytest.mark.parametrize("window, step", [(60, 30), (120, 60)])
+def test_windows_match_offline_slices(records, models, cluster_fit, window, step):
+    # OPTICS warns about divisions by zero in the reachability ratios of duplicated points
+    warnings.simplefilter("ignore", RuntimeWarning)
+    opt = dict(default_options(), cluster_fit=cluster_fit)
+    counter = WindowedCounter(window, step, opt, models)
+    rows = list(counter.feed(records)) + list(counter.flush())
+    assert rows
+    for row in rows:
+        expected = offline_count(records, row["window_start"], row["window_end"], opt, models)
+        assert (row["packets"], row["global"], row["local"]) == expected, row
+        assert row["total"] == row["global"] + row["local"]
@@ -0,0 +1,314 @@
+"""
+OPTICS over deduplicated fingerprints.
+
+Most probe requests carry exactly the same quadruplet of a few other ones, so the fingerprint matrix is made of a small
+number of distinct points repeated many times. The ordering, reachability and predecessor computed by
+sklearn.cluster.OPTICS depend only on the distinct points, their multiplicity and the row index of every copy (ties are
+broken by the smallest index), so they are rebuilt here from the distinct points alone:
+
+- the core distance of a point counts its copies among the min_samples nearest neighbours;
+- all the unprocessed copies of a point always share reachability and predecessor, and once one copy is processed the
+  next ones are picked in a run, until a row of another point with the same reachability comes first.
+
+The main loop costs O(runs * U) for U distinct points instead of the O(n^2) of the full fit, and the clusters are
+extracted from the rebuilt graph with the same functions used by OPTICS (xi or dbscan), so the labels are identical.
+
+Rows can also be added and expired incrementally (partial_fit / forget), as needed by the sliding-window counting: the
+distances between distinct points are computed only once, when a new fingerprint appears.
+"""
+
+from collections import deque
+
+import numpy
+from sklearn.cluster import cluster_optics_dbscan, cluster_optics_xi
+from sklearn.metrics import pairwise_distances
+from sklearn.neighbors import NearestNeighbors
+
+# Decimals kept by OPTICS when rounding core and reachability distances
+_PRECISION = numpy.finfo(numpy.float64).precision
+
+
+def _core_distances(points, weights, min_samples, metric) -> numpy.ndarray:
+    # Same k-NN query of OPTICS on the expanded rows (same neighbour algorithm), asked only once per distinct point
+    nbrs = NearestNeighbors(n_neighbors=min_samples, metric=metric)
+    nbrs.fit(numpy.repeat(points, weights, axis=0))
+    core = nbrs.kneighbors(points, min_samples)[0][:, -1]
+    numpy.around(core, decimals=_PRECISION, out=core)
+    return core
+
+
+def weighted_optics_graph(points, weights, rows, distances, min_samples, metric="euclidean") -> tuple:
+    """
+    Compute the OPTICS graph of the rows from their distinct points.
+
+    :param points: Distinct points, float64 matrix (U, features)
+    :param weights: Number of rows of every point, int array (U,)
+    :param rows: Sorted row indices of every point, sequence of U int arrays covering 0 ... n - 1
+    :param distances: Matrix (U, U), distances[i, j] as computed by OPTICS when point i is processed
+    :param min_samples: Number of rows in a neighbourhood for a point to be a core point
+    :param metric: Distance metric
+    :return: Tuple (ordering, core_distances, reachability, predecessor) over the n rows, as in OPTICS
+    """
+
+    n = int(weights.sum())
+    count = len(points)
+    core = _core_distances(points, weights, min_samples, metric)
+
+    ordering = numpy.empty(n, dtype=int)
+    reachability = numpy.empty(n)
+    predecessor = numpy.empty(n, dtype=int)
+    core_distances = numpy.empty(n)
+    for g in range(count):
+        core_distances[rows[g]] = core[g]
+
+    # State shared by the unprocessed copies of every point
+    reach = numpy.full(count, numpy.inf)
+    pred = numpy.full(count, -1)
+    position = numpy.zeros(count, dtype=int)
+    next_row = numpy.array([group[0] for group in rows], dtype=int)
+    active = numpy.ones(count, dtype=bool)
+
+    k = 0
+
+    def take(g, end):
+        # Process the copies of g up to position end (excluded)
+        nonlocal k
+        taken = rows[g][position[g]:end]
+        ordering[k:k + len(taken)] = taken
+        reachability[taken] = reach[g]
+        predecessor[taken] = pred[g]
+        k += len(taken)
+        position[g] = end
+        if end == len(rows[g]):
+            active[g] = False
+            next_row[g] = n
+        else:
+            next_row[g] = rows[g][end]
+
+    while k < n:
+        # Smallest reachability, ties broken by the smallest row index
+        candidates = numpy.flatnonzero(active)
+        values = reach[candidates]
+        tied = candidates[values == values.min()]
+        g = tied[numpy.argmin(next_row[tied])]
+        row = next_row[g]
+        take(g, position[g] + 1)
+
+        if core[g] != numpy.inf:
+            rdists = numpy.maximum(distances[g], core[g])
+            numpy.around(rdists, decimals=_PRECISION, out=rdists)
+            improved = active & (rdists < reach)
+            reach[improved] = rdists[improved]
+            pred[improved] = row
+
+        if active[g]:
+            # The next copies do not change any reachability, they come next until a tied row of another point
+            others = active.copy()
+            others[g] = False
+            value = reach[g]
+            if not (reach[others] < value).any():
+                tied = others & (reach == value)
+                limit = next_row[tied].min() if tied.any() else n
+                end = int(numpy.searchsorted(rows[g], limit))
+                if end > position[g]:
+                    take(g, end)
+
+    return ordering, core_distances, reachability, predecessor
+
+
+class WeightedOPTICS(object):
+    """
+    Drop-in replacement of sklearn.cluster.OPTICS (labels_ only) that clusters the distinct fingerprints.
+    """
+
+    def __init__(self, min_samples=5, metric="euclidean", cluster_method="xi", eps=None, xi=0.05):
+        """
+        Create an empty model.
+
+        :param min_samples: Same of OPTICS
+        :param metric: Same of OPTICS
+        :param cluster_method: Same of OPTICS, "xi" or "dbscan"
+        :param eps: Same of OPTICS, used by the dbscan extraction
+        :param xi: Same of OPTICS, used by the xi extraction
+        :return: None
+        """
+
+        if cluster_method not in ("xi", "dbscan"):
+            raise ValueError(f"Unknown cluster method {cluster_method}, the possible choices are xi and dbscan")
+
+        self.min_samples = min_samples
+        self.metric = metric
+        self.cluster_method = cluster_method
+        self.eps = eps
+        self.xi = xi
+        self._reset()
+
+    def _reset(self) -> None:
+        self._groups = dict()
+        self._points = list()
+        self._rows = list()
+        self._distances = numpy.empty((0, 0))
+        # Point of every row, oldest first, and sequence number of the oldest row
+        self._row_points = deque()
+        self._first_row = 0
+        self._labels = None
+        self._graphs = dict()
+
+    def __len__(self) -> int:
+        return len(self._row_points)
+
+    @property
+    def n_distinct(self) -> int:
+        return sum(1 for group in self._rows if group)
+
+    def fit(self, X):
+        """
+        Cluster a fingerprint matrix.
+
+        :param X: Matrix (n, features), a NumPy array or a DataFrame
+        :return: self
+        """
+
+        self._reset()
+        return self.partial_fit(X)
+
+    def partial_fit(self, X):
+        """
+        Append rows after the ones already fitted, labels_ is recomputed on the next access.
+
+        :param X: Matrix (n, features), a NumPy array or a DataFrame
+        :return: self
+        """
+
+        X = numpy.asarray(X, dtype=numpy.float64)
+        if X.ndim != 2:
+            raise ValueError(f"Expected a 2-D fingerprint matrix, got {X.ndim} dimensions")
+        if len(X) == 0:
+            return self
+
+        unique, inverse = numpy.unique(X, axis=0, return_inverse=True)
+        point_ids = numpy.array([self._point_id(point) for point in unique], dtype=int)[inverse.ravel()]
+
+        first = self._first_row + len(self._row_points)
+        order = numpy.argsort(point_ids, kind="stable")
+        ids, starts = numpy.unique(point_ids[order], return_index=True)
+        for g, group_rows in zip(ids, numpy.split(order + first, starts[1:])):
+            self._rows[g].extend(group_rows.tolist())
+        self._row_points.extend(point_ids.tolist())
+        self._labels = None
+        self._graphs = dict()
+        return self
+
+    def forget(self, count) -> None:
+        """
+        Drop the oldest rows, as the ones leaving a sliding window.
+
+        :param count: Number of rows to drop
+        :return: None
+        """
+
+        if count > len(self._row_points):
+            raise ValueError(f"Cannot forget {count} rows, only {len(self._row_points)} are stored")
+        for _ in range(count):
+            self._rows[self._row_points.popleft()].popleft()
+        self._first_row += count
+        if count:
+            self._labels = None
+            self._graphs = dict()
+        # Distinct points without rows are kept, unless they are the majority
+        if len(self._points) > 64 and 2 * self.n_distinct < len(self._points):
+            self._compact()
+
+    def _point_id(self, point) -> int:
+        key = point.tobytes()
+        g = self._groups.get(key)
+        if g is None:
+            g = self._groups[key] = len(self._points)
+            self._points.append(point)
+            self._rows.append(deque())
+            points = numpy.vstack(self._points)
+            # Both directions, as OPTICS computes them from the processed point
+            distances = numpy.empty((g + 1, g + 1))
+            distances[:g, :g] = self._distances
+            distances[g, :] = pairwise_distances(point[None, :], points, metric=self.metric)[0]
+            if g:
+                distances[:g, g] = pairwise_distances(points[:-1], point[None, :], metric=self.metric)[:, 0]
+            self._distances = distances
+        return g
+
+    def _compact(self) -> None:
+        keep = [g for g, group in enumerate(self._rows) if group]
+        remap = {old: new for new, old in enumerate(keep)}
+        self._points = [self._points[g] for g in keep]
+        self._rows = [self._rows[g] for g in keep]
+        self._distances = self._distances[numpy.ix_(keep, keep)]
+        self._groups = {point.tobytes(): g for g, point in enumerate(self._points)}
+        self._row_points = deque(remap[g] for g in self._row_points)
+
+    def _min_samples(self, n, min_samples=None) -> int:
+        if min_samples is None:
+            min_samples = self.min_samples
+        if min_samples > n:
+            raise ValueError(f"min_samples must be no greater than the number of samples ({n}). Got {min_samples}")
+        if min_samples <= 1:
+            min_samples = max(2, int(min_samples * n))
+        return min_samples
+
+    @property
+    def labels_(self) -> numpy.ndarray:
+        if self._labels is None:
+            self._labels = self.extract()
+        return self._labels
+
+    def graph(self, min_samples=None) -> tuple:
+        """
+        Get the OPTICS graph of the rows, computed once per value of min_samples and reused by every extraction.
+
+        :param min_samples: Same of OPTICS, the one of the model if None
+        :return: Tuple (ordering, core_distances, reachability, predecessor) over the rows, as in OPTICS
+        """
+
+        n = len(self._row_points)
+        min_samples = self._min_samples(n, min_samples)
+        graph = self._graphs.get(min_samples)
+        if graph is None:
+            live = [g for g, group in enumerate(self._rows) if group]
+            points = numpy.vstack([self._points[g] for g in live])
+            weights = numpy.array([len(self._rows[g]) for g in live], dtype=int)
+            rows = [numpy.fromiter(self._rows[g], dtype=int, count=len(self._rows[g])) - self._first_row for g in live]
+            distances = self._distances[numpy.ix_(live, live)]
+            graph = self._graphs[min_samples] = weighted_optics_graph(points, weights, rows, distances, min_samples,
+                                                                      self.metric)
+        return graph
+
+    def extract(self, cluster_method=None, eps=None, xi=None, min_samples=None) -> numpy.ndarray:
+        """
+        Get the labels of a cluster extraction, without fitting the rows again.
+
+        With the dbscan extraction, the labels of every eps come from the same graph: a sweep over eps (and over the
+        extraction methods) costs one OPTICS graph per value of min_samples.
+
+        :param cluster_method: "xi" or "dbscan", the one of the model if None
+        :param eps: Same of OPTICS for the dbscan extraction, the one of the model if None
+        :param xi: Same of OPTICS for the xi extraction, the one of the model if None
+        :param min_samples: Same of OPTICS, the one of the model if None
+        :return: Array of the labels of the rows, -1 for noise
+        """
+
+        n = len(self._row_points)
+        if n == 0:
+            return numpy.empty(0, dtype=int)
+        cluster_method = cluster_method or self.cluster_method
+        if cluster_method not in ("xi", "dbscan"):
+            raise ValueError(f"Unknown cluster method {cluster_method}, the possible choices are xi and dbscan")
+        min_samples = self._min_samples(n, min_samples)
+
+        ordering, core_distances, reachability, predecessor = self.graph(min_samples)
+        if cluster_method == "xi":
+            labels, _ = cluster_optics_xi(reachability=reachability, predecessor=predecessor, ordering=ordering,
+                                          min_samples=min_samples, xi=self.xi if xi is None else xi)
+        else:
+            eps = self.eps if eps is None else eps
+            labels = cluster_optics_dbscan(reachability=reachability, core_distances=core_distances,
+                                           ordering=ordering, eps=numpy.inf if eps is None else eps)
+        return labels
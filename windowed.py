@@ -0,0 +1,247 @@
+"""
+Sliding-window counting for continuous captures.
+
+Instead of a single count for the whole trace, a count is produced every step seconds over the last window seconds.
+The frames of the active window are kept in time-ordered queues: when the window slides, the expired frames are popped
+from the front and the packet counter and the global MAC addresses are updated incrementally, so only the locally
+administered probe requests of the active window are clustered again. With the weighted fit the model follows the
+window too: only the new distinct fingerprints are added and the expired rows are forgotten. Every window gives the same
+counts of an offline run of argo.py on the frames with window_start <= time < window_end.
+
+Example:
+    python windowed.py --input_file ./input/test_5_different_time/20_minutes.pcap --window 60 --step 30
+"""
+
+import argparse
+import csv
+import json
+import logging
+import sys
+from collections import deque
+
+import numpy
+
+from pipeline import (add_counting_arguments, count_local_devices, create_bloom_filter, create_clustering,
+                      create_fingerprint_cache, read_records)
+from feature_buffer import FeatureBuffer
+from mac_set import MacSet, is_locally_administered
+from model_db import load_models
+
+OUTPUT_COLUMNS = ["window_start", "window_end", "packets", "global", "local", "total"]
+
+
+class WindowedCounter(object):
+    """
+    Device counter over a sliding time window.
+    """
+
+    def __init__(self, window, step, opt, models):
+        """
+        Create an empty counter.
+
+        :param window: Length of the window in seconds
+        :param step: Seconds between two consecutive windows
+        :param opt: Counting options, the same of argo.py (power_threshold, min_samples, cluster_method, ...)
+        :param models: Device-model database, as returned by model_db.load_models
+        :return: None
+        """
+
+        if window <= 0 or step <= 0:
+            raise ValueError(f"Window ({window}) and step ({step}) must be positive")
+
+        self.window = window
+        self.step = step
+        self.opt = opt
+        self.models = models
+        self.power_threshold = opt["power_threshold"]
+
+        # Start of the active window, set by the first frame
+        self.start = None
+        self.late_frames = 0
+
+        # Timestamps of every frame (first frame of the window) and of the frames above the power threshold
+        self._frames = deque()
+        self._kept = deque()
+        # Globally unique probe requests (timestamp, MAC) and occurrences of every MAC inside the window
+        self._global = deque()
+        self._global_counts = dict()
+        # Locally administered probe requests of the window, in arrival order, given as they are to the counting
+        self._local = FeatureBuffer()
+        # With the weighted fit the clustering follows the window, new fingerprints are added when the window is counted
+        # (with a cluster_budget every window is clustered on its own sample instead)
+        self._clustering = create_clustering(opt) if opt["cluster_fit"] == "weighted" and not opt["cluster_budget"] \
+            else None
+        self._pending = list()
+
+    def feed(self, records):
+        """
+        Consume records and yield the windows that they close.
+
+        :param records: Iterable of tuples (timestamp, rssi, src_mac, quadruplet) in capture order
+        :return: Generator of dictionaries with the OUTPUT_COLUMNS keys
+        """
+
+        for timestamp, rssi, src, quadruplet in records:
+            if self.start is None:
+                self.start = timestamp
+            elif timestamp < self.start:
+                # Older than the active window, it cannot be counted anymore
+                self.late_frames += 1
+                continue
+
+            while timestamp >= self.start + self.window:
+                yield self._close_window()
+
+            self._frames.append(timestamp)
+            if rssi <= self.power_threshold:
+                continue
+            self._kept.append(timestamp)
+            if quadruplet is not None:
+                if not is_locally_administered(src):
+                    self._global.append((timestamp, src))
+                    self._global_counts[src] = self._global_counts.get(src, 0) + 1
+                else:
+                    self._local.append(quadruplet, src, timestamp, rssi)
+                    if self._clustering is not None:
+                        self._pending.append(quadruplet)
+
+    def advance(self, timestamp):
+        """
+        Yield the windows that end at or before a time, even if no frame after them was received yet.
+
+        :param timestamp: Current capture time, the frames fed later must not be older than the windows it closes
+        :return: Generator of dictionaries with the OUTPUT_COLUMNS keys
+        """
+
+        while self.start is not None and timestamp >= self.start + self.window:
+            yield self._close_window()
+
+    def flush(self):
+        """
+        Yield the windows still containing frames at the end of the capture, the last ones are partial.
+
+        :return: Generator of dictionaries with the OUTPUT_COLUMNS keys
+        """
+
+        while self._frames:
+            yield self._close_window()
+
+    def _close_window(self) -> dict:
+        row = self.count()
+        self.start += self.step
+        self._expire()
+        return row
+
+    def _expire(self) -> None:
+        start = self.start
+        frames = self._frames
+        while frames and frames[0] < start:
+            frames.popleft()
+        kept = self._kept
+        while kept and kept[0] < start:
+            kept.popleft()
+        # The rows before the first one still in the window expire, as if they were popped one at a time
+        expired = self._local.get_times() < start
+        expired = len(expired) if expired.all() else int(expired.argmin())
+        self._local.drop(expired)
+        if self._clustering is not None:
+            self._clustering.forget(expired)
+        global_frames = self._global
+        counts = self._global_counts
+        while global_frames and global_frames[0][0] < start:
+            _, mac = global_frames.popleft()
+            counts[mac] -= 1
+            if counts[mac] == 0:
+                del counts[mac]
+
+    def count(self) -> dict:
+        """
+        Count the devices of the active window.
+
+        :return: Dictionary with the OUTPUT_COLUMNS keys
+        """
+
+        global_macs = MacSet(self._global_counts)
+        if self._pending:
+            self._clustering.partial_fit(numpy.array(self._pending, dtype=numpy.int64))
+            self._pending = list()
+
+        # Same state of argo.parse_records on the frames of the window
+        capture = {
+            "flat_time": self._frames[0] if self._frames else None,
+            "time_window": self._kept[-1] - self._frames[0] if self._kept else 0,
+            "frame_counter": len(self._frames),
+            "pkt_counter": len(self._kept),
+            "global_counter": len(global_macs),
+            "global_macs": global_macs,
+            "global_values": dict(),
+            "features": self._local,
+        }
+        main_bf = create_bloom_filter(self.opt)
+        main_bf.add_many(list(self._global_counts))
+
+        local_devices = count_local_devices(capture, self.models, main_bf, self.opt, self._clustering)
+        return {
+            "window_start": self.start,
+            "window_end": self.start + self.window,
+            "packets": capture["pkt_counter"],
+            "global": capture["global_counter"],
+            "local": local_devices,
+            "total": capture["global_counter"] + local_devices,
+        }
+
+
+def write_rows(rows, out, output_format, columns=OUTPUT_COLUMNS) -> None:
+    """
+    Write the time series of the counts.
+
+    :param rows: Iterable of dictionaries with the columns keys
+    :param out: Text stream
+    :param output_format: "csv" or "jsonl"
+    :param columns: Names of the CSV columns, in order
+    :return: None
+    """
+
+    if output_format == "csv":
+        writer = csv.DictWriter(out, fieldnames=columns)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            out.flush()
+    else:
+        for row in rows:
+            out.write(json.dumps(row) + "\n")
+            out.flush()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_file", type=str, default="./input.pcap", help="Path for the .pcap trace.")
+    parser.add_argument("--window", type=float, default=60, help="Length of the sliding window in seconds.")
+    parser.add_argument("--step", type=float, default=None,
+                        help="Seconds between two consecutive counts, the window length if not given.")
+    parser.add_argument("--format", type=str, choices=["csv", "jsonl"], default="csv",
+                        help="Format of the time series, the possible choices are csv and jsonl.")
+    parser.add_argument("--output", type=str, default=None, help="Output file, the standard output if not given.")
+    add_counting_arguments(parser)
+    opt = vars(parser.parse_args())
+
+    logging.basicConfig(level=logging.WARNING)
+
+    models = load_models(opt["models"], opt["rate_modality"], opt["models_cache"])
+    counter = WindowedCounter(opt["window"], opt["step"] or opt["window"], opt, models)
+    cache = create_fingerprint_cache(opt)
+
+    def windows():
+        records = read_records(opt["input_file"], opt["ingest"], opt["power_threshold"], cache=cache)
+        yield from counter.feed(records)
+        yield from counter.flush()
+
+    if opt["output"]:
+        with open(opt["output"], "w", newline="") as fw:
+            write_rows(windows(), fw, opt["format"])
+    else:
+        write_rows(windows(), sys.stdout, opt["format"])
+    if cache is not None and opt["fingerprint_cache"]:
+        cache.save(opt["fingerprint_cache"])